@@ -3,9 +3,11 @@ ensure_dependencies()
 
 from user_logins import load_logins
 from login_auth import login_loop
+from features.notifications import compact_notifications
 
 print('╔═══════════════╗\n║   CampTrack   ║\n╚═══════════════╝')
 print('\nWelcome to CampTrack! Please select a user.')
 
 load_logins()
+compact_notifications()
 login_loop()
@@ -0,0 +1,169 @@
+"""
+Resident memory of a large camp dataset, old Camp model vs current one.
+
+Builds N camps with M campers each from JSON text (as read_from_file does)
+and reports how much resident memory the loaded camps take:
+
+- "legacy": the previous model, a plain attribute dict per camp and camper
+  lists exactly as json.load returns them (one str object per occurrence).
+- "slots": camp_class.Camp as it is now (__slots__, interned names, campers
+  in a NameSet).
+
+Each model is measured in its own interpreter so the numbers do not mix.
+Run from the project root:
+
+    python -m benchmarks.camp_memory                  # 10k camps, 1M campers
+    python -m benchmarks.camp_memory --camps 1000 --campers-per-camp 50
+
+Nothing under data/ is read or written.
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LegacyCamp:
+    """The camp model before __slots__/interning, kept only for comparison."""
+
+    def __init__(self, record):
+        self.camp_id = record["camp_id"]
+        self.name = record["name"]
+        self.location = record["location"]
+        self.camp_type = record["camp_type"]
+        self.start_date = record["start_date"]
+        self.end_date = record["end_date"]
+        self.food_stock = record["food_stock"]
+        self.scout_leaders = record.get("scout_leaders", [])
+        self.campers = record.get("campers", [])
+        self.campers_info = record.get("campers_info", {})
+        self.activities = record.get("activities", {})
+        self.daily_food_usage = record.get("daily_food_usage", {})
+        self.daily_records = record.get("daily_records", {})
+        self.pay_rate = record.get("pay_rate", 0)
+        self.incidents = record.get("incidents", [])
+        self.imported_csvs = record.get("imported_csvs", [])
+
+
+def build_dataset(camps, campers_per_camp, unique_campers, leaders, seed=1):
+    """JSON text of `camps` camp records (the camp_data.json layout)."""
+    rng = random.Random(seed)
+    pool = [f"Camper {i:07d}" for i in range(unique_campers)]
+    leader_pool = [f"leader{i}" for i in range(leaders)]
+    records = []
+    for i in range(camps):
+        records.append({
+            "camp_id": f"{i:032x}",
+            "name": f"Camp {i}",
+            "location": f"Site {i % 200}",
+            "camp_type": 1 + i % 3,
+            "start_date": "2025-07-01",
+            "end_date": "2025-07-05",
+            "food_stock": 100,
+            "scout_leaders": rng.sample(leader_pool, 2),
+            "campers": rng.sample(pool, min(campers_per_camp, unique_campers)),
+            "campers_info": {},
+            "activities": {},
+            "daily_food_usage": {},
+            "daily_records": {},
+            "pay_rate": 0,
+            "incidents": [],
+            "imported_csvs": [],
+        })
+    return json.dumps(records)
+
+
+def resident_bytes():
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource  # peak rather than current, but the best available
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(model, path, trace=False):
+    """
+    Load the dataset in `path` with `model`.
+
+    Returns the growth of the resident set, or with `trace` the bytes still
+    allocated by Python objects once loading is done (tracemalloc adds its
+    own overhead, so the two are measured in separate runs).
+    """
+    if model == "slots":
+        from camp_class import Camp, _camp_from_record
+    gc.collect()
+    before = resident_bytes()
+    if trace:
+        tracemalloc.start()
+    with open(path, "r") as f:
+        records = json.load(f)
+    if model == "legacy":
+        camps = [LegacyCamp(record) for record in records]
+    else:
+        # same loop as camp_class.read_from_file
+        Camp.all_camps = []
+        for i, record in enumerate(records):
+            _camp_from_record(record)
+            records[i] = None
+        camps = Camp.all_camps
+    del records
+    gc.collect()
+    if not camps:
+        raise SystemExit("dataset is empty")
+    if trace:
+        return tracemalloc.get_traced_memory()[0]
+    return resident_bytes() - before
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--camps", type=int, default=10_000)
+    parser.add_argument("--campers-per-camp", type=int, default=100)
+    parser.add_argument("--unique-campers", type=int, default=50_000,
+                        help="distinct camper names shared across camps/seasons")
+    parser.add_argument("--leaders", type=int, default=500)
+    parser.add_argument("--model", choices=("legacy", "slots"), help=argparse.SUPPRESS)
+    parser.add_argument("--dataset", help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.model:
+        # child process: print the figure for the parent to collect
+        print(measure(args.model, args.dataset, args.trace))
+        return
+
+    total = args.camps * min(args.campers_per_camp, args.unique_campers)
+    print(f"{args.camps} camps, {total} camper entries ({args.unique_campers} distinct names)")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "camp_data.json")
+        with open(path, "w") as f:
+            f.write(build_dataset(args.camps, args.campers_per_camp, args.unique_campers, args.leaders))
+        results = {}
+        for model in ("legacy", "slots"):
+            results[model] = []
+            for extra in ([], ["--trace"]):
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.camp_memory", "--model", model, "--dataset", path] + extra,
+                    cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+                )
+                results[model].append(int(out.stdout.split()[-1]))
+    print(f"{'':>7}  {'resident':>12}  {'live objects':>12}")
+    for model, (resident, live) in results.items():
+        print(f"{model:>7}  {resident / 2**20:8.1f} MiB  {live / 2**20:8.1f} MiB")
+    (old_rss, old_live), (new_rss, new_live) = results["legacy"], results["slots"]
+    print(f"{'saved':>7}  {1 - new_rss / old_rss:11.1%}  {1 - new_live / old_live:11.1%}")
+
+
+if __name__ == "__main__":
+    main()
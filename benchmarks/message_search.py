@@ -0,0 +1,132 @@
+"""
+Search latency over a year of message history, index vs full scan.
+
+Fills a scratch data directory (the real data/ is never touched) with a
+year of direct messages and camp group chat, then times
+messaging.search_messages / search_group_chat for a few queries:
+
+- "scan": what search used to do, loading every message and substring
+  matching each one.
+- "index (cold)": first search in a fresh process, reading the index log.
+- "index (warm)": later searches in the same process.
+
+Run from the project root:
+
+    python -m benchmarks.message_search
+    python -m benchmarks.message_search --messages 20000 --chat 5000
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+
+QUERIES = [
+    dict(query="supplies"),
+    dict(query="sup tue"),
+    dict(query="drill", priority_only=True),
+    dict(query="tent", date_from="2025-06-01", date_to="2025-06-30"),
+]
+WORDS = (
+    "supplies tents drill shelter water food canoe hike weather tuesday friday "
+    "briefing leaders campers medical kit rota bus lake fire safety check report"
+).split()
+
+
+def _use_data_dir(data_dir):
+    # must run before the stores are imported: they resolve their paths then
+    import utils
+    utils.DATA_DIR = data_dir
+
+
+def build(messages, chat, users, camps, seed=1):
+    from storage import chat_store, message_store
+    rng = random.Random(seed)
+    names = [f"user{i}" for i in range(users)]
+
+    def stamp(i, total):
+        day = i * 365 // total
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1735689600 + day * 86400 + i % 86400))
+
+    batch = []
+    for i in range(messages):
+        a, b = rng.sample(names, 2)
+        batch.append({
+            "from": a, "to": b, "text": " ".join(rng.choices(WORDS, k=8)),
+            "timestamp": stamp(i, messages), "read": False, "priority": rng.random() < 0.05,
+            "requires_ack": False, "acked": False, "pinned": False, "attachment": None, "metadata": {},
+        })
+    message_store.append_many(batch)
+    per_camp = chat // camps
+    for camp in range(camps):
+        chat_store.store().append(f"{camp:032x}", [
+            {"from": rng.choice(names), "text": " ".join(rng.choices(WORDS, k=8)), "timestamp": stamp(i, per_camp)}
+            for i in range(per_camp)
+        ])
+
+
+def scan(username, query=None, priority_only=False, date_from=None, date_to=None):
+    """The previous search_messages: every message, substring match."""
+    from messaging import load_messages
+    found = []
+    for msg in load_messages():
+        if username not in (msg["from"], msg["to"]):
+            continue
+        if priority_only and not msg.get("priority"):
+            continue
+        if query and query.lower() not in msg.get("text", "").lower():
+            continue
+        ts = msg.get("timestamp", "")
+        if (date_from and ts < f"{date_from} 00:00:00") or (date_to and ts > f"{date_to} 23:59:59"):
+            continue
+        found.append(msg)
+    return found
+
+
+def run(data_dir):
+    from messaging import search_group_chat, search_messages
+    from storage import chat_store
+
+    def timed(fn, repeat=1):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        return (time.perf_counter() - start) / repeat * 1000, len(result)
+
+    rows = []
+    for i, kw in enumerate(QUERIES):
+        label = ", ".join(f"{k}={v}" for k, v in kw.items())
+        if i == 0:
+            rows.append(("index (cold)", label) + timed(lambda: search_messages("user1", **kw)))
+        rows.append(("index (warm)", label) + timed(lambda: search_messages("user1", **kw), 20))
+        if "query" in kw and " " not in kw["query"]:
+            rows.append(("scan", label) + timed(lambda: scan("user1", **kw)))
+    camps = chat_store.camp_ids()
+    rows.append(("group chat", "query=tent, 1 camp") + timed(lambda: search_group_chat(camps[:1], query="tent"), 20))
+    for mode, label, ms, hits in rows:
+        print(f"{mode:>13}  {ms:9.2f} ms  {hits:6d} hits  {label}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--chat", type=int, default=50_000, help="group chat messages in total")
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--camps", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        _use_data_dir(data_dir)
+        print(f"{args.messages} direct messages, {args.chat} group chat messages, {args.users} users")
+        start = time.perf_counter()
+        build(args.messages, args.chat, args.users, args.camps)
+        from storage import search_index
+        search_index.rebuild()
+        print(f"built in {time.perf_counter() - start:.1f}s")
+        sys.stdout.flush()
+        run(data_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Several processes hammering the same data directory at once.
+
+Starts N worker processes against a scratch copy of data/ (the real one is
+never touched) and has each of them, ITERATIONS times:
+
+- add an incident to one camp every worker edits (retrying when the save is
+  rejected because another worker changed that camp first),
+- bump the food stock of a camp only it edits (must never be rejected: the
+  other workers' changes are merged in),
+- send a direct message, add a notification and post to the group chat.
+
+Afterwards every update must be present exactly once and the unread
+counters must agree with the stores. Run from the project
+root, optionally with a storage mode:
+
+    python -m benchmarks.store_stress
+    CAMPTRACK_STORAGE=sqlite python -m benchmarks.store_stress --workers 8 --iterations 50
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_CAMP = "Stress Camp"
+
+
+def _use_data_dir(data_dir):
+    # must run before the stores are imported: they resolve their paths then
+    import utils
+    utils.DATA_DIR = data_dir
+
+
+def setup(workers):
+    from camp_class import Camp, save_to_file
+    from features import notifications
+    from storage import camp_store, durable
+    with open(camp_store.CAMP_FILE, "w") as f:
+        f.write("[]")  # as shipped; the journal mode starts from it
+    # every notification must arrive, not be counted as a repeat of the last one
+    durable.write_json(notifications.SETTINGS_FILE, {"coalesce_window_seconds": 0})
+    Camp(SHARED_CAMP, "Field", 1, "2025-07-01", "2025-07-05", 0)
+    for worker in range(workers):
+        Camp(f"Worker Camp {worker}", "Field", 1, "2025-07-01", "2025-07-05", 0)
+    save_to_file()
+
+
+def work(worker, iterations):
+    """One worker's share; returns how many shared-camp saves had to be retried."""
+    from camp_class import read_from_file, save_to_file
+    from features.notifications import add_notification
+    from messaging import send_message
+    from storage import chat_store
+
+    retries = 0
+    for i in range(iterations):
+        while True:
+            camp = next(c for c in read_from_file() if c.name == SHARED_CAMP)
+            camp.incidents.append({
+                "date": "2025-07-01",
+                "description": f"worker {worker} #{i}",
+                "severity": "Low",
+                "status": "Open",
+            })
+            if save_to_file(camp):
+                break
+            retries += 1
+
+        camp = next(c for c in read_from_file() if c.name == f"Worker Camp {worker}")
+        camp.food_stock += 1
+        if not save_to_file(camp):
+            raise SystemExit(f"worker {worker}: own camp save rejected")
+
+        send_message(f"worker{worker}", "leader", f"#{i}")
+        add_notification(f"worker {worker} #{i}")
+        chat_store.post(camp.camp_id, {"from": f"worker{worker}", "text": f"#{i}"})
+    return retries
+
+
+def verify(workers, iterations):
+    """List of problems found in the data directory (empty if none)."""
+    from camp_class import read_from_file
+    from features.notifications import load_notifications
+    from features.unread import check as check_unread
+    from messaging import load_messages
+    from storage import chat_store
+
+    problems = []
+    camps = {c.name: c for c in read_from_file()}
+    expected = {f"worker {w} #{i}" for w in range(workers) for i in range(iterations)}
+    incidents = [incident["description"] for incident in camps[SHARED_CAMP].incidents]
+    if len(incidents) != len(expected) or set(incidents) != expected:
+        problems.append(f"shared camp: {len(incidents)} incidents, expected {len(expected)}")
+    for worker in range(workers):
+        camp = camps.get(f"Worker Camp {worker}")
+        if camp is None or camp.food_stock != iterations:
+            problems.append(f"worker camp {worker}: food stock {camp and camp.food_stock}, expected {iterations}")
+        chat = chat_store.history(camp.camp_id) if camp else []
+        if [m["seq"] for m in chat] != list(range(iterations)):
+            problems.append(f"worker camp {worker}: group chat seqs {[m['seq'] for m in chat]}")
+    total = workers * iterations
+    messages = len(load_messages())
+    if messages != total:
+        problems.append(f"messages: {messages}, expected {total}")
+    notifications = len(load_notifications())
+    if notifications != total:
+        problems.append(f"notifications: {notifications}, expected {total}")
+    problems.extend(check_unread())
+    return problems
+
+
+def _child(role, data_dir, *extra):
+    return [sys.executable, "-m", "benchmarks.store_stress", "--role", role, "--data-dir", data_dir, *extra]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=25)
+    parser.add_argument("--role", choices=("setup", "work", "verify"), help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.role:
+        # child process
+        _use_data_dir(args.data_dir)
+        if args.role == "setup":
+            setup(args.workers)
+        elif args.role == "work":
+            print(work(args.worker, args.iterations))
+        else:
+            problems = verify(args.workers, args.iterations)
+            print("\n".join(problems) or "ok")
+            if problems:
+                sys.exit(1)
+        return
+
+    mode = os.environ.get("CAMPTRACK_STORAGE", "json")
+    print(f"{args.workers} workers x {args.iterations} iterations ({mode} storage)")
+    counts = ["--workers", str(args.workers), "--iterations", str(args.iterations)]
+    with tempfile.TemporaryDirectory() as data_dir:
+        subprocess.run(_child("setup", data_dir, *counts), cwd=PROJECT_ROOT, check=True,
+                       stdout=subprocess.DEVNULL)
+        started = time.perf_counter()
+        procs = [
+            subprocess.Popen(_child("work", data_dir, *counts, "--worker", str(w)),
+                             cwd=PROJECT_ROOT, stdout=subprocess.PIPE, text=True)
+            for w in range(args.workers)
+        ]
+        retries = 0
+        failed = 0
+        for proc in procs:
+            out, _ = proc.communicate()
+            if proc.returncode:
+                failed += 1
+            else:
+                retries += int(out.split()[-1])
+        elapsed = time.perf_counter() - started
+        result = subprocess.run(_child("verify", data_dir, *counts), cwd=PROJECT_ROOT,
+                                capture_output=True, text=True)
+    print(f"{elapsed:.1f}s, {retries} rejected shared-camp saves retried, {failed} worker(s) failed")
+    print(result.stdout.strip())
+    if failed or result.returncode:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
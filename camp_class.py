@@ -1,14 +1,70 @@
 from datetime import datetime, timedelta
 import json
-import os
-from utils import data_path
+import sys
+from storage import attachments, camp_store, chat_store
 import uuid
 
 
+def _intern(name):
+    return sys.intern(name) if type(name) is str else name
+
+
+class NameSet:
+    """
+    Insertion-ordered set of names, used for a camp's campers.
+
+    Supports what the app does with the list it replaces (append, remove,
+    indexing, iteration, len, `in`) but never holds a name twice, and names
+    are interned so a camper who attends many camps is stored once. Backed by
+    a plain list: a camp has a few hundred campers at most, and a list is a
+    quarter of the size of a dict.
+    """
+
+    __slots__ = ("_names",)
+
+    def __init__(self, names=()):
+        self._names = list(dict.fromkeys(map(_intern, names)))
+
+    def append(self, name):
+        if name not in self._names:
+            self._names.append(_intern(name))
+
+    def remove(self, name):
+        self._names.remove(name)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, index):
+        return self._names[index]
+
+    def __eq__(self, other):
+        if isinstance(other, NameSet):
+            return self._names == other._names
+        if isinstance(other, (list, tuple)):
+            return self._names == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"NameSet({self._names!r})"
+
 
 class Camp:
     all_camps = []
 
+    __slots__ = (
+        "camp_id", "name", "location", "camp_type", "start_date", "end_date",
+        "food_stock", "scout_leaders", "campers", "campers_info", "activities",
+        "daily_food_usage", "daily_records", "pay_rate", "incidents", "imported_csvs",
+        "_version",  # camp_store.version() of the record this camp was built from
+    )
+
     def __init__(self, name, location, camp_type, start_date, end_date, initial_food_stock):
         self.name = name
         self.location = location
@@ -16,26 +72,34 @@ class Camp:
         self.start_date = start_date
         self.end_date = end_date
         self.food_stock = initial_food_stock
+        self.camp_id = uuid.uuid4().hex
 
         # Always start empty – system fills these later
         self.scout_leaders = []
-        self.campers = []
+        self.campers = NameSet()
         self.campers_info = {}
         self.activities = {}
         self.daily_food_usage = {}
         self.daily_records = {}
         self.pay_rate = 0
-        self.group_chat = []  # Add group chat to each camp
         self.incidents = []
         self.imported_csvs = []
 
         Camp.all_camps.append(self)
 
+    def __getattr__(self, name):
+        # Only reached for slots that were never set: the heavy fields of a
+        # camp built by list_camp_summaries(), read on first use.
+        if name in LAZY_FIELDS:
+            _load_lazy_fields(self)
+            return object.__getattribute__(self, name)
+        raise AttributeError(f"'Camp' object has no attribute '{name}'")
+
     # --------------- CAMP OPERATIONS --------------- #
 
     def assign_leader(self, leader_choice):
         if leader_choice not in self.scout_leaders:
-            self.scout_leaders.append(leader_choice)
+            self.scout_leaders.append(_intern(leader_choice))
             self.message_group_chat("System", f"{leader_choice} has joined the group chat.")
         else:
             print(f"\nLeader '{leader_choice}' is already assigned to this camp.")
@@ -66,13 +130,24 @@ class Camp:
             "from": from_user,
             "text": message_text,
             "timestamp": timestamp,
-            "attachment": attachment,
+            "attachment": attachments.put(attachment) if attachment else None,
         }
-        self.group_chat.append(message)
-        save_to_file()
+        # Stored on its own (storage.chat_store); the camp record is untouched.
+        return chat_store.post(self.camp_id, message)
+
+    @property
+    def group_chat(self):
+        """Full group chat history, oldest first (loaded on each access)."""
+        return chat_store.history(self.camp_id)
 
-    def get_group_chat(self):
-        return self.group_chat
+    def get_group_chat(self, limit=None, before=None):
+        """
+        Group chat messages, oldest first. With `limit`, only the newest page
+        (older than timestamp `before`, if given) is read from the chat store.
+        """
+        if limit is None and before is None:
+            return self.group_chat
+        return chat_store.before(self.camp_id, timestamp=before, limit=limit)
 
     def summary(self):
         print("\n--- Camp Summary ---")
@@ -90,69 +165,199 @@ class Camp:
 # SAVE / LOAD FUNCTIONS
 # -------------------------------------------------
 
-def save_to_file():
-    data = []
-    for camp in Camp.all_camps:
-        data.append({
-            "name": camp.name,
-            "location": camp.location,
-            "camp_type": camp.camp_type,
-            "start_date": camp.start_date,
-            "end_date": camp.end_date,
-            "food_stock": camp.food_stock,
-            "scout_leaders": camp.scout_leaders,
-            "campers": camp.campers,
-            "campers_info" : camp.campers_info,
-            "activities": camp.activities,
-            "daily_food_usage": camp.daily_food_usage,
-            "daily_records": camp.daily_records,
-            "pay_rate": camp.pay_rate,
-            "group_chat": camp.group_chat,
-            "incidents": camp.incidents,
-            "imported_csvs": camp.imported_csvs,
-        })
-
-    with open(data_path("camp_data.json"), "w") as file:
-        json.dump(data, file, indent=4)
+# Everything a camp summary (list_camp_summaries) leaves out until it is used.
+LAZY_FIELDS = (
+    "food_stock", "campers", "campers_info", "activities", "daily_food_usage",
+    "daily_records", "pay_rate", "incidents", "imported_csvs",
+)
 
+def _camp_to_record(camp):
+    return {
+        "camp_id": camp.camp_id,
+        "name": camp.name,
+        "location": camp.location,
+        "camp_type": camp.camp_type,
+        "start_date": camp.start_date,
+        "end_date": camp.end_date,
+        "food_stock": camp.food_stock,
+        "scout_leaders": camp.scout_leaders,
+        "campers": list(camp.campers),
+        "campers_info" : camp.campers_info,
+        "activities": camp.activities,
+        "daily_food_usage": camp.daily_food_usage,
+        "daily_records": camp.daily_records,
+        "pay_rate": camp.pay_rate,
+        "incidents": camp.incidents,
+        "imported_csvs": camp.imported_csvs,
+    }
 
-def read_from_file():
-    if not os.path.exists(data_path("camp_data.json")):
-        print("\ncamp_data.json not found")
-        return []
 
-    if os.path.getsize(data_path("camp_data.json")) == 0:
-        return []
+def save_to_file(camp=None):
+    """
+    Persist camps. Pass `camp` when only that camp changed so storage modes
+    that keep camps separately (see storage.camp_store) write just that camp.
+    Inside camp_store.transaction() the save happens when the block exits.
+
+    Returns False if another session changed the same camp since it was read;
+    nothing is written and the camps are reloaded on next access.
+    """
+    if camp_store.in_transaction():
+        camp_store.defer_save(camp, _save_camps)
+        return True
+    try:
+        _save_camps([] if camp is None else [camp], full=camp is None)
+    except camp_store.ConflictError:
+        camp_store.invalidate()
+        return False
+    return True
+
+
+def _save_camps(targets, full):
+    camps = Camp.all_camps
+    strays = [camp for camp in targets if camp not in camps]
+    if strays and not getattr(camp_store.backend(), "partial_writes", False):
+        # Backends that rebuild the whole store or its index from the list
+        # need every other camp to be current first.
+        camps = read_from_file()
+    for camp in targets:
+        # camp came from an older load, an indexed lookup or a summary; it
+        # replaces the copy held in the list so the cache stays consistent
+        # with the store
+        for idx, other in enumerate(camps):
+            if other.camp_id == camp.camp_id:
+                camps[idx] = camp
+                break
+        else:
+            camps.append(camp)
+    data = [_camp_to_record(c) for c in camps]
+    only = None if full else {camp.camp_id for camp in targets}
+    versions = {c.camp_id: getattr(c, "_version", None) for c in (camps if full else targets)}
+    camp_store.save_records(data, camps, only=only, versions=versions)
+    for camp in camps if full else targets:
+        camp._version = camp_store.version(camp.camp_id)
+
+
+def read_from_file():
+    # Hand back the already-built camps while the camp store is unchanged.
+    cached = camp_store.cached_camps(Camp.all_camps)
+    if cached is not None:
+        return cached
 
     try:
-        with open(data_path("camp_data.json"), "r") as file:
-            data = json.load(file)
+        data, signature = camp_store.load_records()
+    except FileNotFoundError:
+        print(f"\n{camp_store.backend().label} not found")
+        return []
     except json.JSONDecodeError:
-        print("\nError reading camp_data.json — file is corrupted.")
+        print(f"\nError reading {camp_store.backend().label} — file is corrupted.")
         return []
 
     Camp.all_camps = []
 
-    for camp_data in data:
-        camp = Camp(
-            camp_data["name"],
-            camp_data["location"],
-            camp_data["camp_type"],
-            camp_data["start_date"],
-            camp_data["end_date"],
-            camp_data["food_stock"]
-        )
-
-        # Restore saved values
-        camp.scout_leaders = camp_data.get("scout_leaders", [])
-        camp.campers = camp_data.get("campers", [])
-        camp.campers_info = camp_data.get("campers_info", {})
-        camp.activities = camp_data.get("activities", {})
-        camp.daily_food_usage = camp_data.get("daily_food_usage", {})
-        camp.daily_records = camp_data.get("daily_records", {})
-        camp.pay_rate = camp_data.get("pay_rate", 0)
-        camp.group_chat = camp_data.get("group_chat", [])
-        camp.incidents = camp_data.get("incidents", [])
-        camp.imported_csvs = camp_data.get("imported_csvs", [])
+    for i, camp_data in enumerate(data):
+        _camp_from_record(camp_data)
+        data[i] = None  # the raw record is garbage once the camp is built
 
+    camp_store.remember(Camp.all_camps, signature)
     return Camp.all_camps
+
+
+def find_camp(name):
+    """
+    Return the camp called `name` (or None).
+
+    Uses the cached camps when they are current, otherwise an indexed lookup
+    when the storage backend has one, and only then a full load.
+    """
+    cached = camp_store.cached_camps(Camp.all_camps)
+    if cached is None:
+        record = camp_store.find_record(name)
+        if record is not NotImplemented:
+            if record is None:
+                return None
+            # Built outside Camp.all_camps; save_to_file(camp) swaps it in.
+            camp = _camp_from_record(record)
+            Camp.all_camps.remove(camp)
+            return camp
+        cached = read_from_file()
+    for camp in cached:
+        if camp.name == name:
+            return camp
+    return None
+
+
+def list_camp_summaries():
+    """
+    Camps for list and picker screens, without loading full camp records.
+
+    Returns the cached camps when they are current. Otherwise the camps are
+    built from the header index (name, location, type, dates, leaders) and
+    their other fields are read from the store the first time they are used.
+    Summary camps are not part of Camp.all_camps until saved.
+    """
+    cached = camp_store.cached_camps(Camp.all_camps)
+    if cached is not None:
+        return cached
+    try:
+        headers = camp_store.load_headers()
+    except FileNotFoundError:
+        print(f"\n{camp_store.backend().label} not found")
+        return []
+    except json.JSONDecodeError:
+        print(f"\nError reading {camp_store.backend().label} — file is corrupted.")
+        return []
+    return [_camp_from_header(header) for header in headers]
+
+
+def _camp_from_header(header):
+    camp = Camp.__new__(Camp)  # skips __init__, which registers in all_camps
+    camp.camp_id = header["id"]
+    camp.name = header.get("name")
+    camp.location = header.get("location")
+    camp.camp_type = header.get("camp_type")
+    camp.start_date = header.get("start_date")
+    camp.end_date = header.get("end_date")
+    camp.scout_leaders = [_intern(n) for n in header.get("scout_leaders") or []]
+    return camp
+
+
+def _load_lazy_fields(camp):
+    camp_data = camp_store.load_record(camp.camp_id) or {}
+    camp.food_stock = camp_data.get("food_stock", 0)
+    camp.campers = NameSet(camp_data.get("campers", []))
+    camp.campers_info = camp_data.get("campers_info", {})
+    camp.activities = camp_data.get("activities", {})
+    camp.daily_food_usage = camp_data.get("daily_food_usage", {})
+    camp.daily_records = camp_data.get("daily_records", {})
+    camp.pay_rate = camp_data.get("pay_rate", 0)
+    camp.incidents = camp_data.get("incidents", [])
+    camp.imported_csvs = camp_data.get("imported_csvs", [])
+    camp._version = camp_store.version(camp.camp_id)
+    chat_store.import_legacy(camp.camp_id, camp_data.get("group_chat"))
+
+
+def _camp_from_record(camp_data):
+    camp = Camp(
+        camp_data["name"],
+        camp_data["location"],
+        camp_data["camp_type"],
+        camp_data["start_date"],
+        camp_data["end_date"],
+        camp_data["food_stock"]
+    )
+
+    # Restore saved values
+    camp.camp_id = camp_data["camp_id"]
+    camp.scout_leaders = [_intern(n) for n in camp_data.get("scout_leaders", [])]
+    camp.campers = NameSet(camp_data.get("campers", []))
+    camp.campers_info = camp_data.get("campers_info", {})
+    camp.activities = camp_data.get("activities", {})
+    camp.daily_food_usage = camp_data.get("daily_food_usage", {})
+    camp.daily_records = camp_data.get("daily_records", {})
+    camp.pay_rate = camp_data.get("pay_rate", 0)
+    # records written before chat had its own store still carry it inline
+    chat_store.import_legacy(camp.camp_id, camp_data.get("group_chat"))
+    camp.incidents = camp_data.get("incidents", [])
+    camp.imported_csvs = camp_data.get("imported_csvs", [])
+    camp._version = camp_store.version(camp.camp_id)
+    return camp
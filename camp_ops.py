@@ -4,7 +4,8 @@ try:
 except ImportError:
     date_parser = None
 
-from camp_class import Camp, save_to_file, read_from_file
+from camp_class import Camp, save_to_file, read_from_file, list_camp_summaries
+from storage import camp_store
 from utils import get_int
 from features.notifications import add_notification 
 
@@ -13,7 +14,7 @@ from features.notifications import add_notification
 # CAMP CREATION / EDIT / DELETE
 # -------------------------------------------------
 def edit_camp():
-    camps = read_from_file()
+    camps = list_camp_summaries()
 
     if not camps:
         print("\nNo camps exist. Create one first.")
@@ -68,6 +69,7 @@ def edit_camp():
     new_loc = update_text("New Location", camp.location)
     if new_loc is None:
         print("Edit cancelled.")
+        camp_store.invalidate()  # discard the fields already changed above
         return
     camp.location = new_loc
 
@@ -77,6 +79,7 @@ def edit_camp():
           '\nSelect [3] for Multiple Days', camp.camp_type)
     if new_type_raw is None:
         print("Edit cancelled.")
+        camp_store.invalidate()  # discard the fields already changed above
         return
     camp.camp_type = get_int(str(new_type_raw), 1, 3)
 
@@ -88,24 +91,28 @@ def edit_camp():
     new_food = update_number("New Daily Food Stock", camp.food_stock)
     if new_food is None:
         print("Edit cancelled.")
+        camp_store.invalidate()  # discard the fields already changed above
         return
     camp.food_stock = new_food
     new_pay = update_number("New Pay Rate", camp.pay_rate)
     if new_pay is None:
         print("Edit cancelled.")
+        camp_store.invalidate()  # discard the fields already changed above
         return
     camp.pay_rate = new_pay
+    if not save_to_file(camp):
+        print(f"\nNot saved: {camp.name} was changed by another session. Please try again.")
+        return
     add_notification(
         f"camp {camp.name} edited",
         category="CAMP",
         context={"camp": camp.name, "type": "camp"},
     )
-    save_to_file()
     print("\nCamp updated successfully!")
 
 
 def delete_camp():
-    camps = read_from_file()
+    camps = list_camp_summaries()
 
     if not camps:
         print("\nNo camps exist. Create one first.")
@@ -128,17 +135,17 @@ def delete_camp():
     if confirm != "y":
         print("\nDeletion cancelled.")
         return
-    
+
+    Camp.all_camps = [c for c in read_from_file() if c.camp_id != camp.camp_id]
+
+    if not save_to_file():
+        print(f"\nNot deleted: {camp.name} was changed by another session. Please try again.")
+        return
     add_notification(
         f"camp {camp.name} deleted",
         category="CAMP",
         context={"camp": camp.name, "type": "camp"},
     )
-
-    del camps[choice - 1]
-    Camp.all_camps = camps
-
-    save_to_file()
     print("\nCamp deleted successfully!")
 
 
@@ -184,7 +191,7 @@ def create_camp():
         print("Please enter Y or N.")
 
     if confirm == 'y':
-        Camp(
+        new_camp = Camp(
             name,
             location,
             camp_type,
@@ -193,12 +200,14 @@ def create_camp():
             initial_food_stock,
 
         )
+        if not save_to_file(new_camp):
+            print("\nNot saved: the camps were changed by another session. Please try again.")
+            return
         add_notification(
             f"camp {name} created",
             category="CAMP",
             context={"camp": name, "type": "camp"},
         )
-        save_to_file()
         print("\nCamp successfully created!")
     else:
         print("\nCamp creation cancelled.")
@@ -3,6 +3,7 @@ from tkinter import ttk, messagebox, simpledialog, filedialog
 import os
 import sys
 import subprocess
+import threading
 import webbrowser
 
 from messaging import (
@@ -12,6 +13,9 @@ from messaging import (
     send_broadcast,
     search_messages,
     export_conversation,
+    has_archived_history,
+    archived_months,
+    get_archived_month,
     acknowledge_conversation,
     acknowledge_message,
     pin_message,
@@ -20,7 +24,7 @@ from messaging import (
 )
 from user_logins import users
 from camp_class import read_from_file
-from utils import data_path
+from storage import attachments, chat_store, message_store, watch
 
 
 def _get_all_usernames():
@@ -34,6 +38,170 @@ def _get_all_usernames():
     return sorted(set(names))
 
 
+def _watch(window, paths, on_change):
+    """
+    Run on_change() in the Tk event loop whenever one of paths() changes,
+    until `window` is destroyed (see storage.watch). With a threaded Tcl the
+    watcher thread posts a <<StoreChanged>> event; otherwise the loop checks
+    for changes every watch.INTERVAL. Returns the watcher: rebase() it after
+    the window itself changed what paths() returns or already shows a change.
+    """
+    changed = threading.Event()
+    # non-threaded Tcl builds don't define tcl_platform(threaded) at all
+    threaded = (
+        window.tk.getboolean(window.tk.call("info", "exists", "tcl_platform(threaded)"))
+        and window.tk.eval("set tcl_platform(threaded)") == "1"
+    )
+
+    def notify():
+        changed.set()
+        if threaded:
+            try:
+                window.event_generate("<<StoreChanged>>", when="tail")
+            except (tk.TclError, RuntimeError):
+                watcher.stop()  # window gone
+
+    def handle(_event=None):
+        if changed.is_set():
+            changed.clear()
+            on_change()
+
+    def poll():
+        if not window.winfo_exists():
+            return
+        handle()
+        window.after(int(watch.INTERVAL * 1000), poll)
+
+    watcher = watch.Watcher(paths, notify)
+    if threaded:
+        window.bind("<<StoreChanged>>", handle)
+    else:
+        poll()
+    window.bind("<Destroy>", lambda e: watcher.stop() if e.widget is window else None, add="+")
+    return watcher.start()
+
+
+PAGE_SIZE = chat_store.DEFAULT_PAGE
+ATTACHMENT_TAG = "attachment"
+OLDER_HINT = "(Scroll up for older messages)\n"
+
+
+class _ChatView:
+    """
+    A read-only Text widget showing the newest page of a chat. Older pages
+    are loaded when the view is scrolled to the top, new messages are
+    appended, and nothing already shown is drawn again.
+
+    render(msg) turns a message into (text, tags) runs. A batch of messages
+    goes into the widget with a single insert() carrying all its runs, and
+    tag styles and bindings are set up once here rather than per message,
+    so drawing a page costs the same however long the history is.
+    load_older() returns the page before the oldest one shown (oldest
+    first), or [] once there is nothing older.
+    """
+
+    def __init__(self, text, scrollbar, render, load_older, on_attachment=None):
+        self.text = text
+        self.scrollbar = scrollbar
+        self.render = render
+        self.load_older = load_older
+        self.has_older = False
+        self._loading = False
+        self._attachments = {}  # per-message tag -> attachment reference
+        text.configure(yscrollcommand=self._on_scroll)
+        if on_attachment is not None:
+            text.tag_config(ATTACHMENT_TAG, foreground="#7dd3fc", underline=True)
+            text.tag_bind(ATTACHMENT_TAG, "<Button-1>", lambda _e: self._open(on_attachment))
+
+    def _runs(self, messages):
+        runs = []
+        for msg in messages:
+            for chars, tags in self.render(msg):
+                if ATTACHMENT_TAG in tags:
+                    key = f"attach_{len(self._attachments)}"
+                    self._attachments[key] = msg.get("attachment")
+                    tags = tags + (key,)
+                runs += [chars, tags]
+        return runs
+
+    def _insert(self, index, messages):
+        runs = self._runs(messages)
+        if runs:
+            self.text.config(state="normal")
+            self.text.insert(index, *runs)
+            self.text.config(state="disabled")
+
+    def _open(self, on_attachment):
+        for tag in self.text.tag_names("current"):
+            if tag in self._attachments:
+                on_attachment(self._attachments[tag])
+                return
+
+    def reset(self, messages=(), header=(), note="", has_older=False, placeholder=""):
+        """
+        Show `header` messages (introduced by `note`) above the page
+        `messages`, or `placeholder` if there are neither.
+        """
+        text = self.text
+        text.config(state="normal")
+        text.delete("1.0", tk.END)
+        self._attachments.clear()
+        if not messages and not header:
+            text.insert(tk.END, placeholder)
+        elif header:
+            text.insert(tk.END, note)
+        self._insert(tk.END, header)
+        text.config(state="normal")
+        if has_older:
+            text.insert(tk.END, OLDER_HINT, ("hint",))
+        # older pages go in at this mark, each above the one before
+        text.mark_set("history", "end-1c")
+        text.mark_gravity("history", "left")
+        text.config(state="disabled")
+        self.has_older = has_older
+        self._insert(tk.END, messages)
+        text.see(tk.END)
+
+    def append(self, messages):
+        at_bottom = self.text.yview()[1] >= 0.999
+        self._insert("end-1c", messages)
+        if at_bottom:
+            self.text.see(tk.END)
+
+    def _on_scroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if float(first) <= 0.0 and self.has_older and not self._loading:
+            self._loading = True
+            self.text.after_idle(self._prepend_older)
+
+    def _prepend_older(self):
+        try:
+            if not self.text.winfo_exists():
+                return
+            older = self.load_older()
+            if not older:
+                self.has_older = False
+                self.text.config(state="normal")
+                for start, end in zip(*[iter(self.text.tag_ranges("hint"))] * 2):
+                    self.text.delete(start, end)
+                self.text.config(state="disabled")
+                return
+            top_line, top_col = map(int, self.text.index("@0,0").split("."))
+            history_line = int(self.text.index("history").split(".")[0])
+            lines_before = int(self.text.index("end-1c").split(".")[0])
+            self._insert("history", older)
+            added = int(self.text.index("end-1c").split(".")[0]) - lines_before
+            # keep what was on screen where it was (or, when the pinned
+            # header was at the top, the first message of the previous page)
+            if top_line >= history_line:
+                self.text.yview(f"{top_line + added}.{top_col}")
+            else:
+                self.text.yview(f"{history_line + added}.0")
+        finally:
+            self._loading = False
+
+
 def open_chat_window(master, username, role=None):
     """
     Reusable messaging window for ANY role.
@@ -228,15 +396,20 @@ def open_chat_window(master, username, role=None):
     right_frame = ttk.Frame(main, style="Card.TFrame")
     right_frame.pack(side="left", fill="both", expand=True, pady=4)
 
+    history_frame = ttk.Frame(right_frame, style="Card.TFrame")
+    history_frame.pack(fill="both", expand=True, pady=(0, 6))
+
     chat_text = tk.Text(
-        right_frame,
+        history_frame,
         bg="#0b1729",
         fg="#e5e7eb",
         wrap="word",
         state="disabled",
         height=18,
     )
-    chat_text.pack(fill="both", expand=True, pady=(0, 6))
+    chat_scroll = ttk.Scrollbar(history_frame, orient="vertical", command=chat_text.yview)
+    chat_scroll.pack(side="right", fill="y")
+    chat_text.pack(side="left", fill="both", expand=True)
 
     entry = ttk.Entry(right_frame, style="App.TEntry")
     entry.pack(fill="x", pady=(0, 6))
@@ -246,15 +419,19 @@ def open_chat_window(master, username, role=None):
 
     current_partner = tk.StringVar(value="")
 
-    def _open_attachment(rel_path):
+    def _open_attachment(ref):
         """Open attachment file using the OS default handler."""
-        if not rel_path:
+        abs_path = attachments.path_of(ref)
+        if not abs_path:
             return
-        base_dir = os.path.dirname(data_path("messages.json"))
-        abs_path = rel_path if os.path.isabs(rel_path) else os.path.join(base_dir, rel_path)
         if not os.path.exists(abs_path):
             messagebox.showerror("Attachment", f"File not found:\n{abs_path}")
             return
+        try:
+            abs_path = attachments.named_copy(ref)
+        except OSError as e:
+            messagebox.showerror("Attachment", f"Could not open attachment:\n{e}")
+            return
         try:
             if sys.platform == "darwin":
                 subprocess.Popen(["open", abs_path])
@@ -269,49 +446,90 @@ def open_chat_window(master, username, role=None):
             except Exception as e:
                 messagebox.showerror("Attachment", f"Could not open attachment:\n{e}")
 
+    # what chat_text currently shows; "older" holds the pages not loaded yet
+    shown = {"partner": None, "ids": set(), "state": {}, "newest": None, "older": [], "archived": set()}
+
+    def _display_state(msg):
+        return msg.get("pinned"), msg.get("requires_ack") and not msg.get("acked"), msg.get("text")
+
+    def _render_message(msg):
+        who = "You" if msg["from"] == username else shown["partner"]
+        flags = []
+        if msg.get("priority"):
+            flags.append("PRIORITY")
+        if msg.get("requires_ack") and not msg.get("acked"):
+            flags.append("ACK PENDING")
+        if msg.get("pinned"):
+            flags.append("PINNED")
+        flag_str = f" [{' | '.join(flags)}]" if flags else ""
+        runs = [(f"{msg['timestamp']} - {who}: {msg['text']}{flag_str}", ())]
+        attach = msg.get("attachment")
+        if attach:
+            runs.append((f" [attachment: {attachments.display_name(attach)}]", (ATTACHMENT_TAG,)))
+        runs.append(("\n", ()))
+        shown["ids"].add(msg.get("id"))
+        shown["state"][msg.get("id")] = _display_state(msg)
+        return runs
+
+    def _older_messages():
+        """The page before the oldest one shown: from the thread, then archived months."""
+        older = shown["older"]
+        while older and isinstance(older[-1], str):
+            month = older.pop()
+            archived = get_archived_month(username, shown["partner"], month, exclude_ids=shown["ids"])
+            shown["archived"].update(m.get("id") for m in archived)  # read-only, not in the thread
+            older.extend(archived)
+        page = older[-PAGE_SIZE:]
+        del older[-PAGE_SIZE:]
+        return page
+
+    view = _ChatView(chat_text, chat_scroll, _render_message, _older_messages, on_attachment=_open_attachment)
+
     def refresh_chat(partner):
         # mark messages as read first
         mark_conversation_as_read(username, partner)
 
         thread = get_conversation(username, partner)
-
-        chat_text.config(state="normal")
-        chat_text.delete("1.0", tk.END)
-
-        if not thread:
-            chat_text.insert(tk.END, "(No messages yet – say hi!)\n")
-        else:
-            pinned = [m for m in thread if m.get("pinned")]
-            rest = [m for m in thread if not m.get("pinned")]
-            ordered = pinned + rest
-            if pinned:
-                chat_text.insert(tk.END, "(Pinned messages shown first)\n")
-            for idx, msg in enumerate(ordered):
-                who = "You" if msg["from"] == username else partner
-                flags = []
-                if msg.get("priority"):
-                    flags.append("PRIORITY")
-                if msg.get("requires_ack") and not msg.get("acked"):
-                    flags.append("ACK PENDING")
-                if msg.get("pinned"):
-                    flags.append("PINNED")
-                flag_str = f" [{' | '.join(flags)}]" if flags else ""
-                attach = msg.get("attachment")
-                line = f"{msg['timestamp']} - {who}: {msg['text']}{flag_str}"
-                chat_text.insert(tk.END, line)
-                if attach:
-                    tag = f"attach_{idx}"
-                    display = f" [attachment: {os.path.basename(attach)}]"
-                    start = chat_text.index("end-1c")
-                    chat_text.insert(tk.END, display)
-                    chat_text.tag_add(tag, start, chat_text.index("end-1c"))
-                    chat_text.tag_config(tag, foreground="#7dd3fc", underline=True)
-                    chat_text.tag_bind(tag, "<Button-1>", lambda _e, p=attach: _open_attachment(p))
-                chat_text.insert(tk.END, "\n")
-
-        chat_text.config(state="disabled")
+        pinned = [m for m in thread if m.get("pinned")]
+        rest = [m for m in thread if not m.get("pinned")]
+        # archived months (oldest first) stand in for their messages until reached
+        older = archived_months(username, partner) + rest[:-PAGE_SIZE]
+        page = rest[-PAGE_SIZE:]
+
+        shown.update(partner=partner, ids=set(), state={}, older=older, archived=set())
+        shown["newest"] = page[-1].get("id") if page else None
+        view.reset(
+            page,
+            header=pinned,
+            note="(Pinned messages shown first)\n",
+            has_older=bool(older),
+            placeholder="(No messages yet – say hi!)\n",
+        )
+        watcher.rebase()
         refresh_conversation_list()  # update unread counters
 
+    def on_store_change():
+        """Something changed on disk: append new messages, redraw only if shown ones changed."""
+        refresh_conversation_list()
+        partner = current_partner.get()
+        if not partner or partner != shown["partner"]:
+            return
+        thread = get_conversation(username, partner)
+        if any(m.get("to") == username and m.get("read") is False for m in thread):
+            mark_conversation_as_read(username, partner)
+        ids = [m.get("id") for m in thread]
+        after = ids.index(shown["newest"]) + 1 if shown["newest"] in ids else None
+        new = [m for m in thread[after or 0:] if m.get("id") not in shown["ids"]]
+        still_shown = {m.get("id"): _display_state(m) for m in thread if m.get("id") in shown["ids"]}
+        hot_shown = {i: state for i, state in shown["state"].items() if i not in shown["archived"]}
+        if after is None or still_shown != hot_shown or any(m.get("pinned") for m in new):
+            refresh_chat(partner)
+            return
+        if new:
+            shown["newest"] = new[-1].get("id")
+            view.append(new)
+        watcher.rebase()
+
     def send_current_message(event=None):
         partner = current_partner.get()
         if not partner:
@@ -333,7 +551,10 @@ def open_chat_window(master, username, role=None):
         entry.delete(0, tk.END)
         priority_var.set(False)
         attachment_var.set("")
-        refresh_chat(partner)
+        if shown["partner"] == partner:
+            on_store_change()
+        else:
+            refresh_chat(partner)
 
     def ack_priority():
         partner = current_partner.get()
@@ -381,7 +602,7 @@ def open_chat_window(master, username, role=None):
             updated = 0
             for i in indices:
                 m = pending[int(i)]
-                if acknowledge_message(username, partner, m.get("timestamp", "")):
+                if acknowledge_message(username, m["id"]):
                     updated += 1
             messagebox.showinfo("Acknowledge", f"Acknowledged {updated} message(s).")
             dlg.destroy()
@@ -437,7 +658,7 @@ def open_chat_window(master, username, role=None):
                 return
             m = thread[int(sel[0])]
             now_pin = not m.get("pinned", False)
-            if pin_message(username, partner, m.get("timestamp"), pinned=now_pin):
+            if pin_message(username, partner, m["id"], pinned=now_pin):
                 state = "Pinned" if now_pin else "Unpinned"
                 messagebox.showinfo("Pin", f"{state} selected message.")
             dlg.destroy()
@@ -455,10 +676,15 @@ def open_chat_window(master, username, role=None):
         if not partner:
             messagebox.showinfo("Messaging", "Select a conversation first.")
             return
-        path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text", "*.txt")])
+        path = filedialog.asksaveasfilename(
+            defaultextension=".txt",
+            filetypes=[("Text", "*.txt"), ("CSV", "*.csv"), ("JSON lines", "*.jsonl")],
+        )
         if not path:
             return
-        if export_conversation(username, partner, path):
+        archived = has_archived_history(username, partner) and messagebox.askyesno(
+            "Export", "Include archived (older) messages?", parent=convo_win)
+        if export_conversation(username, partner, path, include_archived=archived):
             messagebox.showinfo("Export", f"Saved chat to {path}")
         else:
             messagebox.showerror("Export", "Could not save chat.")
@@ -474,6 +700,8 @@ def open_chat_window(master, username, role=None):
         date_from = simpledialog.askstring("Search", "Start date YYYY-MM-DD (optional):", parent=convo_win)
         date_to = simpledialog.askstring("Search", "End date YYYY-MM-DD (optional):", parent=convo_win)
         priority_only = messagebox.askyesno("Search", "Priority only?", parent=convo_win)
+        archived = has_archived_history(username, partner) and messagebox.askyesno(
+            "Search", "Include archived (older) messages?", parent=convo_win)
 
         results = search_messages(
             username,
@@ -482,6 +710,7 @@ def open_chat_window(master, username, role=None):
             date_from=date_from or None,
             date_to=date_to or None,
             priority_only=priority_only,
+            include_archived=archived,
         )
         if not results:
             messagebox.showinfo("Search", "No results.")
@@ -541,6 +770,12 @@ def open_chat_window(master, username, role=None):
 
     listbox.bind("<<ListboxSelect>>", on_select)
 
+    watcher = _watch(
+        convo_win,
+        lambda: message_store.watch_paths(username, shown["partner"]),
+        on_store_change,
+    )
+
 
 def open_group_chat_window(master, username, role=None):
     """Separate window: group chats. Admin/logistics see all camps; leaders see assigned camps."""
@@ -609,15 +844,20 @@ def open_group_chat_window(master, username, role=None):
     right = ttk.Frame(main, style="Card.TFrame")
     right.pack(side="left", fill="both", expand=True)
 
+    history_frame = ttk.Frame(right, style="Card.TFrame")
+    history_frame.pack(fill="both", expand=True, pady=(0, 6))
+
     group_text = tk.Text(
-        right,
+        history_frame,
         bg="#0b1729",
         fg="#e5e7eb",
         wrap="word",
         state="disabled",
         height=16,
     )
-    group_text.pack(fill="both", expand=True, pady=(0, 6))
+    group_scroll = ttk.Scrollbar(history_frame, orient="vertical", command=group_text.yview)
+    group_scroll.pack(side="right", fill="y")
+    group_text.pack(side="left", fill="both", expand=True)
 
     msg_entry = ttk.Entry(right, style="App.TEntry")
     msg_entry.pack(fill="x", pady=(0, 6))
@@ -629,47 +869,73 @@ def open_group_chat_window(master, username, role=None):
     ttk.Label(attach_row, textvariable=attach_var, style="Subtitle.TLabel", width=40).pack(side="left", anchor="w")
 
     current_camp_name = tk.StringVar(value="")
+    # camp shown in group_text, and the seqs of its oldest and newest messages shown
+    shown = {"camp_id": None, "first_seq": None, "last_seq": None}
 
     def _get_camp_by_name(name):
-        # Reload to pick up new messages from others
+        # Chat lives in its own store, so the cached camp list is fine here.
         camps = read_from_file()
         for c in camps:
             if c.name == name:
                 return c
         return None
 
+    def _render_group_message(msg):
+        who = msg.get("from", "Unknown")
+        ts = msg.get("timestamp", "")
+        txt = msg.get("text", "")
+        attach = msg.get("attachment")
+        attach_str = f" [attachment: {attachments.display_name(attach)}]" if attach else ""
+        return [(f"{ts} - {who}: {txt}{attach_str}\n", ())]
+
+    def _older_group_messages():
+        if shown["camp_id"] is None or not shown["first_seq"]:
+            return []
+        page = chat_store.before(shown["camp_id"], seq=shown["first_seq"], limit=PAGE_SIZE)
+        if page:
+            shown["first_seq"] = page[0].get("seq")
+        return page
+
+    view = _ChatView(group_text, group_scroll, _render_group_message, _older_group_messages)
+
     def refresh_group_chat():
         name = current_camp_name.get()
         if not name:
-            group_text.config(state="normal")
-            group_text.delete("1.0", tk.END)
-            group_text.insert(tk.END, "(Select a camp on the left.)\n")
-            group_text.config(state="disabled")
+            shown.update(camp_id=None, first_seq=None, last_seq=None)
+            view.reset(placeholder="(Select a camp on the left.)\n")
             return
 
         camp = _get_camp_by_name(name)
         if not camp:
-            group_text.config(state="normal")
-            group_text.delete("1.0", tk.END)
-            group_text.insert(tk.END, "(Camp not found anymore.)\n")
-            group_text.config(state="disabled")
+            shown.update(camp_id=None, first_seq=None, last_seq=None)
+            view.reset(placeholder="(Camp not found anymore.)\n")
             return
 
-        thread = camp.get_group_chat()
-
-        group_text.config(state="normal")
-        group_text.delete("1.0", tk.END)
-
-        if not thread:
-            group_text.insert(tk.END, "(No messages yet in this group.)\n")
-        else:
-            for msg in thread:
-                who = msg.get("from", "Unknown")
-                ts = msg.get("timestamp", "")
-                txt = msg.get("text", "")
-                group_text.insert(tk.END, f"{ts} - {who}: {txt}\n")
+        thread = chat_store.latest(camp.camp_id, PAGE_SIZE)
+        shown.update(
+            camp_id=camp.camp_id,
+            first_seq=thread[0].get("seq") if thread else None,
+            last_seq=thread[-1].get("seq") if thread else None,
+        )
+        view.reset(
+            thread,
+            has_older=bool(shown["first_seq"]),
+            placeholder="(No messages yet in this group.)\n",
+        )
+        watcher.rebase()
 
-        group_text.config(state="disabled")
+    def on_store_change():
+        """New posts on disk: append just those."""
+        if shown["camp_id"] is None:
+            return
+        if shown["last_seq"] is None:
+            refresh_group_chat()  # replace the "no messages yet" line
+            return
+        new = chat_store.since(shown["camp_id"], shown["last_seq"])
+        if new:
+            shown["last_seq"] = new[-1].get("seq")
+            view.append(new)
+        watcher.rebase()
 
     def on_camp_select(event):
         sel = camp_listbox.curselection()
@@ -716,10 +982,19 @@ def open_group_chat_window(master, username, role=None):
         camp.message_group_chat(username, text or "(attachment)", attachment_path)
         msg_entry.delete(0, tk.END)
         attach_var.set("")
-        refresh_group_chat()
+        if shown["camp_id"] == camp.camp_id:
+            on_store_change()
+        else:
+            refresh_group_chat()
 
     ttk.Button(right, text="Send to Group", style="Primary.TButton", command=send_group_message).pack(fill="x")
     msg_entry.bind("<Return>", send_group_message)
 
+    watcher = _watch(
+        win,
+        lambda: chat_store.watch_paths(shown["camp_id"]) if shown["camp_id"] else [],
+        on_store_change,
+    )
+
     # Initial state
     refresh_group_chat()
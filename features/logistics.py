@@ -12,6 +12,7 @@ except ImportError:
 from camp_ops import create_camp, edit_camp, delete_camp, get_dates
 from camp_class import Camp, save_to_file, read_from_file
 from features.notifications import add_notification
+from storage import durable
 from utils import get_int, data_path
 
 
@@ -34,12 +35,13 @@ def top_up_food_data(camp_name, amount):
     for camp in camps:
         if camp.name == camp_name:
             camp.food_stock += amount
+            if not save_to_file(camp):
+                return {"status": "conflict", "camp_name": camp_name}
             add_notification(
                 f"Food level increased at {camp_name} by {amount}",
                 category="FOOD",
                 context={"camp": camp_name, "type": "camp"},
             )
-            save_to_file()
             return {"status": "ok", "camp_name": camp_name, "amount": amount}
     return {"status": "camp_not_found"}
 
@@ -51,6 +53,8 @@ def top_up_food(camp_name, amount):
         print("Top-up amount must be a non-negative whole number.")
     elif status == "camp_not_found":
         print("Camp not found.")
+    elif status == "conflict":
+        print(f"Not saved: {camp_name} was changed by another session. Please try again.")
     elif status == "ok":
         print(f"Food stock for {camp_name} increased by {amount}.")
 
@@ -62,12 +66,13 @@ def set_food_stock_data(camp_name, new_stock):
     for camp in camps:
         if camp.name == camp_name:
             camp.food_stock = new_stock
+            if not save_to_file(camp):
+                return {"status": "conflict", "camp_name": camp_name}
             add_notification(
                 f"Food stock set to :{new_stock} at {camp_name}",
                 category="FOOD",
                 context={"camp": camp_name, "type": "camp"},
             )
-            save_to_file()
             return {"status": "ok", "camp_name": camp_name, "new_stock": new_stock}
     return {"status": "camp_not_found"}
 
@@ -79,14 +84,15 @@ def set_food_stock(camp_name, new_stock):
         print("Food stock must be a non-negative whole number.")
     elif status == "camp_not_found":
         print("Camp not found.")
+    elif status == "conflict":
+        print(f"Not saved: {camp_name} was changed by another session. Please try again.")
     elif status == "ok":
         print(f"Daily food stock for {camp_name} set to {new_stock}.")
 
 #Shortage Notifications
 def load_food_requirement(camp_name):
     try:
-        with open(data_path("food_requirements.json"), "r") as file:
-            data = json.load(file)
+        data = durable.load_json(data_path("food_requirements.json"))
         return data.get(camp_name)
     except (FileNotFoundError, json.JSONDecodeError):
         return None
@@ -184,10 +190,11 @@ def build_dashboard_data():
     total_leaders = sum(len(camp.scout_leaders) for camp in camps)
 
     data = []
-    for camp in camps:
+    with durable.coalesce():  # one notifications rewrite for all camps
+        engagement_by_camp = [_engagement_score(camp) for camp in camps]
+    for camp, engagement in zip(camps, engagement_by_camp):
         campers = len(camp.campers)
         leaders = len(camp.scout_leaders)
-        engagement = _engagement_score(camp)
         camper_pct = round((campers / total_campers) * 100, 2) if total_campers else 0
         leader_ratio = round(leaders / campers, 2) if campers else 0
         data.append({
@@ -309,8 +316,9 @@ def set_pay_rate_data(camp_name, rate):
     for camp in camps:
         if camp.name == camp_name:
             camp.pay_rate = rate
+            if not save_to_file(camp):
+                return {"status": "conflict", "camp_name": camp_name}
             add_notification(f"Pay rate set to: {rate} at {camp_name}")
-            save_to_file()
             return {"status": "ok", "camp_name": camp_name, "rate": rate}
     return {"status": "camp_not_found"}
 
@@ -322,5 +330,7 @@ def set_pay_rate(camp_name, rate):
         print("Pay rate must be a non-negative whole number.")
     elif status == "camp_not_found":
         print("Camp not found.")
+    elif status == "conflict":
+        print(f"Not saved: {camp_name} was changed by another session. Please try again.")
     elif status == "ok":
         print(f"Pay rate for {camp_name} set to {rate}.")
@@ -1,8 +1,56 @@
+import copy
+import hashlib
 import json
+import os
+import re
+import sys
+import time
 from datetime import datetime, timedelta
+from storage import dispatch, durable, locking
 from utils import data_path
 
 SETTINGS_FILE = data_path("notification_settings.json")
+# "async" (default): add_notification queues and a background thread writes
+# batches; "sync": written before add_notification returns
+DISPATCH_MODE = os.environ.get("CAMPTRACK_NOTIFICATIONS", "async").strip().lower()
+# Append-only log, one JSON notification per line with an increasing integer
+# "id". Adding a notification appends a line; nothing else writes it.
+NOTIFICATIONS_FILE = data_path("notifications.jsonl")
+# What each user has read and deleted: {user: {"read": [upto, exceptions],
+# "deleted": [upto, exceptions]}}. An id is marked if it is <= upto, unless it
+# is one of the exceptions (and the other way round above upto), so "mark all
+# read" only moves the watermark. Guarded by the NOTIFICATIONS_FILE lock.
+STATE_FILE = data_path("notification_state.json")
+# notifications.json from before the log, imported on first use
+LEGACY_FILE = data_path("notifications.json")
+# Repeats of a notification within the coalescing window bump a counter here
+# instead of adding a line to the log: {"recent": {key: [id, first seen
+# (epoch seconds)]}, "repeats": {id: {"count", "timestamp", "message"}}}.
+# The key is category + context + message template (see _coalesce_key);
+# notifications without a context are never coalesced.
+# Guarded by the NOTIFICATIONS_FILE lock.
+REPEATS_FILE = data_path("notification_repeats.json")
+COALESCE_WINDOW = 600
+# What compact_notifications() drops (override in the settings' "retention"):
+# notifications whose latest occurrence is older than max_age_days, all but
+# the newest max_count, and those every current user has deleted, or read
+# or deleted. None turns a limit off. The GUI also compacts every
+# compact_every_hours while it runs.
+RETENTION = {
+    "max_age_days": 365,
+    "max_count": 5000,
+    "drop_deleted_by_all": True,
+    "drop_read_by_all": True,
+    "compact_every_hours": 6,
+}
+# parsed settings, the signature (see durable.file_signature) of
+# SETTINGS_FILE they were read at, and the parsed mute deadlines
+_settings_cache = {"signature": None, "settings": None, "muted_until": {}}
+# Unread counters, so a badge does not have to load every notification:
+# {"totals": {CATEGORY: {camp: n}}, "read": {user: {CATEGORY: {camp: n}}}},
+# where "read" counts the notifications a user has read or deleted. Guarded
+# by the NOTIFICATIONS_FILE lock and rebuilt from it when missing.
+COUNTS_FILE = data_path("notification_counts.json")
 ALLOWED_LEVELS = {"SUCCESS", "INFO", "ALERT", "CRITICAL"}
 LEGACY_LEVEL_MAP = {
     "WARNING": "ALERT",
@@ -24,21 +72,51 @@ def _load_settings():
     default = {
         "shortage_warning_buffer": 0.15,  # 15% over required triggers warning
         "muted_categories": {},  # {"FOOD": "2025-12-01 12:00"}
+        "coalesce_window_seconds": COALESCE_WINDOW,  # 0 turns coalescing off
     }
     try:
-        with open(SETTINGS_FILE, "r") as f:
-            raw = json.load(f)
-            default.update(raw)
+        with locking.shared(SETTINGS_FILE):
+            raw = durable.load_json(SETTINGS_FILE)
+        default.update(raw)
     except (FileNotFoundError, json.JSONDecodeError):
         pass
     return default
 
 
+def _parse_mutes(settings):
+    """{category: datetime the mute ends} from the settings' muted_categories."""
+    until = {}
+    for category, ts in settings.get("muted_categories", {}).items():
+        try:
+            until[category.upper()] = datetime.strptime(ts, "%Y-%m-%d %H:%M")
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return until
+
+
+def _settings():
+    """The settings as last read; SETTINGS_FILE is only read again once its signature changes."""
+    signature = durable.file_signature(SETTINGS_FILE)
+    if _settings_cache["settings"] is None or signature != _settings_cache["signature"]:
+        settings = _load_settings()
+        _settings_cache.update(signature=signature, settings=settings, muted_until=_parse_mutes(settings))
+    return _settings_cache["settings"]
+
+
 def _save_settings(settings):
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(settings, f, indent=4)
+    # expired mutes are dropped here rather than when they are checked
+    now = datetime.now()
+    until = _parse_mutes(settings)
+    settings["muted_categories"] = {
+        category: ts
+        for category, ts in settings.get("muted_categories", {}).items()
+        if until.get(category.upper(), now) > now
+    }
+    durable.write_json(SETTINGS_FILE, settings)
+    _settings_cache["settings"] = None
 
 
+@locking.exclusive(SETTINGS_FILE)
 def mute_category(category, minutes=60):
     settings = _load_settings()
     until = datetime.now() + timedelta(minutes=minutes)
@@ -47,6 +125,7 @@ def mute_category(category, minutes=60):
     _save_settings(settings)
 
 
+@locking.exclusive(SETTINGS_FILE)
 def unmute_category(category):
     settings = _load_settings()
     muted = settings.get("muted_categories", {})
@@ -57,52 +136,162 @@ def unmute_category(category):
 
 
 def _is_muted(category):
-    settings = _load_settings()
-    muted = settings.get("muted_categories", {})
-    ts = muted.get(category.upper())
-    if not ts:
-        return False
+    _settings()
+    until = _settings_cache["muted_until"].get(category.upper())
+    return until is not None and datetime.now() <= until
+
+
+def _read_log():
+    """The notifications in the log, oldest first (a torn last line is skipped)."""
     try:
-        until = datetime.strptime(ts, "%Y-%m-%d %H:%M")
-        if datetime.now() > until:
-            muted.pop(category.upper(), None)
-            settings["muted_categories"] = muted
-            _save_settings(settings)
-            return False
-        return True
-    except Exception:
-        return False
+        with open(NOTIFICATIONS_FILE) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not record.get("dropped"):
+                    yield record
+    except FileNotFoundError:
+        return
 
 
-def load_notifications(username=None, unread_only=False, filter_fn=None):
-    """Load notifications; if username provided, filter by read_by and filter_fn."""
+def _last_id():
+    """Id of the newest notification, read from the end of the log."""
     try:
-        with open(data_path("notifications.json"), "r") as f:
-            data = json.load(f)
+        with open(NOTIFICATIONS_FILE, "rb") as f:
+            end = f.seek(0, os.SEEK_END)
+            tail = b""
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                tail = f.read(end - start) + tail
+                end = start
+                lines = tail.split(b"\n")
+                # lines[0] may be cut off unless the start of the file was reached
+                for line in reversed(lines if end == 0 else lines[1:]):
+                    try:
+                        return json.loads(line)["id"]
+                    except (ValueError, KeyError, TypeError):
+                        continue
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+def _load_state():
+    try:
+        return durable.load_json(STATE_FILE)
     except (FileNotFoundError, json.JSONDecodeError):
-        data = []
+        return {}
+
+
+def _mark(state, username, field):
+    """(watermark, exceptions) of one user's "read" or "deleted" marks."""
+    upto, exceptions = state.get(username, {}).get(field, [0, []])
+    return upto, set(exceptions)
+
+
+def _marked(mark, notification_id):
+    upto, exceptions = mark
+    return (notification_id <= upto) != (notification_id in exceptions)
+
+
+def _compress(marked_ids, all_ids):
+    """The [watermark, exceptions] that marks exactly `marked_ids` among `all_ids`, with the fewest exceptions."""
+    all_ids = sorted(all_ids)
+    best, best_cost = 0, len(marked_ids)
+    cost = best_cost
+    for notification_id in all_ids:
+        # moving the watermark past this id: it no longer needs an exception if marked, needs one if not
+        cost += -1 if notification_id in marked_ids else 1
+        if cost < best_cost:
+            best, best_cost = notification_id, cost
+    exceptions = [i for i in all_ids if (i <= best) != (i in marked_ids)]
+    return [best, exceptions]
+
+
+def _state_from_lists(records):
+    """Per-user marks from records carrying read_by/deleted_by username lists."""
+    ids = [n["id"] for n in records]
+    marked = {}
+    for n in records:
+        for field in ("read_by", "deleted_by"):
+            for user in n.get(field) or []:
+                marked.setdefault(user, {"read_by": set(), "deleted_by": set()})[field].add(n["id"])
+    return {
+        user: {"read": _compress(sets["read_by"], ids), "deleted": _compress(sets["deleted_by"], ids)}
+        for user, sets in marked.items()
+    }
+
+
+def _record(n, notification_id):
+    return {
+        "id": notification_id,
+        "message": n.get("message", ""),
+        "timestamp": n.get("timestamp", ""),
+        "level": _normalize_level(n.get("level", "INFO")),
+        "category": n.get("category", "GENERAL").upper(),
+        "context": n.get("context") or {},
+    }
+
+
+def _replace_log(notifications):
+    """Rewrite the log (and, for records with read_by/deleted_by lists, the marks) from `notifications`."""
+    next_id = max((n["id"] for n in notifications if isinstance(n.get("id"), int)), default=0) + 1
+    records = []
+    for n in notifications:
+        if isinstance(n.get("id"), int):
+            records.append(dict(n, **_record(n, n["id"])))
+        else:
+            records.append(dict(n, **_record(n, next_id)))
+            next_id += 1
+    if any(isinstance(n.get("read_by"), list) or isinstance(n.get("deleted_by"), list) for n in records):
+        durable.replace_file(STATE_FILE, json.dumps(_state_from_lists(records)))
+    durable.replace_file(NOTIFICATIONS_FILE, "".join(json.dumps(_record(n, n["id"])) + "\n" for n in records))
+    # an arbitrary rewrite: recount on next use
+    durable.remove(COUNTS_FILE)
+
+
+def _import_legacy():
+    """Turn data/notifications.json into the log and per-user marks (once)."""
+    if os.path.exists(NOTIFICATIONS_FILE) or not os.path.exists(LEGACY_FILE):
+        return
+    with locking.exclusive(NOTIFICATIONS_FILE):
+        if os.path.exists(NOTIFICATIONS_FILE):
+            return
+        try:
+            data = durable.load_json(LEGACY_FILE)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = []
+        _replace_log([{k: v for k, v in n.items() if k != "id"} for n in data])
+
+
+def load_notifications(username=None, unread_only=False, filter_fn=None):
+    """
+    Load notifications, oldest first; with a username, those the user has not
+    deleted, with "read" telling whether the user has read them.
+    """
+    _catch_up()
+    with locking.shared(NOTIFICATIONS_FILE):
+        state = _load_state()
+        records = list(_read_log())
+        repeats = _load_repeats()["repeats"]
+    if username:
+        read = _mark(state, username, "read")
+        deleted = _mark(state, username, "deleted")
 
     normalized = []
-    for n in data:
-        read_by = n.get("read_by")
-        if not isinstance(read_by, list):
-            read_by = []
-        deleted_by = n.get("deleted_by")
-        if not isinstance(deleted_by, list):
-            deleted_by = []
-        if username and username in deleted_by:
+    for n in records:
+        if username and _marked(deleted, n["id"]):
             continue
-        notif = {
-            "message": n.get("message", ""),
-            "timestamp": n.get("timestamp", ""),
-            "level": _normalize_level(n.get("level", "INFO")),
-            "category": n.get("category", "GENERAL").upper(),
-            "context": n.get("context", {}),
-            "read_by": read_by,
-            "deleted_by": deleted_by,
-            # Derived per-user read flag so UI filters work correctly.
-            "read": (username in read_by) if username else bool(n.get("read", False)),
-        }
+        notif = _record(n, n["id"])
+        notif["count"] = 1
+        repeat = repeats.get(str(n["id"]))
+        if repeat:
+            # shown as the latest occurrence
+            notif.update(first_timestamp=notif["timestamp"], **repeat)
+        notif["read"] = _marked(read, n["id"]) if username else False
         if username and unread_only and notif["read"]:
             continue
         if filter_fn and not filter_fn(notif):
@@ -112,39 +301,200 @@ def load_notifications(username=None, unread_only=False, filter_fn=None):
 
 
 def save_notifications(notifications):
-    with open(data_path("notifications.json"), "w") as f:
-        json.dump(notifications, f, indent=4)
+    """
+    Replace all notifications. Records keep their "id" (new ones get fresh
+    ids); read/deleted state is taken from read_by/deleted_by lists if given.
+    """
+    _dispatcher.flush()
+    with locking.exclusive(NOTIFICATIONS_FILE):
+        _replace_log(notifications)
+
+
+def _bucket(n):
+    camp = (n.get("context") or {}).get("camp") or ""
+    return n.get("category", "GENERAL").upper(), str(camp)
+
+
+def _counts_from(records, state):
+    counts = {"totals": {}, "read": {}}
+    marks = {user: (_mark(state, user, "read"), _mark(state, user, "deleted")) for user in state}
+    for n in records:
+        category, camp = _bucket(n)
+        totals = counts["totals"].setdefault(category, {})
+        totals[camp] = totals.get(camp, 0) + 1
+        for user, (read, deleted) in marks.items():
+            if _marked(read, n["id"]) or _marked(deleted, n["id"]):
+                seen = counts["read"].setdefault(user, {}).setdefault(category, {})
+                seen[camp] = seen.get(camp, 0) + 1
+    return counts
+
+
+def _load_counts():
+    _catch_up()
+    with locking.shared(NOTIFICATIONS_FILE):
+        try:
+            return durable.load_json(COUNTS_FILE)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+    with locking.exclusive(NOTIFICATIONS_FILE):
+        counts = _counts_from(_read_log(), _load_state())
+        durable.write_json(COUNTS_FILE, counts, indent=None)
+    return counts
+
+
+def _seen_all(username):
+    def update(counts):
+        counts["read"][username] = copy.deepcopy(counts["totals"])
+    return update
+
+
+def _update_counts(update_counts):
+    """Apply `update_counts(counts)` to the unread counters (rebuilt if missing)."""
+    try:
+        counts = durable.load_json(COUNTS_FILE)
+    except (FileNotFoundError, json.JSONDecodeError):
+        counts = _counts_from(_read_log(), _load_state())
+    else:
+        update_counts(counts)
+    durable.write_json(COUNTS_FILE, counts, indent=None)
+
+
+def _load_repeats():
+    try:
+        return durable.load_json(REPEATS_FILE)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"recent": {}, "repeats": {}}
+
+
+def _coalesce_key(n):
+    """
+    Notifications with the same key within the window are counted as one.
+    None (never coalesced) without a context: then only the message tells
+    e.g. two "Deleted user ..." notifications apart.
+    """
+    if not n["context"]:
+        return None
+    # standalone numbers only: "available 12" ~ "available 9", but "leader1" != "leader2"
+    template = re.sub(r"(?<![\w.])\d+(?:\.\d+)?(?!\w)", "#", n["message"])
+    # the level is part of the template, so an escalation is never hidden
+    key = json.dumps([n["category"], n["context"], n["level"], template], sort_keys=True)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+@locking.exclusive(NOTIFICATIONS_FILE)
+def _append_notifications(batch):
+    """
+    Append a batch of new notifications to the log and count them, in one
+    write each; repeats of a notification added within the coalescing window
+    only bump its counter.
+    """
+    _import_legacy()
+    window = _settings().get("coalesce_window_seconds", COALESCE_WINDOW)
+    now = time.time()
+    coalescing = _load_repeats()
+    recent = {key: seen for key, seen in coalescing["recent"].items() if now - seen[1] < window}
+    changed = len(recent) != len(coalescing["recent"])
+    next_id = _last_id() + 1
+    records = []
+    for n in batch:
+        key = _coalesce_key(n) if window else None
+        if key in recent:
+            repeat = coalescing["repeats"].setdefault(str(recent[key][0]), {"count": 1})
+            repeat.update(count=repeat["count"] + 1, timestamp=n["timestamp"], message=n["message"])
+            changed = True
+            continue
+        records.append(_record(n, next_id))
+        if key is not None:
+            recent[key] = [next_id, now]
+            changed = True
+        next_id += 1
+    if records:
+        with open(NOTIFICATIONS_FILE, "a") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+    if changed:
+        coalescing["recent"] = recent
+        durable.write_json(REPEATS_FILE, coalescing, indent=None)
+    if not records:
+        return
+
+    def count(counts):
+        for r in records:
+            category, camp = _bucket(r)
+            totals = counts["totals"].setdefault(category, {})
+            totals[camp] = totals.get(camp, 0) + 1
+
+    _update_counts(count)
+
+
+_dispatcher = dispatch.Dispatcher(
+    _append_notifications, "notifications", synchronous=DISPATCH_MODE == "sync"
+)
+
+
+def _catch_up():
+    """
+    Before reading: write the notifications this process still has queued,
+    import the legacy file.
+
+    Inside camp_store.transaction() (or any durable.coalesce() block) nothing
+    is written here: notifications added in the block are held until it
+    commits (see storage.dispatch), and the queue is left to the background
+    thread. So load_notifications(), count_unread() etc. called in the block
+    don't see the block's own notifications, only those written before it.
+    """
+    _dispatcher.flush()
+    _import_legacy()
 
 
 def add_notification(message, level='INFO', category='GENERAL', context=None):
-    """Add a notification; respects muted categories. Note: read_by starts empty."""
+    """
+    Add a notification; respects muted categories. It is queued and written
+    to the log in the background with others (see storage.dispatch); inside
+    camp_store.transaction() only once the transaction has been written.
+    """
     level = _normalize_level(level)
     category = category.upper()
     if _is_muted(category):
         return
-    data = load_notifications()
-    new_notification = {
+    _dispatcher.submit({
         "message": message,
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
         "level": level,
         "category": category,
-        "context": context or {},
-        "read_by": [],
-        "deleted_by": [],
-    }
-    data.append(new_notification)
-    save_notifications(data)
+        "context": context,
+    })
+
+
+def set_synchronous_dispatch(synchronous=True):
+    """Write notifications before add_notification returns (e.g. in tests), or queue them again."""
+    _dispatcher.flush()
+    _dispatcher.synchronous = synchronous
+
+
+def dispatch_stats():
+    """Counters of the background notification writer (see storage.dispatch.Dispatcher.stats)."""
+    return _dispatcher.stats()
+
+
+def _mark_all(username, field):
+    """Move the user's `field` watermark to the newest notification; False if it was there already."""
+    _catch_up()
+    with locking.exclusive(NOTIFICATIONS_FILE):
+        state = _load_state()
+        mark = [_last_id(), []]
+        if state.get(username, {}).get(field) == mark:
+            return False
+        state.setdefault(username, {})[field] = mark
+        with durable.coalesce():
+            durable.write_json(STATE_FILE, state, indent=None)
+            _update_counts(_seen_all(username))
+    return True
 
 
 def mark_all_as_read(username):
-    data = load_notifications()
-    changed = False
-    for n in data:
-        if username not in n.get("read_by", []):
-            n.setdefault("read_by", []).append(username)
-            changed = True
-    if changed:
-        save_notifications(data)
+    _mark_all(username, "read")
 
 
 def clear_notifications(username):
@@ -154,31 +504,37 @@ def clear_notifications(username):
 
 def delete_notifications_for_user(username):
     """Remove notifications from view for a specific user (others unaffected)."""
-    try:
-        with open(data_path("notifications.json"), "r") as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = []
-
-    changed = False
-    for n in data:
-        deleted_by = n.get("deleted_by")
-        if not isinstance(deleted_by, list):
-            deleted_by = []
-        if username not in deleted_by:
-            deleted_by.append(username)
-            n["deleted_by"] = deleted_by
-            changed = True
-    if changed:
-        save_notifications(data)
-
-
-def count_unread(username, level=None, category=None, filter_fn=None):
-    data = load_notifications()
+    _mark_all(username, "deleted")
+
+
+def count_unread(username, level=None, category=None, filter_fn=None, *, categories=None, camps=None):
+    """
+    Notifications `username` has neither read nor deleted, optionally only
+    those of `category` / `categories` or about one of `camps` (context
+    "camp"). Answered from the unread counters; `level` and `filter_fn`
+    need the notifications themselves.
+    """
+    if level is None and filter_fn is None:
+        counts = _load_counts()
+        read = counts["read"].get(username, {})
+        count = 0
+        for cat, per_camp in counts["totals"].items():
+            if (category and cat != category.upper()) or (categories is not None and cat not in categories):
+                continue
+            for camp, total in per_camp.items():
+                if camps is None or camp in camps:
+                    count += total - read.get(cat, {}).get(camp, 0)
+        return count
+
+    data = load_notifications(username)
     level = _normalize_level(level) if level else None
     count = 0
     for n in data:
-        if username in n.get("read_by", []):
+        if n["read"]:
+            continue
+        if categories is not None and n.get("category") not in categories:
+            continue
+        if camps is not None and _bucket(n)[1] not in camps:
             continue
         if level and n.get("level") != level.upper():
             continue
@@ -192,12 +548,13 @@ def count_unread(username, level=None, category=None, filter_fn=None):
 
 def get_thresholds():
     """Return shortage warning buffer percentage (float)."""
-    settings = _load_settings()
+    settings = _settings()
     return {
         "shortage_warning_buffer": settings.get("shortage_warning_buffer", 0.15),
     }
 
 
+@locking.exclusive(SETTINGS_FILE)
 def set_thresholds(warning_buffer):
     settings = _load_settings()
     try:
@@ -205,3 +562,117 @@ def set_thresholds(warning_buffer):
     except (TypeError, ValueError):
         settings["shortage_warning_buffer"] = 0.15
     _save_settings(settings)
+
+
+def retention_policy():
+    """RETENTION, with the settings' "retention" entries applied."""
+    policy = dict(RETENTION)
+    policy.update(_settings().get("retention") or {})
+    return policy
+
+
+def compact_notifications(usernames=None, now=None):
+    """
+    Drop the notifications the retention policy no longer keeps; returns how
+    many were dropped. `usernames` are the current users (default: those in
+    user_logins). Ids are never reused, so read/deleted marks stay valid.
+    """
+    if usernames is None:
+        from user_logins import users
+        usernames = [u["username"] for role_users in users.values() for u in role_users if "username" in u]
+    policy = retention_policy()
+    _catch_up()
+    with locking.exclusive(NOTIFICATIONS_FILE):
+        records = list(_read_log())
+        last_id = _last_id()
+        state = _load_state()
+        coalescing = _load_repeats()
+        cutoff = None
+        if policy.get("max_age_days") is not None:
+            cutoff = ((now or datetime.now()) - timedelta(days=policy["max_age_days"])).strftime("%Y-%m-%d %H:%M")
+        marks = {user: (_mark(state, user, "read"), _mark(state, user, "deleted")) for user in usernames}
+
+        def expired(n):
+            latest = coalescing["repeats"].get(str(n["id"]), {}).get("timestamp", n.get("timestamp", ""))
+            if cutoff and latest < cutoff:
+                return True
+            if not marks:
+                return False
+            if policy.get("drop_deleted_by_all") and all(_marked(d, n["id"]) for _, d in marks.values()):
+                return True
+            return policy.get("drop_read_by_all") and all(
+                _marked(r, n["id"]) or _marked(d, n["id"]) for r, d in marks.values()
+            )
+
+        kept = [n for n in records if not expired(n)]
+        if policy.get("max_count") is not None:
+            kept = kept[-policy["max_count"]:] if policy["max_count"] > 0 else []
+        if len(kept) == len(records):
+            return 0
+        ids = [n["id"] for n in kept]
+        lines = [json.dumps(n) + "\n" for n in kept]
+        if not kept or kept[-1]["id"] != last_id:
+            # the newest id stays in the log so _last_id() never hands it out again
+            lines.append(json.dumps({"id": last_id, "dropped": True}) + "\n")
+        state = {
+            user: {
+                field: _compress({i for i in ids if _marked(_mark(state, user, field), i)}, ids)
+                for field in ("read", "deleted")
+            }
+            for user in state
+        }
+        keep = {str(i) for i in ids}
+        coalescing = {
+            "recent": {key: seen for key, seen in coalescing["recent"].items() if str(seen[0]) in keep},
+            "repeats": {i: repeat for i, repeat in coalescing["repeats"].items() if i in keep},
+        }
+        with durable.coalesce():
+            durable.write_text(NOTIFICATIONS_FILE, "".join(lines))
+            durable.write_json(STATE_FILE, state, indent=None)
+            durable.write_json(REPEATS_FILE, coalescing, indent=None)
+            durable.write_json(COUNTS_FILE, _counts_from(kept, state), indent=None)
+    return len(records) - len(kept)
+
+
+def check_unread_counters(repair=False):
+    """
+    Compare the unread counters with the notifications; returns a list of
+    differences (empty if they agree). With `repair`, the counters are
+    rebuilt from the notifications.
+    """
+    _catch_up()
+    with locking.exclusive(NOTIFICATIONS_FILE) if repair else locking.shared(NOTIFICATIONS_FILE):
+        expected = _counts_from(_read_log(), _load_state())
+        try:
+            stored = durable.load_json(COUNTS_FILE)
+        except (FileNotFoundError, json.JSONDecodeError):
+            stored = None
+        problems = []
+        if stored is not None:  # missing counters are rebuilt when next read
+            for key in ("totals", "read"):
+                for name in sorted(set(stored.get(key, {})) | set(expected[key])):
+                    have, want = stored.get(key, {}).get(name), expected[key].get(name)
+                    if _nonzero(have) != _nonzero(want):
+                        label = f"{name} total" if key == "totals" else f"read by {name}"
+                        problems.append(f"notification counters ({label}): {have} != {want}")
+        if repair and problems:
+            durable.write_json(COUNTS_FILE, expected, indent=None)
+    return problems
+
+
+def _nonzero(counts):
+    """Nested counts without zero entries, for comparing."""
+    if isinstance(counts, dict):
+        counts = {k: _nonzero(v) for k, v in counts.items()}
+        return {k: v for k, v in counts.items() if v}
+    return counts
+
+
+if __name__ == "__main__":
+    if "--compact" in sys.argv[1:]:
+        from user_logins import load_logins
+        load_logins()
+        dropped = compact_notifications()
+        print(f"Dropped {dropped} notification(s) past the retention policy.")
+    else:
+        print("usage: python -m features.notifications --compact")
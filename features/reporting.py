@@ -1,11 +1,13 @@
 import csv
+import heapq
 import os
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterator, Optional
 
 from camp_class import read_from_file
 from features.scout import find_camp_by_name
-from messaging import load_messages
+from messaging import write_transcript
+from storage import message_archive, message_store
 
 
 class CampReport:
@@ -67,18 +69,32 @@ class CampReport:
                 rows.append([date_str, label or ""])
         return rows
 
+    def iter_camp_messages(self, include_archived: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Messages tagged with this camp in metadata, oldest first, streamed
+        from the message store (and archive) instead of loaded all at once.
+        """
+        def tagged(m):
+            return (m.get("metadata") or {}).get("camp") == self.camp.name
+
+        hot = message_store.iter_matching(tagged)
+        if not include_archived:
+            return hot
+        archived = message_archive.iter_messages(predicate=tagged)
+        return heapq.merge(archived, hot, key=lambda m: m.get("timestamp", ""))
+
     def camp_messages(self) -> List[Dict[str, Any]]:
         """Messages tagged with this camp in metadata."""
-        msgs = load_messages()
-        return [m for m in msgs if (m.get("metadata") or {}).get("camp") == self.camp.name]
+        return list(self.iter_camp_messages())
 
-    def export(self, target_dir: str) -> Dict[str, str]:
+    def export(self, target_dir: str, transcript_format: str = "text") -> Dict[str, str]:
         os.makedirs(target_dir, exist_ok=True)
         base = self.camp.name.replace(" ", "_")
         summary_path = os.path.join(target_dir, f"{base}_summary.csv")
         incidents_path = os.path.join(target_dir, f"{base}_incidents.csv")
         activities_path = os.path.join(target_dir, f"{base}_activities.csv")
-        transcript_path = os.path.join(target_dir, f"{base}_messages.txt")
+        ext = {"text": "txt"}.get(transcript_format, transcript_format)
+        transcript_path = os.path.join(target_dir, f"{base}_messages.{ext}")
 
         with open(summary_path, "w", newline="") as f:
             writer = csv.writer(f)
@@ -92,20 +108,8 @@ class CampReport:
             writer = csv.writer(f)
             writer.writerows(self.activity_rows())
 
-        with open(transcript_path, "w") as f:
-            msgs = self.camp_messages()
-            for msg in msgs:
-                flags = []
-                if msg.get("priority"):
-                    flags.append("PRIORITY")
-                if msg.get("requires_ack") and not msg.get("acked"):
-                    flags.append("ACK PENDING")
-                if msg.get("pinned"):
-                    flags.append("PINNED")
-                flag_str = f" [{' | '.join(flags)}]" if flags else ""
-                attach = msg.get("attachment")
-                attach_str = f" [attachment: {attach}]" if attach else ""
-                f.write(f"{msg.get('timestamp')} - {msg.get('from')} -> {msg.get('to')}: {msg.get('text')}{flag_str}{attach_str}\n")
+        with open(transcript_path, "w", newline="" if transcript_format == "csv" else None) as f:
+            write_transcript(self.iter_camp_messages(), f, transcript_format)
 
         return {
             "summary": summary_path,
@@ -115,7 +119,7 @@ class CampReport:
         }
 
 
-def export_camp_pack(camp_name: str, target_dir: str) -> Dict[str, str]:
+def export_camp_pack(camp_name: str, target_dir: str, transcript_format: str = "text") -> Dict[str, str]:
     """Facade to export a camp pack."""
     report = CampReport(camp_name)
-    return report.export(target_dir)
+    return report.export(target_dir, transcript_format)
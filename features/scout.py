@@ -7,7 +7,8 @@ try:
 except ImportError:
     date_parser = None
 
-from camp_class import Camp, save_to_file, read_from_file
+from camp_class import Camp, save_to_file, read_from_file, find_camp
+from storage import camp_store, durable
 from utils import get_int, data_path
 from features.notifications import add_notification
 
@@ -32,13 +33,17 @@ def camps_conflict(selected_camps):
 
 def save_selected_camps(leader_username, selected_camp_names):
     camps = read_from_file()
-    for camp in camps:
-        if camp.name in selected_camp_names:
-            camp.assign_leader(leader_username)
-        else:
-            if leader_username in camp.scout_leaders:
-                camp.scout_leaders.remove(leader_username)
-    save_to_file()
+    try:
+        with camp_store.transaction():
+            for camp in camps:
+                if camp.name in selected_camp_names:
+                    camp.assign_leader(leader_username)
+                else:
+                    if leader_username in camp.scout_leaders:
+                        camp.scout_leaders.remove(leader_username)
+            save_to_file()
+    except camp_store.ConflictError as e:
+        print(f"\nNot saved: {', '.join(e.names)} was changed by another session. Please try again.")
 
 
 def parse_date_cli(prompt):
@@ -116,34 +121,34 @@ def save_campers(camp_name, campers):
 
     added_names = []
 
-    for name, info in campers.items():
-        if name not in target_camp.campers:
-            target_camp.campers.append(name)
-        target_camp.campers_info[name] = info
-
-    save_to_file()
-    if added_names:
-        add_notification(
-            f"{len(added_names)} camper(s) added to {camp_name}: " +", ".join(added_names),
-            category="CAMP",
-            context={"camp": camp_name, "type": "camp"},
-        )
-    else: 
-        add_notification(
-            f"No new campers were added to {camp_name}.",
-            category="CAMP",
-            context={"camp": camp_name, "type": "camp"},
-        )
+    try:
+        with camp_store.transaction():
+            for name, info in campers.items():
+                if name not in target_camp.campers:
+                    target_camp.campers.append(name)
+                target_camp.campers_info[name] = info
+
+            save_to_file(target_camp)
+            if added_names:
+                add_notification(
+                    f"{len(added_names)} camper(s) added to {camp_name}: " +", ".join(added_names),
+                    category="CAMP",
+                    context={"camp": camp_name, "type": "camp"},
+                )
+            else: 
+                add_notification(
+                    f"No new campers were added to {camp_name}.",
+                    category="CAMP",
+                    context={"camp": camp_name, "type": "camp"},
+                )
+    except camp_store.ConflictError:
+        return {"status": "conflict", "camp": camp_name}
 
     return {"status": "ok", "camp": camp_name, "added": list(campers.keys())}
 
 
 def find_camp_by_name(camp_name):
-    camps = read_from_file()
-    for camp in camps:
-        if camp.name == camp_name:
-            return camp
-    return None
+    return find_camp(camp_name)
 
 
 def bulk_assign_campers_data(selected_camp, campers):
@@ -226,7 +231,8 @@ def assign_camps_to_leader(camps, leader_username, selected_indices):
         if leader_username not in camp.scout_leaders:
             camp.scout_leaders.append(leader_username)
 
-    save_to_file()
+    if not save_to_file():
+        return {"status": "conflict"}
     combined_names = [camp.name for camp in combined]
     return {"status": "ok", "selected": combined_names}
 
@@ -280,15 +286,13 @@ def assign_camps_to_leader_ui(leader_username):
 
 def save_food_requirement(camp_name, food_per_camper):
     try:
-        with open(data_path("food_requirements.json"), "r") as file:
-            data = json.load(file)
+        data = durable.load_json(data_path("food_requirements.json"))
     except (FileNotFoundError, json.JSONDecodeError):
         data = {}
 
     data[camp_name] = food_per_camper
 
-    with open(data_path("food_requirements.json"), 'w') as file:
-        json.dump(data, file, indent=4)
+    durable.write_json(data_path("food_requirements.json"), data)
     return {"status": "ok", "camp": camp_name, "food_per_camper": food_per_camper}
 
 
@@ -335,6 +339,8 @@ def record_daily_activity_data(camp, date, activity_name, activity_time, notes,
     if camp is None:
         return {"status": "no_camp"}
     entry = add_activity_entry(camp, date, activity_name, activity_time, notes, food_units, campers)
+    if not save_to_file(camp):
+        return {"status": "conflict"}
     return {"status": "ok", "entry": entry}
 
 
@@ -342,12 +348,16 @@ def record_activity_entry_data(camp_name, date, activity_name, activity_time, no
     camp = find_camp_by_name(camp_name)
     if camp is None:
         return {"status": "camp_not_found"}
-    add_notification(
-        f"Activity recorded at {camp_name}",
-        category="CAMP",
-        context={"camp": camp_name, "type": "camp"},
-    )
-    return record_daily_activity_data(camp, date, activity_name, activity_time, notes, food_units, campers)
+    try:
+        with camp_store.transaction():
+            add_notification(
+                f"Activity recorded at {camp_name}",
+                category="CAMP",
+                context={"camp": camp_name, "type": "camp"},
+            )
+            return record_daily_activity_data(camp, date, activity_name, activity_time, notes, food_units, campers)
+    except camp_store.ConflictError:
+        return {"status": "conflict"}
 
 
 def record_daily_activity():
@@ -400,8 +410,10 @@ def record_daily_activity():
         else:
             campers_for_activity= []
         
-        record_daily_activity_data(camp, new_date, activity_name, activity_time, notes, food_units, campers_for_activity)
-
+        res = record_daily_activity_data(camp, new_date, activity_name, activity_time, notes, food_units, campers_for_activity)
+        if res["status"] == "conflict":
+            print(f"\nNot saved: {camp.name} was changed by another session. Please try again.")
+            return
 
         view_choice = input("Entry added. View today's entries? (y/n): ").strip().lower()
         if view_choice == "y":
@@ -433,7 +445,6 @@ def add_activity_entry(camp, date, activity_name, activity_time, notes, food_uni
         if date not in camp.daily_food_usage:
             camp.daily_food_usage[date] = 0
         camp.daily_food_usage[date] += food_units
-    save_to_file()
     return entry
 
 
@@ -524,8 +535,10 @@ def view_activity_list():
                 camp.activities[date].remove(entry)
                 if not camp.activities[date]:
                     del camp.activities[date]
-                save_to_file()
-                print("Entry deleted.")
+                if save_to_file(camp):
+                    print("Entry deleted.")
+                else:
+                    print(f"Not saved: {camp.name} was changed by another session. Please try again.")
             except ValueError:
                 print("Could not delete entry.")
         else:
@@ -566,8 +579,10 @@ def view_incident_list():
             inc = incidents[idx - 1]
             try:
                 camp.incidents.remove(inc)
-                save_to_file()
-                print("Incident deleted.")
+                if save_to_file(camp):
+                    print("Incident deleted.")
+                else:
+                    print(f"Not saved: {camp.name} was changed by another session. Please try again.")
             except ValueError:
                 print("Could not delete incident.")
         else:
@@ -645,29 +660,34 @@ def record_incident_entry_data(camp_name, date, description, campers_involved, t
         "resolved_at": "",
     }
     camp.incidents.append(incident)
+    if not save_to_file(camp):
+        return {"status": "conflict"}
     add_notification(
         f"Incident recorded at {camp_name}",
         level="WARNING",
         category="CAMP",
         context={"camp": camp_name, "type": "camp"},
     )
-    save_to_file()
     return {"status": "ok"}
 
 def incidents_for_camp_data(camp):
-    if not camp.incidents:
-        return []
-    
     def sort_by_date(incidents):
         return incidents.get("date", "")
-    return sorted (camp.incidents, key= sort_by_date)
+
+    if camp_store.in_transaction():
+        # saves are deferred, so the store doesn't have this camp's changes yet
+        return sorted(camp.incidents, key=sort_by_date)
+    return camp_store.incidents_for(camp.camp_id)
 
 
 def info_from_json():
-    with open(data_path('camp_data.json'), 'r') as file:
-        data = json.load(file)
-        for camp in data:
-            print(camp)
+    try:
+        records, _ = camp_store.load_records()
+    except FileNotFoundError:
+        print(f"\n{camp_store.backend().label} not found")
+        return
+    for camp in records:
+        print(camp)
 
 
 def money_earned_per_camp():
@@ -0,0 +1,36 @@
+"""
+Consistency check for the unread counters.
+
+Unread badges read materialized counters instead of the messages and
+notifications themselves: per conversation in each user's message index
+(storage/message_store.py) and per notification category and camp in
+data/notification_counts.json (features/notifications.py). Both are updated
+on every send, read, ack and delete; this checks them against the raw
+stores and can rebuild them:
+
+    python -m features.unread           # report differences
+    python -m features.unread --repair  # rebuild the counters that differ
+"""
+
+import sys
+
+from features.notifications import check_unread_counters
+from storage import message_store
+
+
+def check(repair=False):
+    """Differences between the counters and the stores, as readable lines."""
+    problems = []
+    for user, partners in sorted(message_store.check_indexes(repair=repair).items()):
+        for partner, (stored, expected) in sorted(partners.items()):
+            problems.append(f"messages of {user} with {partner}: {stored} != {expected}")
+    problems.extend(check_unread_counters(repair=repair))
+    return problems
+
+
+if __name__ == "__main__":
+    repair = "--repair" in sys.argv[1:]
+    problems = check(repair=repair)
+    print("\n".join(problems) or "Unread counters are consistent.")
+    if problems:
+        print(f"{len(problems)} difference(s)" + (" repaired." if repair else "; run with --repair to rebuild."))
@@ -17,7 +17,7 @@ except ImportError:
 from chat_window import open_chat_window, open_group_chat_window
 from user_logins import users, load_logins, check_disabled_logins, save_logins, disabled_logins, enable_login
 from features.admin import list_users
-from camp_class import Camp, save_to_file, read_from_file
+from camp_class import Camp, save_to_file, read_from_file, list_camp_summaries
 from features.logistics import (
     set_food_stock_data,
     top_up_food_data,
@@ -41,6 +41,8 @@ from features.notifications import (
     unmute_category,
     get_thresholds,
     set_thresholds,
+    compact_notifications,
+    retention_policy,
 )
 from features.scout import (
     assign_camps_to_leader,
@@ -100,6 +102,11 @@ def _inline_error(frame, message):
     return lbl
 
 
+def _warn_not_saved(what):
+    """Tell the user a save was rejected because another session changed the data first."""
+    messagebox.showwarning("Not saved", f"{what} was changed by another session. Please try again.")
+
+
 def build_button_row(parent, buttons, style="Card.TFrame", padx=4, pady=4):
     """Create a horizontal row of buttons. buttons: list of (text, command, style_name)."""
     row = ttk.Frame(parent, style=style)
@@ -149,15 +156,20 @@ def _build_shell(master, username, role, sections):
     return content, nav, nav_buttons, nav_map
 
 
-def _init_nav_with_badge(owner, username, role, sections, notif_filter=None):
-    """Build nav shell, wire notification badge updater, and return (content, nav)."""
+def _init_nav_with_badge(owner, username, role, sections, notif_filter=None, notif_scope=None):
+    """
+    Build nav shell, wire notification badge updater, and return (content, nav).
+    `notif_scope` (count_unread's categories/camps) is what the badge counts and
+    should match `notif_filter`, which the notifications window applies.
+    """
     content, nav, nav_buttons, nav_map = _build_shell(owner, username, role, sections)
     owner._nav_buttons = nav_buttons
     owner._nav_map = nav_map
     owner._notif_filter = notif_filter
+    owner._notif_scope = notif_scope or {}
 
     def refresh_badge():
-        unread = count_unread(username, filter_fn=owner._notif_filter)
+        unread = count_unread(username, **owner._notif_scope)
         btn = owner._nav_map.get("Notifications")
         if not btn:
             return
@@ -246,7 +258,7 @@ def open_notifications_window(master, refresh_badge_cb=None, filter_fn=None, use
             for n in filtered:
                 key = (n.get("level"), n.get("category"), n.get("message"))
                 grouped.setdefault(key, {"sample": n, "count": 0})
-                grouped[key]["count"] += 1
+                grouped[key]["count"] += n.get("count", 1)
             current_items = []
             if not grouped:
                 listbox.insert("end", "No notifications.")
@@ -268,6 +280,8 @@ def open_notifications_window(master, refresh_badge_cb=None, filter_fn=None, use
                     level = n.get("level", "INFO")
                     cat = n.get("category", "GENERAL")
                     prefix = f"*{cat.upper()}* : *{level.upper()}*"
+                    if n.get("count", 1) > 1:
+                        message = f"{message} (x{n['count']})"
                     line = f"{prefix} - {timestamp} - {message}" if timestamp else f"{prefix} - {message}"
                     listbox.insert("end", line)
 
@@ -347,7 +361,7 @@ def _unread_count(filter_fn=None, username=None):
     notes = load_notifications(username=username)
     if filter_fn:
         notes = [n for n in notes if filter_fn(n)]
-    return len([n for n in notes if not n.get("read_by") or (username and username not in n.get("read_by"))])
+    return len([n for n in notes if not n.get("read")])
 
 
 def open_schedule_window(master, username=None, restrict_to_user=False):
@@ -1367,6 +1381,7 @@ class LogisticsWindow(ttk.Frame):
             "Logistics Coordinator",
             sections,
             notif_filter=logistics_notif_filter,
+            notif_scope={"categories": LOGISTICS_NOTIF_CATEGORIES},
         )
         self._sections = sections
 
@@ -1526,7 +1541,10 @@ class LogisticsWindow(ttk.Frame):
                     err_lbl.set("Please enter a whole number.")
                     return
                 res = set_food_stock_data(camp, val)
-                messagebox.showinfo("Result", res.get("status"))
+                if res.get("status") == "conflict":
+                    _warn_not_saved(camp.name)
+                else:
+                    messagebox.showinfo("Result", res.get("status"))
                 top.destroy()
 
             ttk.Button(frame, text="Save", command=submit, style="Primary.TButton").pack(fill="x", pady=(4, 0))
@@ -1601,7 +1619,10 @@ class LogisticsWindow(ttk.Frame):
                     err_lbl.set("Please enter a whole number.")
                     return
                 res = top_up_food_data(camp, val)
-                messagebox.showinfo("Result", res.get("status"))
+                if res.get("status") == "conflict":
+                    _warn_not_saved(camp.name)
+                else:
+                    messagebox.showinfo("Result", res.get("status"))
                 top.destroy()
 
             ttk.Button(frame, text="Save", command=submit, style="Primary.TButton").pack(fill="x", pady=(4, 0))
@@ -1634,7 +1655,10 @@ class LogisticsWindow(ttk.Frame):
                 err_lbl.set("Please enter a whole number.")
                 return
             res = set_pay_rate_data(camp, val)
-            messagebox.showinfo("Result", res.get("status"))
+            if res.get("status") == "conflict":
+                _warn_not_saved(camp.name)
+            else:
+                messagebox.showinfo("Result", res.get("status"))
             top.destroy()
 
         ttk.Button(frame, text="Save", command=submit, style="Primary.TButton").pack(fill="x", pady=(4, 0))
@@ -1784,9 +1808,11 @@ class LogisticsWindow(ttk.Frame):
                 return
 
             read_from_file()
-            Camp(name, location, camp_type, start_date, end_date, food_stock)
+            new_camp = Camp(name, location, camp_type, start_date, end_date, food_stock)
+            if not save_to_file(new_camp):
+                _warn_not_saved("The camp list")
+                return
             add_notification(f"Camp {name} created")
-            save_to_file()
             messagebox.showinfo("Success", f"Camp {name} created.")
             top.destroy()
 
@@ -1910,8 +1936,11 @@ class LogisticsWindow(ttk.Frame):
             camp_obj.end_date = new_end or camp_obj.end_date
             camp_obj.food_stock = nf
             camp_obj.pay_rate = pr
+            if not save_to_file(camp_obj):
+                _warn_not_saved(camp_obj.name)
+                top.destroy()
+                return
             add_notification(f"Camp {camp_obj.name} edited")
-            save_to_file()
             messagebox.showinfo("Success", "Camp updated.")
             top.destroy()
 
@@ -1946,8 +1975,11 @@ class LogisticsWindow(ttk.Frame):
                 return
             camps.remove(camp_obj)
             Camp.all_camps = camps
+            if not save_to_file():
+                _warn_not_saved(camp_obj.name)
+                top.destroy()
+                return
             add_notification(f"Camp {camp_obj.name} deleted")
-            save_to_file()
             messagebox.showinfo("Success", f"Camp '{camp_obj.name}' deleted.")
             top.destroy()
 
@@ -1958,7 +1990,7 @@ class LogisticsWindow(ttk.Frame):
         open_chat_window(self.master, self.username, role="logistics coordinator")
 
     def choose_camp_name(self, title="Select a camp", subtitle=None):
-        camps = read_from_file()
+        camps = list_camp_summaries()
         if not camps:
             messagebox.showinfo("Camps", "No camps exist.")
             return None
@@ -2049,6 +2081,7 @@ class ScoutWindow(ttk.Frame):
         camps = read_from_file()
         supervised_names = {c.name for c in camps if self.username in c.scout_leaders}
         self._notif_filter = lambda n: (n.get("context") or {}).get("camp") in supervised_names
+        self._notif_scope = {"camps": supervised_names}
         self._refresh_notification_badge()
 
         # HERO
@@ -2236,7 +2269,9 @@ class ScoutWindow(ttk.Frame):
             if self.username in camp.scout_leaders:
                 camp.scout_leaders.remove(self.username)
         
-        save_to_file()
+        if not save_to_file():
+            _warn_not_saved("The camp list")
+            return
         messagebox.showinfo("Updated", "You are no longer supervising the selected camp(s).")
 
 
@@ -2427,7 +2462,8 @@ class ScoutWindow(ttk.Frame):
             if name in camp.campers_info:
                 del camp.campers_info[name]
 
-            save_to_file()   
+            if not save_to_file(camp):
+                _warn_not_saved(camp.name)
             refresh_campers()
         
         ttk.Button(frame, text="Delete selected camper", command=delete_selected_camper, style="Danger.TButton").pack(fill="x", pady=(0, 0))
@@ -2532,7 +2568,7 @@ class ScoutWindow(ttk.Frame):
         return tree, details_text, {}
 
     def food_req_ui(self):
-        camps = read_from_file()
+        camps = list_camp_summaries()
         if not camps:
             messagebox.showinfo("Food", "No camps exist.")
             return
@@ -2643,6 +2679,8 @@ class ScoutWindow(ttk.Frame):
             if status == "ok":
                 messagebox.showinfo("Success", f"Entry recorded for {camp_name} on {date}.")
                 top.destroy()
+            elif status == "conflict":
+                _warn_not_saved(camp_name)
             else:
                 show_error_toast(self.master, "Error", status or "Unknown error")
 
@@ -2650,7 +2688,7 @@ class ScoutWindow(ttk.Frame):
         center_in_place(top)
 
     def view_activities_ui(self):
-        camps = read_from_file()
+        camps = list_camp_summaries()
         if not camps:
             messagebox.showinfo("Activities", "No camps exist.")
             return
@@ -2798,7 +2836,9 @@ class ScoutWindow(ttk.Frame):
                     camp.daily_food_usage[date] -= food_used
                     if camp.daily_food_usage[date] <= 0:
                         del camp.daily_food_usage[date]
-            save_to_file()
+            if not save_to_file(camp):
+                _warn_not_saved(camp.name)
+                return
 
             tree.delete(item_id)
             del item_details[item_id]
@@ -2907,6 +2947,8 @@ class ScoutWindow(ttk.Frame):
             if res.get("status") == "ok":
                 messagebox.showinfo("Saved", "Incident recorded.")
                 top.destroy()
+            elif res.get("status") == "conflict":
+                _warn_not_saved(camp_name)
             else:
                 messagebox.showerror("Error", "Could not save incident.")
 
@@ -2914,7 +2956,7 @@ class ScoutWindow(ttk.Frame):
         center_in_place(top)
 
     def view_incidents_ui(self):
-        camps = read_from_file()
+        camps = list_camp_summaries()
         if not camps:
             messagebox.showinfo("Incidents", "No camps exist.")
             return
@@ -3042,7 +3084,9 @@ class ScoutWindow(ttk.Frame):
                 return
             info["status"] = "Resolved"
             info["resolved_at"] = datetime.now().strftime("%Y-%m-%d %H:%M")
-            save_to_file()
+            if not save_to_file(camp):
+                _warn_not_saved(camp.name)
+                return
             tree.item(item_id, values=(
                 info.get("date", ""),
                 info.get("severity", "Medium"),
@@ -3074,7 +3118,9 @@ class ScoutWindow(ttk.Frame):
                 camp.incidents.remove(info)
             except ValueError:
                 pass
-            save_to_file()
+            if not save_to_file(camp):
+                _warn_not_saved(camp.name)
+                return
 
             tree.delete(item_id)
             del item_details[item_id]
@@ -3507,6 +3553,20 @@ def center_in_place(win):
         pass
 
 
+def _schedule_notification_compaction(root):
+    """Compact notifications now, then every compact_every_hours while the GUI runs."""
+    def run():
+        try:
+            compact_notifications()
+        except Exception as e:
+            print(f"Notification compaction failed: {e}")
+        hours = retention_policy().get("compact_every_hours")
+        if hours:
+            root.after(int(hours * 3600 * 1000), run)
+
+    run()
+
+
 def launch_login():
     root = tk.Tk()
     root.withdraw()
@@ -3517,6 +3577,7 @@ def launch_login():
     init_style(root)
     LoginWindow(root)
     center_window(root, width=1120, height=820)
+    _schedule_notification_compaction(root)
     root.deiconify()
     root.mainloop()
 
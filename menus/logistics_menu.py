@@ -156,10 +156,11 @@ def run(users):
                 continue
             print("\n--- Notifications ---")
             for n in notes:
-                icon = "✓" if username in n.get("read_by", []) else "•"
+                icon = "✓" if n.get("read") else "•"
                 ts = n.get("timestamp", "unknown time")
                 lvl = n.get("level", "INFO")
-                print(f"{icon} [{lvl}] [{ts}] {n.get('message','')}")
+                repeats = f" (x{n['count']})" if n.get("count", 1) > 1 else ""
+                print(f"{icon} [{lvl}] [{ts}] {n.get('message','')}{repeats}")
 
             mark_all_as_read(username)
             
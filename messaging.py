@@ -1,35 +1,32 @@
 # messaging.py
 
+import csv
+import heapq
 import json
 import os
-import shutil
 from datetime import datetime
-from utils import data_path
-from camp_class import read_from_file, save_to_file
-from typing import List, Optional, Dict, Any
-
-MESSAGES_FILE = data_path("messages.json")
+from camp_class import list_camp_summaries
+from storage import attachments, chat_store, locking, message_archive, message_store, search_index
+from typing import List, Optional, Dict, Any, Iterable, Iterator, TextIO
 
 
 # ---------- helpers to load/save ----------
 
 def load_messages():
-    if not os.path.exists(MESSAGES_FILE):
-        return []
-
-    try:
-        with open(MESSAGES_FILE, "r") as f:
-            data = json.load(f)
-            messages = data.get("messages", [])
-            return [_normalize_message(m) for m in messages]
-    except (json.JSONDecodeError, FileNotFoundError):
-        return []
+    """Every direct message; prefer _load_thread() when one conversation will do."""
+    return [_normalize_message(m) for m in message_store.all_messages()]
 
 
 def save_messages(messages):
-    data = {"messages": messages}
-    with open(MESSAGES_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    message_store.replace_all(messages)
+
+
+def _load_thread(username, other):
+    return [_normalize_message(m) for m in message_store.load_thread(username, other)]
+
+
+def _save_thread(username, other, thread):
+    message_store.save_thread(username, other, thread)
 
 
 def _normalize_message(msg: Dict[str, Any]) -> Dict[str, Any]:
@@ -46,7 +43,7 @@ def _normalize_message(msg: Dict[str, Any]) -> Dict[str, Any]:
 
 def _camp_recipients(camp_name: str) -> List[str]:
     """Return usernames assigned to a camp (scout leaders)."""
-    camps = read_from_file()
+    camps = list_camp_summaries()
     for camp in camps:
         if camp.name == camp_name:
             return list(set(camp.scout_leaders))
@@ -84,47 +81,70 @@ def count_unread_messages(username, other):
     """
     Count unread messages sent TO `username`.
     If from_user is provided, count only messages from that user.
+    Reads the counters in `username`'s conversation index, not the messages.
     """
-    messages = load_messages()
+    partners = message_store.partners(username)
     if other is None:
-        unread = [
-            msg for msg in messages
-            if msg.get("to") == username and msg.get("read") is False
-        ]
-        return len(unread)
-    else:
-        unread = [
-            msg for msg in messages
-            if msg.get("to") == username
-            and msg.get("from") == other
-            and msg.get("read") is False
-        ]
-    return len(unread)
+        return sum(_unread_in(username, partner, summary) for partner, summary in partners.items())
+    return _unread_in(username, other, partners.get(other))
+
+
+def count_pending_acks(username, other=None):
+    """Count messages to `username` (from `other`, if given) still waiting for an ack."""
+    partners = message_store.partners(username)
+    if other is not None:
+        partners = {other: partners[other]} if other in partners else {}
+    pending = 0
+    for partner, summary in partners.items():
+        if "ack" in summary:
+            pending += summary["ack"]
+        else:
+            pending += len([
+                msg for msg in _load_thread(username, partner)
+                if msg.get("to") == username and msg.get("requires_ack") and not msg.get("acked")
+            ])
+    return pending
+
+
+def _unread_in(username, other, summary):
+    if summary is None:
+        return 0
+    if "unread" in summary:
+        return summary["unread"]
+    # index entry from before the counters; rewritten with them on the next change
+    return len([
+        msg for msg in _load_thread(username, other)
+        if msg.get("to") == username
+        and msg.get("from") == other
+        and msg.get("read") is False
+    ])
         
         
 
+@locking.exclusive(message_store.STORE_LOCK)
 def mark_conversation_as_read(username, other):
     """Mark all messages sent to 'username' from 'other' as read."""
-    messages = load_messages()
+    thread = _load_thread(username, other)
     changed = False
 
-    for msg in messages:
+    for msg in thread:
         if msg["from"] == other and msg["to"] == username and msg.get("read") is False:
             msg["read"] = True
             changed = True
 
     if changed:
-        save_messages(messages)
+        _save_thread(username, other, thread)
 
 
+@locking.exclusive(message_store.STORE_LOCK)
 def acknowledge_conversation(username: str, other: str) -> int:
     """
     Acknowledge all priority messages sent TO username from other that need ack.
     Returns count of messages updated.
     """
-    messages = load_messages()
+    thread = _load_thread(username, other)
     updated = 0
-    for msg in messages:
+    for msg in thread:
         if (
             msg.get("to") == username
             and msg.get("from") == other
@@ -135,97 +155,92 @@ def acknowledge_conversation(username: str, other: str) -> int:
             msg["acked_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             updated += 1
     if updated:
-        save_messages(messages)
+        _save_thread(username, other, thread)
     return updated
 
 
-def acknowledge_message(username: str, other: str, timestamp: str) -> bool:
+def find_message(message_id: str) -> Optional[Dict[str, Any]]:
+    """The message with id `message_id`, or None."""
+    found = message_store.locate(message_id)
+    if found is None:
+        return None
+    _, _, thread, position = found
+    return _normalize_message(thread[position])
+
+
+@locking.exclusive(message_store.STORE_LOCK)
+def acknowledge_message(username: str, message_id: str) -> bool:
     """
-    Acknowledge a specific priority message by timestamp.
+    Acknowledge one priority message sent to `username`.
     Returns True if a message was updated.
     """
-    messages = load_messages()
-    updated = False
-    for msg in messages:
-        if (
-            msg.get("to") == username
-            and msg.get("from") == other
-            and msg.get("requires_ack")
-            and not msg.get("acked")
-            and msg.get("timestamp") == timestamp
-        ):
-            msg["acked"] = True
-            msg["acked_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            updated = True
-            break
-    if updated:
-        save_messages(messages)
-    return updated
+    found = message_store.locate(message_id)
+    if found is None:
+        return False
+    a, b, thread, position = found
+    msg = _normalize_message(thread[position])
+    if msg.get("to") != username or not msg.get("requires_ack") or msg.get("acked"):
+        return False
+    msg["acked"] = True
+    msg["acked_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _save_thread(a, b, thread)
+    return True
 
 
-def pin_message(username: str, other: str, timestamp: Optional[str] = None, pinned: bool = True) -> bool:
+@locking.exclusive(message_store.STORE_LOCK)
+def pin_message(username: str, other: str, message_id: Optional[str] = None, pinned: bool = True) -> bool:
     """
     Pin/unpin a message in the conversation. Default: pin latest message.
     Returns True if a message was updated.
     """
-    thread = get_conversation(username, other)
-    if not thread:
+    if message_id is None:
+        thread = get_conversation(username, other)
+        if not thread:
+            return False
+        message_id = thread[-1].get("id")
+    found = message_store.locate(message_id)
+    if found is None or username not in found[:2]:
         return False
+    a, b, thread, position = found
+    msg = thread[position]
+    msg["pinned"] = pinned
+    msg["pinned_by"] = username
+    _save_thread(a, b, thread)
+    return True
 
-    target = None
-    if timestamp:
-        for msg in thread:
-            if msg.get("timestamp") == timestamp:
-                target = msg
-                break
-    else:
-        target = thread[-1]  # latest
 
-    if not target:
+def unpin_message(username: str, message_id: str) -> bool:
+    found = message_store.locate(message_id)
+    if found is None:
         return False
+    a, b = found[:2]
+    return pin_message(username, b if a == username else a, message_id, pinned=False)
 
-    messages = load_messages()
-    for msg in messages:
-        if msg is target or (
-            msg.get("timestamp") == target.get("timestamp")
-            and msg.get("from") == target.get("from")
-            and msg.get("to") == target.get("to")
-            and msg.get("text") == target.get("text")
-        ):
-            msg["pinned"] = pinned
-            msg["pinned_by"] = username
-            save_messages(messages)
-            return True
-    return False
+
+def delete_message(username: str, message_id: str) -> bool:
+    """Delete a message `username` sent (for both sides). Returns True if deleted."""
+    msg = find_message(message_id)
+    if msg is None or msg.get("from") != username:
+        return False
+    return message_store.remove(message_id) is not None
 
 
 # ---------- core chat logic ----------
 
-def _persist_attachment(path: str) -> Optional[str]:
-    """Copy attachment into data/attachments and return stored path."""
+def _persist_attachment(path: str, refs: int = 1) -> Optional[Dict[str, Any]]:
+    """Store attachment in data/attachments (once per content) and return its reference."""
     if not path:
         return None
-    if not os.path.exists(path):
-        return None
-    try:
-        attach_dir = data_path("attachments")
-        os.makedirs(attach_dir, exist_ok=True)
-        filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.path.basename(path)}"
-        dest = os.path.join(attach_dir, filename)
-        shutil.copy(path, dest)
-        # store relative path so repo stays portable
-        rel = os.path.relpath(dest, os.path.dirname(MESSAGES_FILE))
-        return rel
-    except OSError:
-        return None
+    return attachments.put(path, refs=refs)
 
 
+@locking.exclusive(message_store.STORE_LOCK)
 def send_message(sender: str, recipient: str, text: str, *, priority: bool = False,
                  attachment: Optional[str] = None, requires_ack: bool = False,
-                 metadata: Optional[Dict[str, Any]] = None):
+                 metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Send a direct message; returns its id."""
     stored_attachment = _persist_attachment(attachment) if attachment else None
-    messages = load_messages()
-    messages.append({
+    return message_store.append({
         "from": sender,
         "to": recipient,
         "text": text,
@@ -238,44 +253,55 @@ def send_message(sender: str, recipient: str, text: str, *, priority: bool = Fal
         "attachment": stored_attachment,
         "metadata": metadata or {},
     })
-    save_messages(messages)
 
 
 def send_broadcast(sender: str, recipients: List[str], text: str, *, priority: bool = False,
                    attachment: Optional[str] = None, requires_ack: bool = False,
-                   metadata: Optional[Dict[str, Any]] = None):
-    """Send the same message to many recipients (one entry per recipient)."""
-    metadata = metadata or {}
-    for r in recipients:
-        if r == sender:
-            continue
-        send_message(sender, r, text, priority=priority,
-                     attachment=attachment, requires_ack=requires_ack,
-                     metadata={"broadcast": True, **metadata})
+                   metadata: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Send the same message to many recipients in one batch. The text and
+    attachment are stored once; each recipient gets a delivery record of
+    their own (read/ack/pin state). Returns the delivery ids.
+    """
+    recipients = [r for r in dict.fromkeys(recipients) if r != sender]
+    if not recipients:
+        return []
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    body = {
+        "text": text,
+        "attachment": _persist_attachment(attachment, refs=len(recipients)) if attachment else None,
+        "metadata": {"broadcast": True, **(metadata or {})},
+    }
+    deliveries = [
+        {
+            "from": sender,
+            "to": r,
+            "timestamp": timestamp,
+            "read": False,
+            "priority": priority,
+            "requires_ack": requires_ack or priority,
+            "acked": False,
+            "pinned": False,
+        }
+        for r in recipients
+    ]
+    return message_store.broadcast(body, deliveries)
 
 
 def get_conversations_for_user(username):
     """Return a sorted list of usernames this user has chatted with."""
-    messages = load_messages()
-    others = set()
-
-    for msg in messages:
-        if msg["from"] == username:
-            others.add(msg["to"])
-        elif msg["to"] == username:
-            others.add(msg["from"])
+    return sorted(message_store.partners(username))
 
-    return sorted(others)
 
-
-def get_conversation(username, other):
-    """All messages between username and other, ordered by time."""
-    messages = load_messages()
-    thread = [
-        msg for msg in messages
-        if (msg["from"] == username and msg["to"] == other)
-        or (msg["from"] == other and msg["to"] == username)
-    ]
+def get_conversation(username, other, include_archived=False):
+    """
+    All messages between username and other, ordered by time. Messages moved
+    to the archive (storage.message_archive) are only included on request.
+    """
+    thread = _load_thread(username, other)
+    if include_archived:
+        hot = {m.get("id") for m in thread}
+        thread = [_normalize_message(m) for m in message_archive.load(username, other, exclude_ids=hot)] + thread
     # Already roughly ordered by append, but sort just in case
     thread.sort(key=lambda m: m["timestamp"])
     return thread
@@ -283,53 +309,135 @@ def get_conversation(username, other):
 
 def search_messages(username: str, *, query: Optional[str] = None, other: Optional[str] = None,
                     date_from: Optional[str] = None, date_to: Optional[str] = None,
-                    priority_only: bool = False) -> List[Dict[str, Any]]:
+                    priority_only: bool = False, sender: Optional[str] = None,
+                    include_archived: bool = False) -> List[Dict[str, Any]]:
     """
     Search messages involving `username` with optional filters.
-    date_from/date_to are strings "YYYY-MM-DD".
+    Each query word matches words it is a prefix of (see storage.search_index).
+    date_from/date_to are strings "YYYY-MM-DD". Archived matches are only
+    loaded (from the months they are in) with `include_archived`.
     """
-    messages = load_messages()
-
-    def _involved(msg):
-        return msg.get("from") == username or msg.get("to") == username
-
-    def _match(msg):
-        if other and not (
-            (msg.get("from") == username and msg.get("to") == other)
-            or (msg.get("from") == other and msg.get("to") == username)
-        ):
-            return False
-        if priority_only and not msg.get("priority"):
-            return False
-        if query and query.lower() not in msg.get("text", "").lower():
-            return False
-        ts = msg.get("timestamp", "")
-        if date_from and ts < f"{date_from} 00:00:00":
-            return False
-        if date_to and ts > f"{date_to} 23:59:59":
-            return False
-        return True
-
-    return [m for m in messages if _involved(m) and _match(m)]
+    hits = search_index.search(
+        query, user=username, other=other, sender=sender, date_from=date_from,
+        date_to=date_to, priority_only=priority_only, kinds=("dm",),
+    )
+    threads = {}
+    for _, message_id, frm, to, ts, _ in hits:
+        threads.setdefault(frozenset((frm, to)), {})[message_id] = ts
+    found = {}
+    for pair, ids in threads.items():
+        a, b = sorted(pair) if len(pair) == 2 else (username, username)
+        found.update((m["id"], m) for m in _load_thread(a, b) if m.get("id") in ids)
+        missing = [ts for message_id, ts in ids.items() if message_id not in found]
+        if include_archived and missing:
+            archived = message_archive.load(a, b, date_from=min(missing), date_to=max(missing))
+            found.update((m["id"], _normalize_message(m)) for m in archived if m.get("id") in ids)
+    return [found[message_id] for _, message_id, *_ in hits if message_id in found]
+
+
+def search_group_chat(camp_ids: List[str], *, query: Optional[str] = None, sender: Optional[str] = None,
+                      date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Search the group chats of the given camps; results carry their `camp_id`."""
+    hits = search_index.search(
+        query, camp_ids=list(camp_ids), sender=sender, date_from=date_from, date_to=date_to, kinds=("gc",),
+    )
+    by_camp = {}
+    for _, seq, _, camp_id, _, _ in hits:
+        by_camp.setdefault(camp_id, []).append(seq)
+    found = {}
+    for camp_id, seqs in by_camp.items():
+        found.update(((camp_id, m["seq"]), dict(m, camp_id=camp_id)) for m in chat_store.get(camp_id, seqs))
+    return [found[(camp_id, seq)] for _, seq, _, camp_id, _, _ in hits if (camp_id, seq) in found]
+
+
+def has_archived_history(username: str, other: str) -> bool:
+    """True if some of the conversation has been moved to the archive."""
+    return bool(archived_months(username, other))
+
+
+def archived_months(username: str, other: str) -> List[str]:
+    """Months ("YYYY-MM") of the conversation that are in the archive, oldest first."""
+    return message_archive.months(username, other)
+
+
+def get_archived_month(username: str, other: str, month: str, exclude_ids: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """The archived messages between username and other from one month, ordered by time."""
+    messages = [
+        _normalize_message(m)
+        for m in message_archive.load(username, other, f"{month}-01", f"{month}-31", exclude_ids=exclude_ids)
+    ]
+    messages.sort(key=lambda m: m["timestamp"])
+    return messages
 
 
-def export_conversation(username: str, other: str, filepath: str) -> bool:
-    """Export conversation as plain text file. Returns True on success."""
+def iter_conversation(username: str, other: str, include_archived: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Like get_conversation, but yields messages as they are read: the thread,
+    merged with the archive one monthly segment at a time.
+    """
     thread = get_conversation(username, other)
+    if not include_archived:
+        return iter(thread)
+    hot = {m.get("id") for m in thread}
+    archived = (
+        _normalize_message(m)
+        for m in message_archive.iter_messages(username, other, predicate=lambda m: m.get("id") not in hot)
+    )
+    return heapq.merge(archived, thread, key=lambda m: m.get("timestamp", ""))
+
+
+EXPORT_FORMATS = ("text", "csv", "jsonl")
+EXPORT_FIELDS = ["timestamp", "from", "to", "text", "priority", "requires_ack", "acked", "pinned", "attachment"]
+
+
+def export_format(filepath: str) -> str:
+    """Export format for a file name: .csv, .jsonl, anything else text."""
+    ext = os.path.splitext(filepath)[1].lower()
+    return {".csv": "csv", ".jsonl": "jsonl"}.get(ext, "text")
+
+
+def write_transcript(messages: Iterable[Dict[str, Any]], f: TextIO, fmt: str = "text") -> int:
+    """Write `messages` to the open file `f` one at a time; returns how many."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'.")
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_FIELDS)
+    count = 0
+    for msg in messages:
+        attachment = msg.get("attachment")
+        if fmt == "jsonl":
+            f.write(json.dumps(msg) + "\n")
+        elif fmt == "csv":
+            row = dict(msg, attachment=attachments.display_name(attachment) if attachment else "")
+            writer.writerow([row.get(field, "") for field in EXPORT_FIELDS])
+        else:
+            flags = []
+            if msg.get("priority"):
+                flags.append("PRIORITY")
+            if msg.get("requires_ack") and not msg.get("acked"):
+                flags.append("ACK PENDING")
+            if msg.get("pinned"):
+                flags.append("PINNED")
+            flag_str = f" [{' | '.join(flags)}]" if flags else ""
+            attach_str = f" [attachment: {attachments.display_name(attachment)}]" if attachment else ""
+            f.write(f"{msg.get('timestamp')} - {msg.get('from')} -> {msg.get('to')}: {msg.get('text')}{flag_str}{attach_str}\n")
+        count += 1
+    return count
+
+
+def export_conversation(username: str, other: str, filepath: str, include_archived: bool = False,
+                        fmt: Optional[str] = None) -> bool:
+    """
+    Export conversation as a text, CSV or JSON-lines file (by default chosen
+    from the file extension), streaming it message by message. Returns True
+    on success.
+    """
+    fmt = fmt or export_format(filepath)
     try:
-        with open(filepath, "w") as f:
-            for msg in thread:
-                flags = []
-                if msg.get("priority"):
-                    flags.append("PRIORITY")
-                if msg.get("requires_ack") and not msg.get("acked"):
-                    flags.append("ACK PENDING")
-                if msg.get("pinned"):
-                    flags.append("PINNED")
-                flag_str = f" [{' | '.join(flags)}]" if flags else ""
-                attachment = msg.get("attachment")
-                attach_str = f" [attachment: {attachment}]" if attachment else ""
-                f.write(f"{msg.get('timestamp')} - {msg.get('from')} -> {msg.get('to')}: {msg.get('text')}{flag_str}{attach_str}\n")
+        with open(filepath, "w", newline="" if fmt == "csv" else None) as f:
+            write_transcript(iter_conversation(username, other, include_archived), f, fmt)
         return True
     except OSError:
         return False
@@ -370,10 +478,13 @@ def messaging_menu(current_user, users_dict):
             print("\nYour conversations:")
             for i, other in enumerate(conversations, start=1):
                 unread = count_unread_messages(current_user,other)
+                pending = count_pending_acks(current_user, other)
+                counts = []
                 if unread > 0:
-                    unread_num = f" ({unread} unread)"
-                else:
-                    unread_num = ""
+                    counts.append(f"{unread} unread")
+                if pending > 0:
+                    counts.append(f"{pending} awaiting ack")
+                unread_num = f" ({', '.join(counts)})" if counts else ""
                 print(f"[{i}] {other}{unread_num}")
 
 
@@ -423,7 +534,7 @@ def messaging_menu(current_user, users_dict):
                 send_broadcast(current_user, targets, text, priority=_ask_priority())
                 continue
             if recipient.lower() == "c":
-                camps = read_from_file()
+                camps = list_camp_summaries()
                 if not camps:
                     print("No camps available.")
                     continue
@@ -458,9 +569,9 @@ def messaging_menu(current_user, users_dict):
 
         elif choice == "3" and user_role == 'scout leader':  
             assigned_camps = []
-            camps = read_from_file() 
+            camps = list_camp_summaries()
             for camp in camps:
-                if current_user in camp.scout_leaders:  
+                if current_user in camp.scout_leaders:
                     assigned_camps.append(camp)
             if not assigned_camps:
                 print(f"{current_user} is not assigned to any camps.")
@@ -499,7 +610,7 @@ def open_chat(current_user, other):
                     flags.append("PINNED")
                 flag_str = f" [{' | '.join(flags)}]" if flags else ""
                 attach = msg.get("attachment")
-                attach_str = f" [attachment: {attach}]" if attach else ""
+                attach_str = f" [attachment: {attachments.display_name(attach)}]" if attach else ""
                 print(f"{msg['timestamp']} - {who}: {msg['text']}{flag_str}{attach_str}")
 
         print("\nOptions:")
@@ -521,8 +632,9 @@ def open_chat(current_user, other):
         elif choice == "3":
             _search_chat(current_user, other)
         elif choice == "4":
-            path = input("Save to file (path): ").strip()
-            if export_conversation(current_user, other, path):
+            path = input("Save to file (path; .csv or .jsonl for those formats): ").strip()
+            archived = _ask_archived(current_user, other)
+            if export_conversation(current_user, other, path, include_archived=archived):
                 print(f"Saved to {path}")
             else:
                 print("Failed to save.")
@@ -538,6 +650,12 @@ def open_chat(current_user, other):
             print("Invalid choice.")
 
 
+def _ask_archived(current_user: str, other: str) -> bool:
+    if not has_archived_history(current_user, other):
+        return False
+    return input("Include archived (older) messages? (y/N): ").strip().lower() == "y"
+
+
 def _ask_priority() -> bool:
     flag = input("Mark as priority? (y/N): ").strip().lower()
     return flag == "y"
@@ -556,7 +674,9 @@ def _search_chat(current_user: str, other: str):
     query = input("Search text (leave blank for all): ").strip() or None
     date_from = input("Start date YYYY-MM-DD (optional): ").strip() or None
     date_to = input("End date YYYY-MM-DD (optional): ").strip() or None
-    results = search_messages(current_user, query=query, other=other, date_from=date_from, date_to=date_to)
+    archived = _ask_archived(current_user, other)
+    results = search_messages(current_user, query=query, other=other, date_from=date_from, date_to=date_to,
+                              include_archived=archived)
     print(f"\nFound {len(results)} message(s):")
     for msg in results:
         who = "You" if msg["from"] == current_user else other
@@ -600,7 +720,7 @@ def _ack_selective(current_user: str, other: str):
     for i in indices:
         if 1 <= i <= len(pending):
             m = pending[i - 1]
-            if acknowledge_message(current_user, other, m.get("timestamp", "")):
+            if acknowledge_message(current_user, m["id"]):
                 updated += 1
     print(f"Acknowledged {updated} message(s).")
 
@@ -624,7 +744,7 @@ def _select_pin(current_user: str, other: str):
         return
     target = thread[idx - 1]
     now_pin = not target.get("pinned", False)
-    if pin_message(current_user, other, target.get("timestamp"), pinned=now_pin):
+    if pin_message(current_user, other, target["id"], pinned=now_pin):
         state = "Pinned" if now_pin else "Unpinned"
         print(f"{state} selected message.")
 
@@ -647,19 +767,23 @@ def open_group_chat(current_user, assigned_camps):
             while True:  
                 print(f"\n--- Group Chat for {selected_camp.name} ---")
                 
-                group_chat = selected_camp.get_group_chat()
+                group_chat = chat_store.latest(selected_camp.camp_id)
                 if not group_chat:
                     print("(No messages in the group chat yet.)")
                 else:
+                    total = chat_store.count(selected_camp.camp_id)
+                    if total > len(group_chat):
+                        print(f"(Showing the latest {len(group_chat)} of {total} messages.)")
                     for msg in group_chat:
                         attach = msg.get("attachment")
-                        attach_str = f" [attachment: {attach}]" if attach else ""
+                        attach_str = f" [attachment: {attachments.display_name(attach)}]" if attach else ""
                         print(f"{msg['timestamp']} - {msg['from']}: {msg['text']}{attach_str}")
                 
                 print("\nOptions:")
                 print("[1] Send a message/attachment")
                 print("[2] Refresh")
                 print("[3] Back to camp selection")
+                print("[4] Search this chat")
 
                 choice = input("Choose an option: ").strip()
 
@@ -674,6 +798,14 @@ def open_group_chat(current_user, assigned_camps):
                     continue
                 elif choice == "3":
                     break  
+                elif choice == "4":
+                    query = input("Search text (Enter for all): ").strip()
+                    sender = input("From user (optional): ").strip()
+                    results = search_group_chat([selected_camp.camp_id], query=query or None, sender=sender or None)
+                    if not results:
+                        print("No results.")
+                    for msg in results:
+                        print(f"{msg['timestamp']} - {msg['from']}: {msg['text']}")
                 else:
                     print("Invalid choice. Please try again.")
         else:
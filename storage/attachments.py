@@ -0,0 +1,236 @@
+"""
+Content-addressed attachment storage.
+
+Attachments used to be copied into data/attachments/ under a timestamped
+name every time they were sent, so a file sent to many people, or posted
+again in group chat, was stored again each time. A file is now stored once,
+as data/attachments/blobs/<xx>/<sha256> (xx: first two hex digits), and
+messages refer to it as {"sha256": ..., "name": ..., "size": ...}. Files
+are hashed and copied in CHUNK_SIZE pieces, so a large file is never read
+into memory whole, and a file already stored is not copied again.
+
+data/attachments/refs.json counts the messages referring to each blob:
+put() adds references, release() drops them and deletes the blob when none
+are left. collect() deletes blobs nobody refers to; with `recount` it first
+rebuilds the counts from the message and group chat stores, which also
+repairs counts left behind by a send that failed after storing its blob.
+A send stores its blob before its message, so a recount keeps the counted
+references of blobs put() within PUT_GRACE_SECONDS (put() touches the blob).
+
+Messages from before this refer to a path relative to data/, which path_of()
+still resolves.
+
+    python -m storage.attachments            # delete unreferenced blobs
+    python -m storage.attachments --recount  # recount references first
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from storage import durable, locking
+from utils import data_path
+
+ATTACH_DIR = data_path("attachments")
+BLOB_DIR = os.path.join(ATTACH_DIR, "blobs")
+REFS_FILE = os.path.join(ATTACH_DIR, "refs.json")
+CHUNK_SIZE = 1 << 20
+# temp files younger than this may belong to a put() still copying
+STALE_TEMP_SECONDS = 3600
+# blobs put() this recently may belong to a message not saved yet
+PUT_GRACE_SECONDS = 3600
+
+
+def _blob_path(digest):
+    return os.path.join(BLOB_DIR, digest[:2], digest)
+
+
+def _digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _copy(path):
+    """Copy `path` to a temp file in BLOB_DIR; returns (temp path, sha256, size)."""
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=BLOB_DIR, prefix=".blob.", suffix=".tmp")
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+                dst.write(chunk)
+                size += len(chunk)
+            dst.flush()
+            os.fsync(dst.fileno())
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return tmp, sha.hexdigest(), size
+
+
+def _load_refs():
+    try:
+        return durable.load_json(REFS_FILE)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_refs(refs):
+    durable.replace_file(REFS_FILE, json.dumps(refs))
+
+
+def put(path, refs=1):
+    """
+    Store the file at `path` (if not stored already) with `refs` references;
+    returns the attachment reference, or None if the file can't be read.
+    """
+    try:
+        digest = _digest(path)
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    tmp = None
+    while True:
+        if not os.path.exists(_blob_path(digest)):
+            try:
+                # hashed again while copying, in case the file changed meanwhile
+                tmp, digest, size = _copy(path)
+            except OSError:
+                return None
+        with locking.exclusive(REFS_FILE):
+            if tmp is not None:
+                if os.path.exists(_blob_path(digest)):
+                    os.remove(tmp)
+                else:
+                    os.makedirs(os.path.dirname(_blob_path(digest)), exist_ok=True)
+                    os.replace(tmp, _blob_path(digest))
+                tmp = None
+            if os.path.exists(_blob_path(digest)):
+                os.utime(_blob_path(digest))  # see PUT_GRACE_SECONDS
+                counts = _load_refs()
+                counts[digest] = counts.get(digest, 0) + refs
+                _save_refs(counts)
+                return {"sha256": digest, "name": os.path.basename(path), "size": size}
+        # collected between the check and the lock: copy it after all
+
+
+def release(ref, refs=1):
+    """Drop references to an attachment; the blob goes when none are left."""
+    if not isinstance(ref, dict) or not ref.get("sha256"):
+        return  # nothing stored, or a file from before content addressing
+    digest = ref["sha256"]
+    with locking.exclusive(REFS_FILE):
+        counts = _load_refs()
+        left = counts.get(digest, 0) - refs
+        if left > 0:
+            counts[digest] = left
+        else:
+            counts.pop(digest, None)
+            try:
+                os.remove(_blob_path(digest))
+            except FileNotFoundError:
+                pass
+        _save_refs(counts)
+
+
+def path_of(ref):
+    """Absolute path of an attachment reference (either form), or None."""
+    if isinstance(ref, dict):
+        return _blob_path(ref["sha256"]) if ref.get("sha256") else None
+    if not ref:
+        return None
+    return ref if os.path.isabs(ref) else os.path.join(os.path.dirname(ATTACH_DIR), ref)
+
+
+def named_copy(ref):
+    """
+    Path to the attachment under its original file name (a link to the blob
+    in a temp directory), for handing to programs that go by the extension.
+    """
+    path = path_of(ref)
+    if not isinstance(ref, dict) or not path:
+        return path
+    directory = os.path.join(tempfile.gettempdir(), "camptrack-attachments", ref["sha256"][:16])
+    target = os.path.join(directory, os.path.basename(display_name(ref)))
+    if not os.path.exists(target):
+        os.makedirs(directory, exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copyfile(path, target)
+    return target
+
+
+def display_name(ref):
+    """File name to show for an attachment reference (either form)."""
+    if isinstance(ref, dict):
+        return ref.get("name") or ref.get("sha256", "")
+    return os.path.basename(ref or "")
+
+
+def references():
+    """Counter of blob references held by stored messages and group chat."""
+    from storage import chat_store, message_archive, message_store
+    counts = Counter()
+    for message in message_archive.all_messages() + message_store.all_messages():
+        if isinstance(message.get("attachment"), dict):
+            counts[message["attachment"].get("sha256")] += 1
+    for camp_id in chat_store.camp_ids():
+        for message in chat_store.history(camp_id):
+            if isinstance(message.get("attachment"), dict):
+                counts[message["attachment"].get("sha256")] += 1
+    counts.pop(None, None)
+    return counts
+
+
+def _recently_put(digest):
+    try:
+        return time.time() - os.path.getmtime(_blob_path(digest)) < PUT_GRACE_SECONDS
+    except FileNotFoundError:
+        return False
+
+
+def collect(recount=False):
+    """
+    Delete blobs without references (and abandoned temp files); returns
+    (files removed, bytes freed). With `recount`, the reference counts are
+    rebuilt from the stores first.
+    """
+    from storage import message_store
+    removed = freed = 0
+    # same lock order as a send: message store first
+    with locking.shared(message_store.STORE_LOCK), locking.exclusive(REFS_FILE):
+        stored = _load_refs()
+        counts = dict(references()) if recount else stored
+        if recount:
+            for digest, refs in stored.items():
+                if refs > counts.get(digest, 0) and _recently_put(digest):
+                    counts[digest] = refs
+            _save_refs(counts)
+        for root, _, names in os.walk(BLOB_DIR):
+            for name in names:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):
+                    if time.time() - os.path.getmtime(path) < STALE_TEMP_SECONDS:
+                        continue
+                elif counts.get(name, 0) > 0:
+                    continue
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+    return removed, freed
+
+
+if __name__ == "__main__":
+    removed, freed = collect(recount="--recount" in sys.argv[1:])
+    print(f"Removed {removed} unreferenced attachment file(s), {freed} bytes.")
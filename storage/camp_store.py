@@ -0,0 +1,552 @@
+"""
+In-process repository for camp data.
+
+camp_class.read_from_file() is called from almost every screen, often several
+times per action. Re-parsing the camp store each time is wasteful when nothing
+on disk has changed, so the parsed Camp objects are kept here together with
+the signature (mtime, size, inode) of the file that tells us whether the store
+moved on. As long as the signature still matches, callers get the same cached
+instances back.
+
+The on-disk layout is picked with the CAMPTRACK_STORAGE environment variable:
+
+- "json" (default): every camp in data/camp_data.json, rewritten on save.
+- "sharded": one file per camp under data/camps/ plus a small index.json with
+  the header fields of every camp. A save only rewrites the shards of camps
+  whose content changed, so write cost follows the size of one camp rather
+  than the number of camps. The first sharded load imports camp_data.json.
+- "sqlite": tables in data/camptrack.db (see storage.sqlite_backend), which
+  also turns lookups such as find_camp() into indexed queries.
+- "journal": a snapshot plus an append-only log of per-save changes (see
+  storage.journal), so a save is a small append instead of a rewrite.
+
+Backends receive, for every changed camp, the record as it was last
+persisted (`previous`) so they can store just the difference.
+
+List and picker screens only need a few header fields per camp, so
+load_headers() answers from a compact header index instead of the full
+records: the sharded index.json, the camps table in sqlite, or for the other
+modes data/camp_index.json, which is trusted only while it carries the
+current signature of the store.
+
+`with camp_store.transaction():` turns a multi-step action into one unit of
+work: camp saves inside the block are merged into a single save of every
+camp they touched, and the other stores written through storage.durable
+(messages, notifications, ...) are written once each when the block exits.
+If the block raises, nothing it saved is written. Group chat posts are
+appended to their own store once the block's writes have landed, and
+dropped with them (see storage.chat_store.post).
+
+Several processes (GUI desks, CLI jobs) may share data/. Reads take a shared
+lock and saves an exclusive one (storage.locking), and a save first checks
+whether the store moved on since we last read it, or whether the camp objects
+being saved were built from an older read (their version()). If so, every
+camp we are about to write or delete must still be exactly as it was read;
+camps changed only by the other session are merged in untouched. Otherwise
+the save is rejected with ConflictError instead of overwriting newer data.
+"""
+
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+from storage import durable, locking
+from utils import data_path
+
+CAMP_FILE = data_path("camp_data.json")
+SHARD_DIR = data_path("camps")
+HEADER_FILE = data_path("camp_index.json")
+STORE_LOCK = data_path("camp_store")  # locked as data/camp_store.lock
+STORAGE_MODE = os.environ.get("CAMPTRACK_STORAGE", "json").strip().lower()
+
+# Fields kept in the header index so list views can avoid full records.
+HEADER_FIELDS = ("name", "location", "camp_type", "start_date", "end_date", "scout_leaders")
+
+# signature of the store when `camps` was loaded/saved, and the list itself
+_cache = {"signature": None, "camps": None}
+# camp_id -> serialized record as last read from / written to disk
+_persisted = {}
+# serialized records by camp_id as of one store signature, for load_record()
+# in backends that can't read a single camp
+_by_id = {"signature": None, "records": {}}
+# store signature at which every _persisted entry was known to match disk
+_basis = {"signature": None}
+# per-thread state of transaction()
+_tx = threading.local()
+
+
+class ConflictError(RuntimeError):
+    """A camp being saved was changed or deleted by another session since it was read."""
+
+    def __init__(self, names):
+        super().__init__("changed by another session: " + ", ".join(names))
+        self.names = names
+
+
+def _serialize(record):
+    return json.dumps(record, sort_keys=True)
+
+
+def version(camp_id):
+    """Token for the stored record of `camp_id` as last read or written here (None if unknown)."""
+    text = _persisted.get(camp_id)
+    return None if text is None else hash(text)
+
+
+class JsonCampBackend:
+    """All camps in one JSON list (the original camp_data.json layout)."""
+
+    label = "camp_data.json"
+    rewrites_all = True
+
+    def signature(self):
+        return durable.file_signature(CAMP_FILE)
+
+    def load(self):
+        """Return the list of camp records; raises FileNotFoundError/ValueError."""
+        text = durable.read_text(CAMP_FILE)
+        return json.loads(text) if text.strip() else []
+
+    def write(self, records, changed, deleted, previous=None):
+        # A single blob has no cheaper option than rewriting everything.
+        durable.write_json(CAMP_FILE, records)
+
+
+class ShardedCampBackend:
+    """One JSON file per camp in data/camps/, ordered by data/camps/index.json."""
+
+    label = "camps/index.json"
+
+    def __init__(self):
+        self.index_file = os.path.join(SHARD_DIR, "index.json")
+        # Touched on every write; cheaper to watch than every shard.
+        self.stamp_file = os.path.join(SHARD_DIR, "generation")
+
+    def _shard_path(self, camp_id):
+        return os.path.join(SHARD_DIR, f"{camp_id}.json")
+
+    def signature(self):
+        return durable.file_signature(self.stamp_file)
+
+    def _read_index(self):
+        return durable.load_json(self.index_file).get("camps", [])
+
+    def _write_index(self, headers):
+        durable.write_json(self.index_file, {"camps": headers})
+
+    def _bump_generation(self):
+        try:
+            generation = int(durable.read_text(self.stamp_file).strip() or 0)
+        except (OSError, ValueError):
+            generation = 0
+        durable.write_text(self.stamp_file, str(generation + 1))
+
+    def _import_legacy(self):
+        """Split camp_data.json into shards the first time sharding is used."""
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        records = JsonCampBackend().load()
+        for record in records:
+            record.setdefault("camp_id", legacy_camp_id(record))
+        self.write(records, {r["camp_id"] for r in records}, set())
+        return records
+
+    def load_headers(self):
+        if not durable.exists(self.index_file):
+            self.load()
+        headers = self._read_index()
+        if any(field not in h for h in headers for field in HEADER_FIELDS):
+            # index written before a header field was added
+            headers = [_header(r) for r in self.load()]
+            self._write_index(headers)
+        return headers
+
+    def load_by_id(self, camp_id):
+        try:
+            return durable.load_json(self._shard_path(camp_id))
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        if not durable.exists(self.index_file):
+            return self._import_legacy()
+        records = []
+        for header in self._read_index():
+            try:
+                records.append(durable.load_json(self._shard_path(header["id"])))
+            except FileNotFoundError:
+                print(f"\nCamp shard for '{header.get('name')}' is missing; skipping.")
+        return records
+
+    def write(self, records, changed, deleted, previous=None):
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        for record in records:
+            if record["camp_id"] in changed:
+                durable.write_json(self._shard_path(record["camp_id"]), record)
+        for camp_id in deleted:
+            durable.remove(self._shard_path(camp_id))
+
+        try:
+            old_headers = self._read_index()
+        except (FileNotFoundError, json.JSONDecodeError):
+            old_headers = []
+        headers = [_header(r) for r in records]
+        if deleted or headers != old_headers:
+            self._write_index(headers)
+        self._bump_generation()
+
+
+def _header(record):
+    header = {"id": record["camp_id"]}
+    for field in HEADER_FIELDS:
+        header[field] = record.get(field)
+    return header
+
+
+def legacy_camp_id(record):
+    """Stable id for records saved before camps carried one."""
+    return uuid.uuid5(uuid.NAMESPACE_URL, f"camptrack:{record.get('name', '')}").hex
+
+
+def _sqlite_backend():
+    from storage.sqlite_backend import SqliteCampBackend
+    return SqliteCampBackend()
+
+
+def _journal_backend():
+    from storage.journal import JournalCampBackend
+    return JournalCampBackend()
+
+
+_BACKENDS = {
+    "json": JsonCampBackend,
+    "sharded": ShardedCampBackend,
+    "sqlite": _sqlite_backend,
+    "journal": _journal_backend,
+}
+_backend = None
+
+
+def backend():
+    """Return the active storage backend (chosen by CAMPTRACK_STORAGE)."""
+    global _backend
+    if _backend is None:
+        _backend = _BACKENDS.get(STORAGE_MODE, JsonCampBackend)()
+    return _backend
+
+
+def find_record(name):
+    """
+    Return the stored record of the camp called `name`, or None.
+
+    Only backends with an index (sqlite) can answer this without loading every
+    camp; for the others this returns NotImplemented so the caller can fall
+    back to scanning read_from_file().
+    """
+    lookup = getattr(backend(), "load_by_name", None)
+    if lookup is None:
+        return NotImplemented
+    with locking.shared(STORE_LOCK):
+        record = lookup(name)
+    if record is not None:
+        _persisted[record["camp_id"]] = _serialize(record)
+    return record
+
+
+def incidents_for(camp_id):
+    """
+    Return the stored incidents of one camp ordered by date (empty if none).
+
+    Backends with an index (sqlite) answer with a single query; for the others
+    the incidents come from load_record().
+    """
+    lookup = getattr(backend(), "incidents_for", None)
+    if lookup is not None:
+        with locking.shared(STORE_LOCK):
+            return lookup(camp_id)
+    record = load_record(camp_id) or {}
+    return sorted(record.get("incidents") or [], key=lambda inc: inc.get("date", ""))
+
+
+def load_headers():
+    """
+    Return the header of every camp in order: a dict with "id" and HEADER_FIELDS.
+
+    Raises like load_records() when the store is missing or unreadable.
+    """
+    own = getattr(backend(), "load_headers", None)
+    if own is not None:
+        with locking.shared(STORE_LOCK):
+            return own()
+    signature = backend().signature()
+    try:
+        index = durable.load_json(HEADER_FILE)
+        if signature is not None and index.get("signature") == list(signature):
+            return index["camps"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+    records, signature = load_records()
+    headers = [_header(r) for r in records]
+    _write_header_index(headers, signature)
+    return headers
+
+
+def _write_header_index(headers, signature):
+    if getattr(backend(), "load_headers", None) is not None or signature is None:
+        return
+    if durable.coalescing():
+        # the store's signature is not final until the writes land
+        durable.after_flush(lambda: _write_header_index(headers, backend().signature()))
+        return
+    durable.replace_file(HEADER_FILE, json.dumps({"signature": list(signature), "camps": headers}, indent=4))
+
+
+def _remember_by_id(serialized, signature):
+    """Keep `serialized` ({camp_id: record text}) for load_record() while the store has `signature`."""
+    if signature is not None and not durable.coalescing():  # pending writes are not on disk yet
+        _by_id["signature"] = signature
+        _by_id["records"] = serialized
+
+
+def load_record(camp_id):
+    """
+    Return the stored record of one camp by id, or None. Backends without
+    load_by_id() parse the whole store only when it changed since the last
+    full read; otherwise the record comes from the copy kept then.
+    """
+    lookup = getattr(backend(), "load_by_id", None)
+    with locking.shared(STORE_LOCK):
+        if lookup is not None:
+            record = lookup(camp_id)
+        else:
+            signature = backend().signature()
+            if signature is None or signature != _by_id["signature"] or durable.coalescing():
+                records = backend().load()
+                serialized = {}
+                for r in records:
+                    serialized[r.setdefault("camp_id", legacy_camp_id(r))] = _serialize(r)
+                _remember_by_id(serialized, signature)
+            else:
+                serialized = _by_id["records"]
+            text = serialized.get(camp_id)
+            record = None if text is None else json.loads(text)
+    if record is not None:
+        _persisted[record["camp_id"]] = _serialize(record)
+    return record
+
+
+def load_records():
+    """
+    Load camp records from the active backend.
+
+    Returns (records, signature) where signature was taken before reading so
+    a write that lands while we parse is still noticed on the next call.
+    """
+    with locking.shared(STORE_LOCK):
+        signature = backend().signature()
+        records = backend().load()
+        if signature is None:
+            signature = backend().signature()
+    for record in records:
+        record.setdefault("camp_id", legacy_camp_id(record))
+    _persisted.clear()
+    for record in records:
+        _persisted[record["camp_id"]] = _serialize(record)
+    _remember_by_id(dict(_persisted), signature)
+    _basis["signature"] = signature
+    return records, signature
+
+
+def save_records(records, camps, only=None, versions=None):
+    """
+    Persist camp records, writing only what changed since the last load/save.
+
+    `records` is the full ordered list of camp records built from `camps`
+    (Camp.all_camps). When `only` is given (a set of camp ids) just those camps
+    are compared, which keeps a targeted save cheap; deletions are only
+    detected on full saves. Afterwards the cache is pointed at `camps` if that
+    list is known to match what is on disk.
+
+    `versions` maps camp ids to the version() the caller's copy was built
+    from. Raises ConflictError (see module docstring) without writing anything.
+    """
+    with locking.exclusive(STORE_LOCK):
+        _save_records(records, camps, only, versions or {})
+
+
+def _save_records(records, camps, only, versions):
+    was_fresh = cached_camps(camps) is not None
+    candidates = records if only is None else [r for r in records if r["camp_id"] in only]
+    changed = set()
+    serialized = {}
+    for record in candidates:
+        text = _serialize(record)
+        serialized[record["camp_id"]] = text
+        if _persisted.get(record["camp_id"]) != text:
+            changed.add(record["camp_id"])
+
+    deleted = set()
+    if only is None:
+        current = {r["camp_id"] for r in records}
+        deleted = {camp_id for camp_id in _persisted if camp_id not in current}
+
+    signature = backend().signature()
+    if not changed and not deleted and signature is not None:
+        return
+    basis = {camp_id: versions.get(camp_id) or version(camp_id) for camp_id in changed | deleted}
+    merged = signature is not None and (
+        signature != _basis["signature"]
+        or any(basis[camp_id] != version(camp_id) for camp_id in changed)
+    )
+    if merged:
+        records = _merge_with_store(records, changed, deleted, basis)
+    previous = {camp_id: _persisted.get(camp_id) for camp_id in changed}
+    backend().write(records, changed, deleted, previous=previous)
+    for camp_id in changed:
+        _persisted[camp_id] = serialized[camp_id]
+    for camp_id in deleted:
+        _persisted.pop(camp_id, None)
+    if not merged or not getattr(backend(), "partial_writes", False):
+        # _persisted now matches the whole store again
+        durable.after_flush(lambda: _basis.update(signature=backend().signature()))
+
+    # A full rewrite leaves exactly `camps` on disk. A partial write only
+    # does if our list was already in sync; otherwise other camps may be newer.
+    if merged:
+        invalidate()  # the store also holds the other session's changes
+    elif getattr(backend(), "rewrites_all", False) or was_fresh:
+        remember(camps)
+        _write_header_index([_header(r) for r in records], _cache["signature"])
+    else:
+        invalidate()
+
+
+def _merge_with_store(records, changed, deleted, basis):
+    """
+    Version check against a store that may have moved on since we read it.
+
+    Every camp in `changed`/`deleted` must still match the version it was read
+    at (`basis`), else ConflictError. Returns the records to write: for
+    backends that write camp by camp just ours, for the others the current
+    store with our changes applied.
+    """
+    partial = getattr(backend(), "partial_writes", False)
+    lookup = getattr(backend(), "load_by_id", None)
+    if partial and lookup is not None:
+        store = {camp_id: lookup(camp_id) for camp_id in changed | deleted}
+        order = None
+    else:
+        current = backend().load()
+        for record in current:
+            record.setdefault("camp_id", legacy_camp_id(record))
+        store = {r["camp_id"]: r for r in current}
+        order = [r["camp_id"] for r in current]
+
+    ours = {r["camp_id"]: r for r in records}
+    conflicts = []
+    for camp_id in changed | deleted:
+        if basis[camp_id] is None:
+            continue  # a camp we created
+        now = store.get(camp_id)
+        if now is None:
+            if camp_id in changed:
+                conflicts.append(ours[camp_id].get("name", camp_id))  # deleted elsewhere
+        elif hash(_serialize(now)) != basis[camp_id]:
+            conflicts.append(now.get("name", camp_id))
+    if conflicts:
+        raise ConflictError(sorted(conflicts))
+
+    if order is None:
+        return records
+    merged = []
+    for camp_id in order:
+        if camp_id in deleted:
+            continue
+        if camp_id in changed:
+            merged.append(ours[camp_id])
+        else:
+            merged.append(store[camp_id])
+            _persisted[camp_id] = _serialize(store[camp_id])
+    for camp_id in list(_persisted):
+        if camp_id not in store and camp_id not in changed:
+            del _persisted[camp_id]  # deleted by the other session
+    merged.extend(r for r in records if r["camp_id"] in changed and r["camp_id"] not in store)
+    return merged
+
+
+def cached_camps(current):
+    """
+    Return `current` if it is the cached camp list and the store is unchanged.
+
+    `current` is Camp.all_camps; callers that rebind that list (e.g. after a
+    delete) without saving will simply trigger a fresh load.
+    """
+    camps = _cache["camps"]
+    if camps is None or camps is not current:
+        return None
+    signature = backend().signature()
+    if signature is None or signature != _cache["signature"]:
+        return None
+    return camps
+
+
+def remember(camps, signature=None):
+    """Record `camps` as matching the on-disk state."""
+    _cache["signature"] = signature or backend().signature()
+    _cache["camps"] = camps
+    if signature is None and durable.coalescing():
+        # our write is still pending; take the signature once it has landed
+        durable.after_flush(lambda: _cache["camps"] is camps and remember(camps))
+
+
+def invalidate():
+    """Drop the cached camps so the next read goes back to disk."""
+    _cache["signature"] = None
+    _cache["camps"] = None
+    _by_id["signature"] = None
+
+
+def in_transaction():
+    return getattr(_tx, "depth", 0) > 0
+
+
+def defer_save(camp, save):
+    """
+    Inside transaction(): note that `camp` (None for every camp) needs saving.
+
+    `save(camps, full)` is called once when the outermost block exits, with
+    the camps noted and whether a full save was asked for.
+    """
+    _tx.save = save
+    if camp is None:
+        _tx.full = True
+    else:
+        _tx.camps[camp.camp_id] = camp
+
+
+@contextmanager
+def transaction():
+    """Defer camp saves and durable writes until the block exits (see module docstring)."""
+    if in_transaction():
+        _tx.depth += 1
+        try:
+            yield
+        finally:
+            _tx.depth -= 1
+        return
+
+    _tx.depth, _tx.camps, _tx.full, _tx.save = 1, {}, False, None
+    try:
+        with durable.coalesce(discard_on_error=True):
+            try:
+                yield
+            finally:
+                _tx.depth = 0
+            if _tx.save is not None:
+                _tx.save(list(_tx.camps.values()), _tx.full)
+    except BaseException:
+        invalidate()  # in-memory camps may hold changes that were not written
+        raise
+    finally:
+        _tx.depth, _tx.camps, _tx.full, _tx.save = 0, {}, False, None
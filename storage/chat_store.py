@@ -0,0 +1,318 @@
+"""
+Camp group chat storage, kept apart from the camp records.
+
+Group chat used to live inside each camp record, so loading camps meant
+loading every chat message ever sent and posting one line rewrote the whole
+camp store. Messages now go to data/group_chats/<camp_id>/ as append-only
+JSON-lines segments of SEGMENT_SIZE messages each (named after the sequence
+number of their first message). Reading the newest page only touches the last
+segment or two, however long the history is.
+
+With CAMPTRACK_STORAGE=sqlite the group_chat table in data/camptrack.db is
+used instead, queried through its (camp_id, position) index.
+
+Every stored message gets a `seq` number (0 for the first message of a camp)
+which callers can use as a stable paging cursor.
+"""
+
+import json
+import os
+from bisect import bisect_right
+from contextlib import closing
+
+from storage import attachments, camp_store, durable, locking, search_index
+from utils import data_path
+
+CHAT_DIR = data_path("group_chats")
+SEGMENT_SIZE = 200
+DEFAULT_PAGE = 50
+
+
+class SegmentChatStore:
+    """Append-only JSON-lines segments per camp."""
+
+    def _camp_dir(self, camp_id):
+        return os.path.join(CHAT_DIR, camp_id)
+
+    def _segments(self, camp_id):
+        """Sorted list of (first_seq, path) for a camp's segments."""
+        try:
+            names = os.listdir(self._camp_dir(camp_id))
+        except FileNotFoundError:
+            return []
+        segments = []
+        for name in names:
+            stem, ext = os.path.splitext(name)
+            if ext == ".jsonl" and stem.isdigit():
+                segments.append((int(stem), os.path.join(self._camp_dir(camp_id), name)))
+        segments.sort()
+        return segments
+
+    @staticmethod
+    def _read_segment(path):
+        messages = []
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        messages.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue  # torn line from an interrupted append
+        except FileNotFoundError:
+            pass
+        return messages
+
+    def camp_ids(self):
+        try:
+            return sorted(name for name in os.listdir(CHAT_DIR) if os.path.isdir(os.path.join(CHAT_DIR, name)))
+        except FileNotFoundError:
+            return []
+
+    def get(self, camp_id, seqs):
+        """The messages with the given seqs (those that exist), in seq order."""
+        wanted = set(seqs)
+        segments = self._segments(camp_id)
+        firsts = [first_seq for first_seq, _ in segments]
+        needed = {bisect_right(firsts, seq) - 1 for seq in wanted}
+        found = []
+        for i in sorted(n for n in needed if n >= 0):
+            found.extend(m for m in self._read_segment(segments[i][1]) if m.get("seq") in wanted)
+        return found
+
+    def count(self, camp_id):
+        segments = self._segments(camp_id)
+        if not segments:
+            return 0
+        first_seq, path = segments[-1]
+        return first_seq + len(self._read_segment(path))
+
+    def append(self, camp_id, messages):
+        """Append messages (dicts) and return them with their `seq` filled in."""
+        with locking.exclusive(self._camp_dir(camp_id)):
+            return self._append(camp_id, messages)
+
+    def append_if_empty(self, camp_id, messages):
+        """Like append(), but only into a camp without chat (checked under the same lock)."""
+        with locking.exclusive(self._camp_dir(camp_id)):
+            if self.count(camp_id):
+                return []
+            return self._append(camp_id, messages)
+
+    def _append(self, camp_id, messages):
+        segments = self._segments(camp_id)
+        if segments:
+            first_seq, path = segments[-1]
+            in_segment = len(self._read_segment(path))
+        else:
+            first_seq, path, in_segment = 0, None, 0
+        os.makedirs(self._camp_dir(camp_id), exist_ok=True)
+
+        stored = []
+        pending = []
+        for message in messages:
+            if path is None or in_segment >= SEGMENT_SIZE:
+                if pending:
+                    self._write_lines(path, pending)
+                    pending = []
+                first_seq = first_seq + in_segment
+                path = os.path.join(self._camp_dir(camp_id), f"{first_seq:08d}.jsonl")
+                in_segment = 0
+            message = dict(message, seq=first_seq + in_segment)
+            pending.append(message)
+            stored.append(message)
+            in_segment += 1
+        if pending:
+            self._write_lines(path, pending)
+        return stored
+
+    @staticmethod
+    def _write_lines(path, messages):
+        with open(path, "a") as f:
+            f.write("".join(json.dumps(m) + "\n" for m in messages))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def page(self, camp_id, limit=DEFAULT_PAGE, before_seq=None, before_timestamp=None):
+        """Up to `limit` messages (oldest first) older than the given cursor."""
+        collected = []
+        for first_seq, path in reversed(self._segments(camp_id)):
+            if before_seq is not None and first_seq >= before_seq:
+                continue
+            chunk = [
+                m for m in self._read_segment(path)
+                if (before_seq is None or m.get("seq", 0) < before_seq)
+                and (before_timestamp is None or m.get("timestamp", "") < before_timestamp)
+            ]
+            collected = chunk + collected
+            if limit is not None and len(collected) >= limit:
+                break
+        if limit is not None:
+            collected = collected[-limit:]
+        return collected
+
+    def watch_paths(self, camp_id):
+        # a new message appends to the last segment or starts one
+        segments = self._segments(camp_id)
+        return [self._camp_dir(camp_id)] + [path for _, path in segments[-1:]]
+
+    def since(self, camp_id, after_seq):
+        """Messages with seq greater than `after_seq`, oldest first."""
+        collected = []
+        for first_seq, path in reversed(self._segments(camp_id)):
+            collected = [m for m in self._read_segment(path) if m.get("seq", 0) > after_seq] + collected
+            if first_seq <= after_seq:
+                break
+        return collected
+
+
+class SqliteChatStore:
+    """The group_chat table of data/camptrack.db."""
+
+    def _connect(self):
+        from storage.sqlite_backend import connect
+        return connect()
+
+    def camp_ids(self):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT DISTINCT camp_id FROM group_chat ORDER BY camp_id").fetchall()
+        return [camp_id for (camp_id,) in rows]
+
+    def get(self, camp_id, seqs):
+        seqs = sorted(set(seqs))
+        if not seqs:
+            return []
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT message FROM group_chat WHERE camp_id = ? AND position IN ({','.join('?' * len(seqs))}) "
+                "ORDER BY position",
+                [camp_id, *seqs],
+            ).fetchall()
+        return [json.loads(m) for (m,) in rows]
+
+    def count(self, camp_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM group_chat WHERE camp_id = ?", (camp_id,)
+            ).fetchone()
+        return row[0]
+
+    def append(self, camp_id, messages):
+        from storage.sqlite_backend import insert_chat_messages
+        with closing(self._connect()) as conn, conn:
+            return insert_chat_messages(conn, camp_id, messages)
+
+    def append_if_empty(self, camp_id, messages):
+        from storage.sqlite_backend import insert_chat_messages
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")  # no other writer between the check and the insert
+            if conn.execute("SELECT 1 FROM group_chat WHERE camp_id = ? LIMIT 1", (camp_id,)).fetchone():
+                return []
+            return insert_chat_messages(conn, camp_id, messages)
+
+    def page(self, camp_id, limit=DEFAULT_PAGE, before_seq=None, before_timestamp=None):
+        sql = "SELECT message FROM group_chat WHERE camp_id = ?"
+        params = [camp_id]
+        if before_seq is not None:
+            sql += " AND position < ?"
+            params.append(before_seq)
+        if before_timestamp is not None:
+            sql += " AND timestamp < ?"
+            params.append(before_timestamp)
+        sql += " ORDER BY position DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [json.loads(m) for (m,) in reversed(rows)]
+
+    def watch_paths(self, camp_id):
+        from storage.sqlite_backend import DB_FILE
+        return [DB_FILE, DB_FILE + "-journal", DB_FILE + "-wal"]
+
+    def since(self, camp_id, after_seq):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT message FROM group_chat WHERE camp_id = ? AND position > ? ORDER BY position",
+                (camp_id, after_seq),
+            ).fetchall()
+        return [json.loads(m) for (m,) in rows]
+
+
+_store = None
+
+
+def store():
+    global _store
+    if _store is None:
+        _store = SqliteChatStore() if camp_store.STORAGE_MODE == "sqlite" else SegmentChatStore()
+    return _store
+
+
+def post(camp_id, message):
+    """
+    Append one message to a camp's group chat; returns it with its seq.
+
+    Inside durable.coalesce() (and so camp_store.transaction()) the message is
+    posted once the block's writes have landed, or dropped along with its
+    attachment reference if the block is discarded; None is returned then.
+    """
+    if not durable.coalescing():
+        return _append_indexed(camp_id, [message])[0]
+    posted = []
+    durable.after_flush(lambda: posted.extend(_append_indexed(camp_id, [message])))
+    durable.when_done(lambda: posted or attachments.release(message.get("attachment")))
+    return None
+
+
+def _append_indexed(camp_id, messages):
+    """Append messages and index them at once (they are not written through durable)."""
+    stored = store().append(camp_id, messages)
+    search_index.append([search_index.group_entry(camp_id, m) for m in stored])
+    return stored
+
+
+def latest(camp_id, limit=DEFAULT_PAGE):
+    """The newest `limit` messages of a camp, oldest first."""
+    return store().page(camp_id, limit)
+
+
+def before(camp_id, timestamp=None, limit=DEFAULT_PAGE, seq=None):
+    """Up to `limit` messages older than `timestamp` (or than message `seq`)."""
+    return store().page(camp_id, limit, before_seq=seq, before_timestamp=timestamp)
+
+
+def since(camp_id, seq):
+    """Messages posted after message `seq` (pass -1 for everything)."""
+    return store().since(camp_id, seq)
+
+
+def watch_paths(camp_id):
+    """Files that change when a message is posted to the camp (for storage.watch)."""
+    return store().watch_paths(camp_id)
+
+
+def history(camp_id):
+    """The full chat history of a camp, oldest first."""
+    return store().page(camp_id, None)
+
+
+def count(camp_id):
+    return store().count(camp_id)
+
+
+def camp_ids():
+    """Ids of the camps that have any group chat."""
+    return store().camp_ids()
+
+
+def get(camp_id, seqs):
+    """The messages of a camp with the given seqs, in seq order."""
+    return store().get(camp_id, seqs)
+
+
+def import_legacy(camp_id, messages):
+    """Move chat stored inside an old camp record into the chat store, once."""
+    if messages:
+        stored = store().append_if_empty(camp_id, messages)
+        search_index.append([search_index.group_entry(camp_id, m) for m in stored])
@@ -0,0 +1,164 @@
+"""
+Background batching of small store writes.
+
+A Dispatcher hands items (e.g. new notifications) to a `write(batch)`
+function on a daemon thread, so the code producing them doesn't wait for the
+write. The thread wakes up when something is submitted, lets INTERVAL seconds
+of submissions pile up and writes them all in one call. The queue holds at
+most MAX_PENDING items: a producer that finds it full waits for the writer,
+and stats() reports how often and how long that happened.
+
+flush() writes whatever is pending right away (readers call it so they see
+their own process's writes), and everything still pending is flushed when the
+interpreter exits. With `synchronous` set, submit() writes the item itself
+before returning, as if there were no queue.
+
+Items submitted inside storage.durable.coalesce() (and so inside
+camp_store.transaction()) are held back until the block's writes have landed,
+and dropped if the block is discarded, so a rolled-back action leaves no trace
+in this store either. flush() called inside such a block leaves the writing to
+the background thread: writing there would put part of a batch on disk at once
+while the rest waited for the caller's block.
+"""
+
+import atexit
+import queue
+import threading
+import time
+
+from storage import durable
+
+INTERVAL = 0.25
+MAX_PENDING = 1000
+
+
+class Dispatcher:
+    def __init__(self, write, name, interval=INTERVAL, max_pending=MAX_PENDING, synchronous=False):
+        self._write = write
+        self._name = name
+        self._interval = interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._ready = threading.Event()
+        self._stopping = threading.Event()
+        self._hurry = threading.Event()  # write without waiting for more
+        self._writing = threading.Lock()
+        self._thread = None
+        self._started = threading.Lock()
+        self._held = threading.local()  # items submitted inside coalesce()
+        self.synchronous = synchronous
+        self._stats = {
+            "submitted": 0,
+            "written": 0,
+            "batches": 0,
+            "failed": 0,
+            "largest_batch": 0,
+            "most_pending": 0,
+            "producer_waits": 0,
+            "producer_wait_seconds": 0.0,
+        }
+
+    def submit(self, item):
+        """Queue `item` for writing (or write it now, in synchronous mode)."""
+        self._stats["submitted"] += 1
+        if durable.coalescing():
+            self._hold(item)
+            return
+        if self.synchronous or self._stopping.is_set():
+            self._write_batch([item])
+            return
+        self._start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # backpressure: wait for the writer to make room
+            started = time.monotonic()
+            self._ready.set()
+            self._hurry.set()
+            self._queue.put(item)
+            self._stats["producer_waits"] += 1
+            self._stats["producer_wait_seconds"] += time.monotonic() - started
+        self._stats["most_pending"] = max(self._stats["most_pending"], self._queue.qsize())
+        self._ready.set()
+
+    def flush(self):
+        """Write everything submitted so far before returning (see the module docstring for coalesce())."""
+        if durable.coalescing():
+            if self._thread is not None:
+                self._ready.set()
+                self._hurry.set()
+            return
+        with self._writing:
+            self._ready.clear()
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """Counters: items submitted/written/failed, batches, queue high-water mark, producer waits."""
+        return dict(self._stats, pending=self.pending())
+
+    def stop(self):
+        """Flush, and write anything submitted from now on synchronously."""
+        self._stopping.set()
+        self._ready.set()
+        self._hurry.set()
+        self.flush()
+
+    def _hold(self, item):
+        held = getattr(self._held, "items", None)
+        if held is None:
+            held = self._held.items = []
+            durable.after_flush(lambda: self._release(held))
+            durable.when_done(lambda: setattr(self._held, "items", None))
+        held.append(item)
+
+    def _release(self, held):
+        """The block that held `held` was written: queue its items after all."""
+        if self.synchronous or self._stopping.is_set():
+            self._write_batch(held)
+            return
+        self._start()
+        for i, item in enumerate(held):
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                # the caller may still hold locks the writer needs; don't wait for it
+                self._write_batch(held[i:])
+                break
+        self._stats["most_pending"] = max(self._stats["most_pending"], self._queue.qsize())
+        self._ready.set()
+
+    def _write_batch(self, batch):
+        try:
+            self._write(batch)
+        except Exception as e:
+            self._stats["failed"] += len(batch)
+            print(f"Could not write {len(batch)} {self._name}: {e}")
+            return
+        self._stats["written"] += len(batch)
+        self._stats["batches"] += 1
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._started:
+            if self._thread is None:
+                atexit.register(self.stop)
+                self._thread = threading.Thread(target=self._run, name=f"{self._name}-dispatch", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._ready.wait()
+            self._hurry.wait(self._interval)  # let a batch build up
+            self._hurry.clear()
+            self.flush()
@@ -0,0 +1,208 @@
+"""
+Crash-safe writes for the JSON/text stores under data/.
+
+Writing a store used to mean open(path, "w") and dumping into it, so a crash
+half way left a truncated file that the loaders then read as empty. Here a
+write goes to a temporary file in the same directory, is flushed and fsync'd,
+and then renamed over the target, so readers see either the old or the new
+contents, never a mix.
+
+Inside `with durable.coalesce():` writes are held back and only the last
+version of each file is written when the outermost block exits, so a user
+action that saves the same store several times costs one rewrite. Reads made
+through read_text()/load_json() inside the block see the pending contents.
+Pending writes belong to the thread that made them. Code that needs the final
+on-disk state (e.g. a file's new mtime) can register after_flush() callbacks;
+when_done() callbacks run at the end of the block in any case.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+_REMOVED = object()
+_state = threading.local()
+
+
+def _pending():
+    if not hasattr(_state, "pending"):
+        _state.pending = {}  # path -> text, or _REMOVED
+        _state.callbacks = []
+        _state.finishers = []
+        _state.depth = 0
+    return _state.pending
+
+
+def coalescing():
+    """True while the current thread is inside coalesce()."""
+    _pending()
+    return _state.depth > 0
+
+
+def replace_file(path, text):
+    """Atomically replace `path` with `text`, bypassing any coalescing."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    _sync_directory(directory)
+
+
+def _sync_directory(directory):
+    # Makes the rename itself durable; not possible on every platform.
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_text(path, text):
+    """Replace `path` with `text` now, or at the end of the current coalesce()."""
+    pending = _pending()
+    if _state.depth:
+        pending.pop(path, None)  # keep flush order = order of last write
+        pending[path] = text
+    else:
+        replace_file(path, text)
+
+
+def write_json(path, data, indent=4):
+    write_text(path, json.dumps(data, indent=indent))
+
+
+def remove(path):
+    """Delete `path` (missing is fine), deferred like write_text()."""
+    pending = _pending()
+    if _state.depth:
+        pending.pop(path, None)
+        pending[path] = _REMOVED
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_text(path):
+    """Contents of `path`, including a write still pending in this thread."""
+    text = _pending().get(path)
+    if text is _REMOVED:
+        raise FileNotFoundError(path)
+    if text is not None:
+        return text
+    with open(path, "r") as f:
+        return f.read()
+
+
+def load_json(path):
+    """Parse `path` like json.load; raises FileNotFoundError / JSONDecodeError."""
+    return json.loads(read_text(path))
+
+
+def exists(path):
+    text = _pending().get(path)
+    if text is not None:
+        return text is not _REMOVED
+    return os.path.exists(path)
+
+
+def file_signature(path):
+    """Return (mtime_ns, size, inode) for path, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def after_flush(callback):
+    """Run `callback` once pending writes have landed (now, if none are held back)."""
+    _pending()
+    if _state.depth:
+        _state.callbacks.append(callback)
+    else:
+        callback()
+
+
+def when_done(callback):
+    """Run `callback` when the outermost coalesce() ends, whether it wrote or not."""
+    _pending()
+    if _state.depth:
+        _state.finishers.append(callback)
+    else:
+        callback()
+
+
+def flush():
+    """Write everything pending in this thread (in the order it was last written)."""
+    pending = _pending()
+    while pending:
+        path = next(iter(pending))
+        text = pending.pop(path)
+        if text is _REMOVED:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        else:
+            replace_file(path, text)
+    callbacks, _state.callbacks = _state.callbacks, []
+    for callback in callbacks:
+        callback()
+
+
+def discard():
+    """Drop everything pending in this thread without writing it."""
+    _pending().clear()
+    _state.callbacks = []
+
+
+@contextmanager
+def coalesce(discard_on_error=False):
+    """
+    Hold back writes until the outermost block exits, then write each file once.
+
+    With `discard_on_error`, an exception escaping the outermost block drops
+    the pending writes instead of flushing them.
+    """
+    _pending()
+    _state.depth += 1
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        _state.depth -= 1
+        if _state.depth == 0:
+            try:
+                if failed and discard_on_error:
+                    discard()
+                else:
+                    flush()
+            finally:
+                finishers, _state.finishers = _state.finishers, []
+                for callback in finishers:
+                    callback()
@@ -0,0 +1,199 @@
+"""
+Journaled camp storage (CAMPTRACK_STORAGE=journal).
+
+Instead of rewriting every camp on each save, a save appends one line to
+data/camp_journal.jsonl describing what changed: a new activity appended to a
+date, a food stock value, an incident added, and so on. Reads load the last
+snapshot (data/camp_snapshot.json) and replay the journal over it. Once the
+journal grows past JOURNAL_COMPACT_BYTES it is folded into a new snapshot.
+
+Every journal line carries a sequence number and the snapshot records the
+last sequence it contains, so a crash between writing a snapshot and
+truncating the journal cannot apply an entry twice. A line cut short by a
+crash is ignored on replay; everything before it is intact.
+"""
+
+import json
+import os
+from datetime import datetime
+
+from storage import durable
+from storage.camp_store import CAMP_FILE, legacy_camp_id
+from utils import data_path
+
+SNAPSHOT_FILE = data_path("camp_snapshot.json")
+JOURNAL_FILE = data_path("camp_journal.jsonl")
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+
+def _extends(old, new):
+    """True if list `new` is list `old` with items added at the end."""
+    return (
+        isinstance(old, list) and isinstance(new, list)
+        and len(new) > len(old) and new[:len(old)] == old
+    )
+
+
+def diff_record(old, new):
+    """Return the journal ops that turn camp record `old` into `new`."""
+    camp_id = new["camp_id"]
+    ops = []
+    for field, value in new.items():
+        if field == "camp_id" or old.get(field) == value:
+            continue
+        previous = old.get(field)
+        if _extends(previous, value):
+            ops.append({"op": "append", "id": camp_id, "field": field, "items": value[len(previous):]})
+        elif isinstance(previous, dict) and isinstance(value, dict):
+            for key, item in value.items():
+                if key in previous and previous[key] == item:
+                    continue
+                if _extends(previous.get(key), item):
+                    ops.append({"op": "append_key", "id": camp_id, "field": field, "key": key,
+                                "items": item[len(previous[key]):]})
+                else:
+                    ops.append({"op": "set_key", "id": camp_id, "field": field, "key": key, "value": item})
+            for key in previous:
+                if key not in value:
+                    ops.append({"op": "del_key", "id": camp_id, "field": field, "key": key})
+        else:
+            ops.append({"op": "set", "id": camp_id, "field": field, "value": value})
+    for field in old:
+        if field not in new:
+            ops.append({"op": "unset", "id": camp_id, "field": field})
+    return ops
+
+
+def apply_op(camps, order, op):
+    """Apply one journal op to `camps` (id -> record) and `order` (list of ids)."""
+    kind = op["op"]
+    if kind == "put":
+        record = op["camp"]
+        if record["camp_id"] not in camps:
+            order.append(record["camp_id"])
+        camps[record["camp_id"]] = record
+        return
+    if kind == "order":
+        order[:] = [camp_id for camp_id in op["ids"] if camp_id in camps]
+        return
+    camp = camps.get(op["id"])
+    if camp is None:
+        return
+    if kind == "delete":
+        del camps[op["id"]]
+        order.remove(op["id"])
+    elif kind == "set":
+        camp[op["field"]] = op["value"]
+    elif kind == "unset":
+        camp.pop(op["field"], None)
+    elif kind == "append":
+        camp.setdefault(op["field"], []).extend(op["items"])
+    elif kind == "set_key":
+        camp.setdefault(op["field"], {})[op["key"]] = op["value"]
+    elif kind == "append_key":
+        camp.setdefault(op["field"], {}).setdefault(op["key"], []).extend(op["items"])
+    elif kind == "del_key":
+        camp.get(op["field"], {}).pop(op["key"], None)
+
+
+class JournalCampBackend:
+    """Snapshot + append-only journal (see module docstring)."""
+
+    label = "camp_snapshot.json"
+    partial_writes = True
+
+    def __init__(self, snapshot_file=SNAPSHOT_FILE, journal_file=JOURNAL_FILE):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.seq = 0
+        self.order = []
+
+    def signature(self):
+        snapshot = durable.file_signature(self.snapshot_file)
+        if snapshot is None:
+            return None
+        return snapshot + (durable.file_signature(self.journal_file) or ())
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_file):
+            # First run in journal mode: start from the plain camp_data.json.
+            if not os.path.exists(CAMP_FILE):
+                raise FileNotFoundError(self.snapshot_file)
+            with open(CAMP_FILE, "r") as f:
+                records = json.load(f) if os.path.getsize(CAMP_FILE) else []
+            for record in records:
+                record.setdefault("camp_id", legacy_camp_id(record))
+            self._write_snapshot(records, 0)
+            return records, 0
+        with open(self.snapshot_file, "r") as f:
+            snapshot = json.load(f)
+        return snapshot.get("camps", []), snapshot.get("seq", 0)
+
+    def _write_snapshot(self, records, seq):
+        # never deferred: the journal is truncated right after this
+        durable.replace_file(self.snapshot_file, json.dumps({"seq": seq, "camps": records}, indent=4))
+
+    def load(self):
+        records, seq = self._read_snapshot()
+        camps = {r["camp_id"]: r for r in records}
+        order = [r["camp_id"] for r in records]
+        try:
+            with open(self.journal_file, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn final line from an interrupted append
+                    if entry.get("seq", 0) <= seq:
+                        continue
+                    for op in entry.get("ops", []):
+                        apply_op(camps, order, op)
+                    seq = entry["seq"]
+        except FileNotFoundError:
+            pass
+        self.seq = seq
+        self.order = order
+        return [camps[camp_id] for camp_id in order]
+
+    def write(self, records, changed, deleted, previous=None):
+        previous = previous or {}
+        ops = []
+        for camp_id in deleted:
+            ops.append({"op": "delete", "id": camp_id})
+        expected = [camp_id for camp_id in self.order if camp_id not in deleted]
+        for record in records:
+            camp_id = record["camp_id"]
+            if camp_id not in changed:
+                continue
+            if previous.get(camp_id) is None:
+                ops.append({"op": "put", "camp": record})
+                expected.append(camp_id)
+            else:
+                ops.extend(diff_record(json.loads(previous[camp_id]), record))
+        order = [r["camp_id"] for r in records]
+        if len(order) == len(expected) and order != expected:
+            ops.append({"op": "order", "ids": order})
+        if not ops:
+            return
+
+        self.seq += 1
+        entry = {"seq": self.seq, "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "ops": ops}
+        with open(self.journal_file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if len(order) == len(expected):
+            self.order = order
+        else:
+            # partial save with camps we have not loaded; keep our own view
+            self.order = expected
+
+        if os.path.getsize(self.journal_file) >= JOURNAL_COMPACT_BYTES:
+            self.compact()
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and start a new journal."""
+        records = self.load()
+        self._write_snapshot(records, self.seq)
+        with open(self.journal_file, "w"):
+            pass
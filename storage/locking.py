@@ -0,0 +1,134 @@
+"""
+Advisory file locks so several CampTrack processes can share data/.
+
+The GUI on several desks and CLI batch jobs may run against the same data
+directory. Every store update is a read-modify-write, so without locking two
+processes can each read the old contents and the second write silently drops
+the first one's change.
+
+shared(path) / exclusive(path) take an fcntl lock on a sidecar `<path>.lock`
+file (the store itself is replaced on every atomic write, so it cannot carry
+the lock). Both work as context managers and as decorators, and are re-entrant
+within a thread: an exclusive block may read under shared() freely, and a
+shared lock is upgraded when the same thread asks for exclusive.
+
+Exclusive locks taken inside storage.durable.coalesce() are held until the
+coalesced writes have landed, otherwise another process could slip in between
+the read and the deferred write. A lock that cannot be taken within LOCK_TIMEOUT
+seconds raises LockTimeout rather than waiting forever.
+
+On platforms without fcntl (Windows) the locks are no-ops.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from storage import durable
+
+LOCK_TIMEOUT = 10.0
+_POLL_INTERVAL = 0.01
+
+_held = threading.local()
+
+
+class LockTimeout(RuntimeError):
+    """Another process held a store lock for longer than LOCK_TIMEOUT."""
+
+
+class _Held:
+    __slots__ = ("fd", "exclusive", "depth", "deferred")
+
+    def __init__(self, fd, exclusive):
+        self.fd = fd
+        self.exclusive = exclusive
+        self.depth = 0
+        self.deferred = False
+
+
+def _held_locks():
+    if not hasattr(_held, "locks"):
+        _held.locks = {}
+    return _held.locks
+
+
+def _flock(fd, exclusive, lock_path):
+    op = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            fcntl.flock(fd, op | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise LockTimeout(f"timed out waiting for {lock_path}") from None
+            time.sleep(_POLL_INTERVAL)
+
+
+def _release(lock_path):
+    locks = _held_locks()
+    held = locks.get(lock_path)
+    if held is None or held.depth:
+        return
+    del locks[lock_path]
+    try:
+        fcntl.flock(held.fd, fcntl.LOCK_UN)
+    finally:
+        os.close(held.fd)
+
+
+def _deferred_release(lock_path):
+    held = _held_locks().get(lock_path)
+    if held is not None:
+        held.deferred = False
+    _release(lock_path)
+
+
+@contextmanager
+def _lock(path, exclusive):
+    if fcntl is None:
+        yield
+        return
+    lock_path = f"{path}.lock"
+    locks = _held_locks()
+    held = locks.get(lock_path)
+    if held is None:
+        os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _flock(fd, exclusive, lock_path)
+        except BaseException:
+            os.close(fd)
+            raise
+        held = locks[lock_path] = _Held(fd, exclusive)
+    elif exclusive and not held.exclusive:
+        _flock(held.fd, True, lock_path)
+        held.exclusive = True
+    held.depth += 1
+    try:
+        yield
+    finally:
+        held.depth -= 1
+        if held.depth == 0:
+            if held.exclusive and durable.coalescing():
+                if not held.deferred:
+                    held.deferred = True
+                    durable.when_done(lambda: _deferred_release(lock_path))
+            else:
+                _release(lock_path)
+
+
+def shared(path):
+    """Shared (read) lock on the store at `path`."""
+    return _lock(path, False)
+
+
+def exclusive(path):
+    """Exclusive (write) lock on the store at `path`."""
+    return _lock(path, True)
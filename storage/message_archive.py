@@ -0,0 +1,174 @@
+"""
+Archive of old direct messages, in compressed monthly segments.
+
+Conversations only grow, and every read of a thread pays for its whole
+history. archive() moves messages older than ARCHIVE_AFTER_DAYS out of the
+threads into data/messages/archive/<YYYY-MM>.json.gz, one gzip'd JSON object
+per month mapping conversation keys to that month's messages (with broadcast
+bodies filled in, so a segment stands on its own). archive/index.json
+records which conversations each month holds, so reading the archived
+history of one conversation only opens the months it appears in.
+
+Messages that are unread, waiting for an acknowledgement or pinned stay in
+the thread whatever their age, as does the newest message of each
+conversation, so unread counters and conversation lists are unaffected.
+Archived messages are read-only: their ids are dropped from the id index.
+They stay in the search index, and readers ask for them explicitly (see
+messaging.get_conversation / search_messages / export_conversation).
+
+Segments are written before the threads are trimmed; after a crash in
+between a message can be in both, which load() tolerates and the next run
+tidies up. Run from the project root:
+
+    python -m storage.message_archive            # archive after ARCHIVE_AFTER_DAYS
+    python -m storage.message_archive --days 90
+"""
+
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from storage import durable, locking, message_store
+
+ARCHIVE_DIR = os.path.join(message_store.MESSAGES_DIR, "archive")
+INDEX_FILE = os.path.join(ARCHIVE_DIR, "index.json")
+ARCHIVE_AFTER_DAYS = 180
+
+
+def _segment_path(month):
+    return os.path.join(ARCHIVE_DIR, month + ".json.gz")
+
+
+def _read_segment(month):
+    try:
+        with open(_segment_path(month), "rb") as f:
+            return json.loads(gzip.decompress(f.read()))
+    except (FileNotFoundError, OSError, ValueError):
+        return {}
+
+
+def _write_segment(month, segment):
+    data = gzip.compress(json.dumps(segment).encode("utf-8"))
+    path = _segment_path(month)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_index():
+    try:
+        return durable.load_json(INDEX_FILE)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _archivable(thread, cutoff):
+    newest = max(range(len(thread)), key=lambda i: thread[i].get("timestamp", ""), default=None)
+    return [
+        m for i, m in enumerate(thread)
+        if i != newest
+        and m.get("timestamp", "") < cutoff
+        and m.get("read", False) is not False
+        and not (m.get("requires_ack") and not m.get("acked"))
+        and not m.get("pinned")
+    ]
+
+
+def archive(older_than_days=ARCHIVE_AFTER_DAYS, now=None):
+    """Move messages older than `older_than_days` into the archive; returns how many moved."""
+    cutoff = ((now or datetime.now()) - timedelta(days=older_than_days)).strftime("%Y-%m-%d %H:%M:%S")
+    with locking.exclusive(message_store.STORE_LOCK):
+        moving = {}  # (a, b) -> messages
+        for a, b in message_store.conversations():
+            old = _archivable(message_store.load_thread(a, b), cutoff)
+            if old:
+                moving[(a, b)] = old
+        if not moving:
+            return 0
+        months = {}
+        for (a, b), old in moving.items():
+            key = message_store.conversation_key(a, b)
+            for msg in old:
+                months.setdefault(msg.get("timestamp", "")[:7] or "undated", {}).setdefault(key, []).append(msg)
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        index = _read_index()
+        for month, conversations in sorted(months.items()):
+            segment = _read_segment(month)
+            for key, messages in conversations.items():
+                stored = segment.setdefault(key, [])
+                have = {m.get("id") for m in stored}
+                stored.extend(m for m in messages if m.get("id") not in have)
+                stored.sort(key=lambda m: m.get("timestamp", ""))
+                index.setdefault(month, {})[key] = len(stored)
+            _write_segment(month, segment)
+        durable.replace_file(INDEX_FILE, json.dumps(index, indent=4, sort_keys=True))
+        for (a, b), old in moving.items():
+            message_store.prune_thread(a, b, [m["id"] for m in old])
+    return sum(len(old) for old in moving.values())
+
+
+def months(a, b):
+    """Months ("YYYY-MM") with archived messages between `a` and `b`, oldest first."""
+    key = message_store.conversation_key(a, b)
+    with locking.shared(message_store.STORE_LOCK):
+        return sorted(month for month, keys in _read_index().items() if key in keys)
+
+
+def load(a, b, date_from=None, date_to=None, exclude_ids=()):
+    """
+    Archived messages between `a` and `b`, oldest first, optionally only
+    from the months overlapping date_from/date_to ("YYYY-MM-DD"). Messages
+    whose id is in `exclude_ids` (e.g. still in the thread) are skipped.
+    """
+    key = message_store.conversation_key(a, b)
+    exclude_ids = set(exclude_ids)
+    messages = []
+    with locking.shared(message_store.STORE_LOCK):
+        for month in months(a, b):
+            if (date_from and month < date_from[:7]) or (date_to and month > date_to[:7]):
+                continue
+            messages.extend(m for m in _read_segment(month).get(key, []) if m.get("id") not in exclude_ids)
+    return messages
+
+
+def iter_messages(a=None, b=None, predicate=None):
+    """
+    Archived messages (between `a` and `b`, if given) satisfying
+    `predicate`, oldest first, reading one monthly segment at a time.
+    """
+    key = message_store.conversation_key(a, b) if a is not None else None
+    with locking.shared(message_store.STORE_LOCK):
+        index = _read_index()
+    for month in sorted(index):
+        if key is not None and key not in index[month]:
+            continue
+        with locking.shared(message_store.STORE_LOCK):
+            segment = _read_segment(month)
+        threads = [segment.get(key, [])] if key is not None else list(segment.values())
+        found = [m for thread in threads for m in thread if predicate is None or predicate(m)]
+        found.sort(key=lambda m: m.get("timestamp", ""))
+        yield from found
+
+
+def all_messages():
+    """Every archived message, oldest first."""
+    messages = []
+    with locking.shared(message_store.STORE_LOCK):
+        for month in sorted(_read_index()):
+            for thread in _read_segment(month).values():
+                messages.extend(thread)
+    messages.sort(key=lambda m: m.get("timestamp", ""))
+    return messages
+
+
+if __name__ == "__main__":
+    days = ARCHIVE_AFTER_DAYS
+    if "--days" in sys.argv[1:]:
+        days = int(sys.argv[sys.argv.index("--days") + 1])
+    moved = archive(days)
+    print(f"Archived {moved} message(s) older than {days} days into {ARCHIVE_DIR}.")
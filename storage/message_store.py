@@ -0,0 +1,527 @@
+"""
+Direct messages, partitioned by conversation.
+
+All direct messages used to live in data/messages.json, so opening one chat
+or listing a user's conversations parsed and filtered every message ever
+sent. Each conversation (the sorted pair of usernames) now has its own file
+under data/messages/threads/, and each user a small index under
+data/messages/users/ mapping their conversation partners to the timestamp of
+the last message, the number of messages, and how many messages from that
+partner are still unread or waiting for an acknowledgement. Opening a chat
+reads one thread; listing conversations or counting unread messages reads
+one index. The indexes are rewritten whenever a thread is, so they follow
+sends, reads, acks and deletes; check_indexes() rebuilds them from the
+threads if they ever disagree.
+
+Every message has a stable `id`. data/messages/ids/ maps ids to their
+conversation and position, sharded by the first two characters of the id,
+so acting on one message (ack, pin, delete) reads one small shard and one
+thread instead of searching every conversation by timestamp. Messages stored
+before ids existed get one when the id index is first built.
+
+A broadcast stores its body (text, attachment, metadata) once under
+data/messages/broadcasts/ and gives each recipient a small delivery record
+in their conversation that refers to it by `broadcast` id. Threads are
+returned with the body filled in, and stripped again when saved.
+
+An existing data/messages.json is split into this layout the first time the
+store is used (the file itself is left in place but no longer read).
+
+Reads take a shared lock on STORE_LOCK; callers doing a read-modify-write
+hold locking.exclusive(STORE_LOCK) around it.
+"""
+
+import heapq
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from functools import lru_cache
+from urllib.parse import quote, unquote
+
+from storage import attachments, durable, locking, search_index
+from utils import data_path
+
+LEGACY_FILE = data_path("messages.json")
+MESSAGES_DIR = data_path("messages")
+THREAD_DIR = os.path.join(MESSAGES_DIR, "threads")
+USER_DIR = os.path.join(MESSAGES_DIR, "users")
+ID_DIR = os.path.join(MESSAGES_DIR, "ids")
+BROADCAST_DIR = os.path.join(MESSAGES_DIR, "broadcasts")
+STORE_LOCK = MESSAGES_DIR  # locked as data/messages.lock
+# fields of a broadcast delivery record that live in the shared body
+BODY_FIELDS = ("text", "attachment", "metadata")
+# bytes read at a time when streaming a thread (iter_matching)
+STREAM_CHUNK = 1 << 16
+
+
+def conversation_key(a, b):
+    """File name stem of the conversation between users `a` and `b`."""
+    return "+".join(quote(name, safe="") for name in sorted((a, b)))
+
+
+def _thread_path(a, b):
+    return os.path.join(THREAD_DIR, conversation_key(a, b) + ".json")
+
+
+def _users(key):
+    a, b = (unquote(name) for name in key.split("+"))
+    return a, b
+
+
+def _user_path(username):
+    return os.path.join(USER_DIR, quote(username, safe="") + ".json")
+
+
+def _id_path(message_id):
+    return os.path.join(ID_DIR, message_id[:2] + ".json")
+
+
+def new_id():
+    return uuid.uuid4().hex
+
+
+@lru_cache(maxsize=1024)
+def _body(broadcast_id):
+    # bodies never change once written
+    return durable.load_json(os.path.join(BROADCAST_DIR, broadcast_id + ".json"))
+
+
+def _with_bodies(messages):
+    for msg in messages:
+        if msg.get("broadcast") and "text" not in msg:
+            try:
+                body = _body(msg["broadcast"])
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            for field in BODY_FIELDS:
+                value = body.get(field)
+                msg[field] = dict(value) if isinstance(value, dict) else value
+    return messages
+
+
+def _without_bodies(messages):
+    return [
+        {k: v for k, v in msg.items() if k not in BODY_FIELDS} if msg.get("broadcast") else msg
+        for msg in messages
+    ]
+
+
+def _read(path, default):
+    try:
+        return durable.load_json(path)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def _summary(username, partner, messages):
+    """`username`'s index entry for the conversation with `partner`."""
+    incoming = [m for m in messages if m.get("to") == username and m.get("from") == partner]
+    return {
+        "last": max((m.get("timestamp", "") for m in messages), default=""),
+        "messages": len(messages),
+        "unread": sum(1 for m in incoming if m.get("read", False) is False),
+        "ack": sum(1 for m in incoming if m.get("requires_ack") and not m.get("acked")),
+    }
+
+
+def _summaries(a, b, messages):
+    """Index changes {user: {partner: summary or None}} for the thread of `a` and `b`."""
+    if not messages:
+        return {a: {b: None}, b: {a: None}}
+    return {a: {b: _summary(a, b, messages)}, b: {a: _summary(b, a, messages)}}
+
+
+def _merge(changes, more):
+    for user, partners in more.items():
+        changes.setdefault(user, {}).update(partners)
+    return changes
+
+
+def _import_legacy():
+    """Split data/messages.json into per-conversation files (once)."""
+    if os.path.isdir(MESSAGES_DIR):
+        return
+    with locking.exclusive(STORE_LOCK):
+        if os.path.isdir(MESSAGES_DIR):
+            return
+        try:
+            messages = durable.load_json(LEGACY_FILE).get("messages", [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            messages = []
+        threads = {}
+        for msg in messages:
+            msg.setdefault("id", new_id())
+            threads.setdefault(conversation_key(msg["from"], msg["to"]), []).append(msg)
+        # built next to the target and renamed into place, so a crash half
+        # way leaves no partial store behind
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(MESSAGES_DIR), prefix=".messages.")
+        try:
+            os.makedirs(os.path.join(tmp, "threads"))
+            os.makedirs(os.path.join(tmp, "users"))
+            indexes = {}
+            for key, thread in threads.items():
+                durable.replace_file(os.path.join(tmp, "threads", key + ".json"),
+                                     json.dumps({"messages": thread}, indent=4))
+                _merge(indexes, _summaries(*_users(key), thread))
+            for username, partners in indexes.items():
+                durable.replace_file(os.path.join(tmp, "users", quote(username, safe="") + ".json"),
+                                     json.dumps(partners, indent=4))
+            _build_id_index(threads, os.path.join(tmp, "ids"))
+            os.rename(tmp, MESSAGES_DIR)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+
+def _build_id_index(threads, directory):
+    """Write the id shards for `threads` ({conversation key: messages}) into `directory`."""
+    shards = {}
+    for key, thread in threads.items():
+        for position, msg in enumerate(thread):
+            shards.setdefault(msg["id"][:2], {})[msg["id"]] = [key, position]
+    os.makedirs(directory)
+    for prefix, entries in shards.items():
+        durable.replace_file(os.path.join(directory, prefix + ".json"), json.dumps(entries))
+
+
+def _index_ids():
+    """Give messages stored before ids existed an id and build the id index (once)."""
+    if os.path.isdir(ID_DIR):
+        return
+    with locking.exclusive(STORE_LOCK):
+        if os.path.isdir(ID_DIR):
+            return
+        threads = {}
+        for name in sorted(os.listdir(THREAD_DIR)) if os.path.isdir(THREAD_DIR) else []:
+            if not name.endswith(".json"):
+                continue
+            thread = _read(os.path.join(THREAD_DIR, name), {}).get("messages", [])
+            if any("id" not in msg for msg in thread):
+                for msg in thread:
+                    msg.setdefault("id", new_id())
+                durable.replace_file(os.path.join(THREAD_DIR, name), json.dumps({"messages": thread}, indent=4))
+            threads[name[:-len(".json")]] = thread
+        tmp = tempfile.mkdtemp(dir=MESSAGES_DIR, prefix=".ids.")
+        try:
+            _build_id_index(threads, os.path.join(tmp, "ids"))
+            os.rename(os.path.join(tmp, "ids"), ID_DIR)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _ready():
+    _import_legacy()
+    _index_ids()
+
+
+def _set_ids(entries):
+    """Apply {message id: [conversation key, position] or None} to the id shards."""
+    shards = {}
+    for message_id, location in entries.items():
+        shards.setdefault(_id_path(message_id), {})[message_id] = location
+    for path, changes in shards.items():
+        shard = _read(path, {})
+        for message_id, location in changes.items():
+            if location is None:
+                shard.pop(message_id, None)
+            else:
+                shard[message_id] = location
+        durable.write_json(path, shard, indent=None)
+
+
+def load_thread(a, b):
+    """Messages between `a` and `b` in the order they were stored."""
+    _ready()
+    with locking.shared(STORE_LOCK):
+        return _with_bodies(_read(_thread_path(a, b), {}).get("messages", []))
+
+
+def save_thread(a, b, messages):
+    """Replace the conversation between `a` and `b` (removed if empty) and update both user indexes."""
+    _ready()
+    with locking.exclusive(STORE_LOCK):
+        _write_thread(a, b, messages)
+        _update_indexes(_summaries(a, b, messages))
+
+
+def _write_thread(a, b, messages):
+    if messages:
+        durable.write_json(_thread_path(a, b), {"messages": _without_bodies(messages)})
+    else:
+        durable.remove(_thread_path(a, b))
+
+
+def _update_indexes(changes):
+    """Apply {user: {partner: summary or None}} to the user indexes, one write per user."""
+    for user, partners in changes.items():
+        index = _read(_user_path(user), {})
+        changed = False
+        for partner, summary in partners.items():
+            if index.get(partner) != summary:
+                changed = True
+                if summary is None:
+                    del index[partner]
+                else:
+                    index[partner] = summary
+        if changed:
+            durable.write_json(_user_path(user), index)
+
+
+def append(message):
+    """Add one message to its conversation; returns its id (assigned if missing)."""
+    return append_many([message])[0]
+
+
+def append_many(messages):
+    """
+    Add messages in one batch: every thread, user index and id shard involved
+    is written once. Returns the message ids.
+    """
+    threads = {}
+    for message in messages:
+        message.setdefault("id", new_id())
+        threads.setdefault(tuple(sorted((message["from"], message["to"]))), []).append(message)
+    with locking.exclusive(STORE_LOCK), durable.coalesce():
+        ids = {}
+        indexes = {}
+        for (a, b), new in threads.items():
+            thread = load_thread(a, b)
+            key = conversation_key(a, b)
+            ids.update((m["id"], [key, len(thread) + i]) for i, m in enumerate(new))
+            thread += new
+            _write_thread(a, b, thread)
+            _merge(indexes, _summaries(a, b, thread))
+        _update_indexes(indexes)
+        _set_ids(ids)
+        search_index.add([search_index.direct_entry(m) for m in messages])
+    return [message["id"] for message in messages]
+
+
+def broadcast(body, deliveries):
+    """
+    Store one broadcast `body` (BODY_FIELDS) and a delivery record per
+    recipient referring to it. Returns the delivery ids.
+    """
+    broadcast_id = new_id()
+    for delivery in deliveries:
+        delivery["broadcast"] = broadcast_id
+        delivery.update(body)
+    with locking.exclusive(STORE_LOCK), durable.coalesce():
+        durable.write_json(os.path.join(BROADCAST_DIR, broadcast_id + ".json"),
+                           {field: body.get(field) for field in BODY_FIELDS})
+        return append_many(deliveries)
+
+
+def locate(message_id):
+    """(user a, user b, thread, position) of message `message_id`, or None."""
+    _ready()
+    with locking.shared(STORE_LOCK):
+        location = _read(_id_path(message_id), {}).get(message_id) if message_id else None
+        if location is None:
+            return None
+        key, position = location
+        a, b = _users(key)
+        thread = load_thread(a, b)
+    if position >= len(thread) or thread[position].get("id") != message_id:
+        # an earlier message of the thread was deleted since the entry was written
+        position = next((i for i, m in enumerate(thread) if m.get("id") == message_id), None)
+        if position is None:
+            return None
+    return a, b, thread, position
+
+
+def remove(message_id):
+    """Delete one message; returns it, or None if there is no such message."""
+    with locking.exclusive(STORE_LOCK):
+        found = locate(message_id)
+        if found is None:
+            return None
+        a, b, thread, position = found
+        message = thread.pop(position)
+        save_thread(a, b, thread)
+        key = conversation_key(a, b)
+        moved = {m["id"]: [key, i] for i, m in enumerate(thread) if i >= position}
+        _set_ids({message_id: None, **moved})
+        search_index.remove_direct(message_id)
+        if message.get("attachment"):
+            durable.after_flush(lambda: attachments.release(message["attachment"]))
+    return message
+
+
+def prune_thread(a, b, message_ids):
+    """Drop the messages `message_ids` from the conversation of `a` and `b` (their ids are forgotten)."""
+    message_ids = set(message_ids)
+    with locking.exclusive(STORE_LOCK), durable.coalesce():
+        thread = load_thread(a, b)
+        kept = [m for m in thread if m.get("id") not in message_ids]
+        if len(kept) == len(thread):
+            return
+        save_thread(a, b, kept)
+        key = conversation_key(a, b)
+        _set_ids({**dict.fromkeys(message_ids), **{m["id"]: [key, i] for i, m in enumerate(kept)}})
+
+
+def conversations():
+    """(user a, user b) of every stored conversation."""
+    _ready()
+    with locking.shared(STORE_LOCK):
+        try:
+            names = sorted(os.listdir(THREAD_DIR))
+        except FileNotFoundError:
+            return []
+    return [_users(name[:-len(".json")]) for name in names if name.endswith(".json")]
+
+
+def partners(username):
+    """
+    {partner: {"last": timestamp, "messages": count, "unread": count, "ack": count}}
+    for every conversation of `username`; "unread" and "ack" count messages
+    from the partner (and are missing from entries written before they existed).
+    """
+    _ready()
+    with locking.shared(STORE_LOCK):
+        return _read(_user_path(username), {})
+
+
+def watch_paths(username, other=None):
+    """
+    Files that change when a conversation of `username` does (with `other`:
+    also when that conversation is rewritten without the index changing,
+    e.g. a pin). For storage.watch.
+    """
+    paths = [_user_path(username)]
+    if other is not None:
+        paths.append(_thread_path(username, other))
+    return paths
+
+
+def all_messages():
+    """Every stored message, oldest first."""
+    _ready()
+    with locking.shared(STORE_LOCK):
+        try:
+            names = sorted(os.listdir(THREAD_DIR))
+        except FileNotFoundError:
+            return []
+        messages = []
+        for name in names:
+            if name.endswith(".json"):
+                messages.extend(_read(os.path.join(THREAD_DIR, name), {}).get("messages", []))
+    _with_bodies(messages)
+    messages.sort(key=lambda m: m.get("timestamp", ""))
+    return messages
+
+
+def _timestamp(message):
+    return message.get("timestamp", "")
+
+
+def _stream_thread(path):
+    """
+    Messages of a thread file, decoded one at a time from STREAM_CHUNK reads
+    so a long thread is never parsed whole. The open file keeps the version
+    it was opened at even if the thread is rewritten meanwhile.
+    """
+    decoder = json.JSONDecoder()
+    try:
+        f = open(path, "r")
+    except FileNotFoundError:
+        return
+    with f:
+        buffer = f.read(STREAM_CHUNK)
+        pos = buffer.find("[")  # {"messages": [...]} is the only key
+        while pos < 0:
+            chunk = f.read(STREAM_CHUNK)
+            if not chunk:
+                return
+            buffer += chunk
+            pos = buffer.find("[")
+        pos += 1
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos == len(buffer):
+                    raise ValueError
+                message, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # the next message runs past what has been read so far
+                chunk = f.read(STREAM_CHUNK)
+                if not chunk:
+                    return  # truncated file
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield _with_bodies([message])[0]
+
+
+def iter_matching(predicate):
+    """
+    Messages satisfying predicate(message), oldest first (a thread is stored
+    in the order it was sent). Every thread is streamed (_stream_thread) and
+    the streams merged, so memory stays flat however many messages match.
+    """
+    _ready()
+    if durable.coalescing():
+        # pending thread writes are not on disk yet
+        streams = [[m for m in load_thread(a, b) if predicate(m)] for a, b in conversations()]
+    else:
+        streams = [
+            (m for m in _stream_thread(_thread_path(a, b)) if predicate(m)) for a, b in conversations()
+        ]
+    return heapq.merge(*streams, key=_timestamp)
+
+
+def replace_all(messages):
+    """Rewrite the store so it holds exactly `messages`."""
+    threads = {}
+    for msg in messages:
+        msg.setdefault("id", new_id())
+        threads.setdefault(tuple(sorted((msg["from"], msg["to"]))), []).append(msg)
+    with locking.exclusive(STORE_LOCK):
+        ids = {}
+        for msg in all_messages():
+            ids[msg["id"]] = None
+            threads.setdefault(tuple(sorted((msg["from"], msg["to"]))), [])
+        for (a, b), thread in threads.items():
+            key = conversation_key(a, b)
+            ids.update((m["id"], [key, i]) for i, m in enumerate(thread))
+            if load_thread(a, b) != thread:
+                save_thread(a, b, thread)
+        _set_ids(ids)
+        durable.after_flush(search_index.invalidate)
+
+
+def check_indexes(repair=False):
+    """
+    Compare every user index with the threads; returns {user: {partner:
+    (stored, expected)}} for the entries that differ. With `repair`, the
+    indexes are rewritten to match.
+    """
+    _ready()
+    with locking.exclusive(STORE_LOCK) if repair else locking.shared(STORE_LOCK):
+        expected = {}
+        for name in sorted(os.listdir(THREAD_DIR)) if os.path.isdir(THREAD_DIR) else []:
+            if name.endswith(".json"):
+                thread = _read(os.path.join(THREAD_DIR, name), {}).get("messages", [])
+                _merge(expected, _summaries(*_users(name[:-len(".json")]), thread))
+        stored = {}
+        for name in os.listdir(USER_DIR) if os.path.isdir(USER_DIR) else []:
+            if name.endswith(".json"):
+                stored[unquote(name[:-len(".json")])] = _read(os.path.join(USER_DIR, name), {})
+        problems = {}
+        for user in set(stored) | set(expected):
+            have, want = stored.get(user, {}), expected.get(user, {})
+            for partner in set(have) | set(want):
+                if have.get(partner) != want.get(partner):
+                    problems.setdefault(user, {})[partner] = (have.get(partner), want.get(partner))
+        if repair and problems:
+            with durable.coalesce():
+                _update_indexes({
+                    user: {partner: want for partner, (_, want) in partners.items()}
+                    for user, partners in problems.items()
+                })
+    return problems
@@ -0,0 +1,236 @@
+"""
+Full-text search over direct messages and camp group chats.
+
+Searching used to load every message and substring-match each one. The
+index here maps word tokens to the messages containing them, so a query
+touches only the postings of its words. A query word matches any token it
+is a prefix of ("sup" finds "supplies"); all words of a query must match.
+Results can be narrowed by user, conversation partner, camp, sender, date
+range and priority.
+
+On disk the index is an append-only log, data/search/index.jsonl, with one
+line per indexed (or deleted) message. Sending a message appends one line
+once the message itself has been written; nothing is rebuilt. Each process
+keeps the index in memory and only reads lines appended since its last
+search, so a warm search costs a few dictionary lookups. The log is built
+from the message stores (archive included) the first time it is needed, and again if it is
+deleted. Once it passes COMPACT_BYTES with more superseded or deleted lines
+than live ones, the next search rewrites it the same way.
+"""
+
+import json
+import os
+import re
+from array import array
+from bisect import bisect_left
+
+from storage import durable, locking
+from utils import data_path
+
+INDEX_FILE = data_path(os.path.join("search", "index.jsonl"))
+
+_TOKEN = re.compile(r"\w+")
+COMPACT_BYTES = 256 * 1024
+
+
+def tokenize(text):
+    """Lower-cased word tokens of `text`, each once."""
+    return list(dict.fromkeys(_TOKEN.findall((text or "").casefold())))
+
+
+def direct_entry(message):
+    """Index line for a direct message."""
+    return {
+        "k": "dm", "id": message["id"], "from": message.get("from"), "to": message.get("to"),
+        "ts": message.get("timestamp", ""), "p": bool(message.get("priority")),
+        "t": tokenize(message.get("text")),
+    }
+
+
+def group_entry(camp_id, message):
+    """Index line for a group chat message (which must have its seq)."""
+    return {
+        "k": "gc", "id": message["seq"], "camp": camp_id, "from": message.get("from"),
+        "ts": message.get("timestamp", ""), "p": False,
+        "t": tokenize(message.get("text")),
+    }
+
+
+class _Index:
+    """In-memory view of the log; documents are numbered in log order."""
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, inode):
+        self.inode = inode
+        self.offset = 0
+        self.docs = []  # number -> (kind, id, from, to or camp, timestamp, priority)
+        self.numbers = {}  # (kind, id or (camp, seq)) -> number
+        self.dead = set()
+        self.postings = {}  # token -> array of numbers, ascending
+        self.owners = {}  # username or camp id -> array of numbers
+        self.vocabulary = []
+        self.sorted_ok = True
+
+    def apply(self, entry):
+        kind = entry["k"]
+        key = (kind, entry["id"]) if kind == "dm" else (kind, (entry["camp"], entry["id"]))
+        old = self.numbers.get(key)
+        if old is not None:
+            self.dead.add(old)
+        if entry.get("del"):
+            return
+        number = len(self.docs)
+        other = entry["to"] if kind == "dm" else entry["camp"]
+        self.docs.append((kind, entry["id"], entry.get("from"), other, entry.get("ts", ""), entry.get("p", False)))
+        self.numbers[key] = number
+        owners = (entry.get("from"), entry["to"]) if kind == "dm" else (entry["camp"],)
+        for owner in dict.fromkeys(owners):
+            self.owners.setdefault(owner, array("l")).append(number)
+        for token in entry.get("t", ()):
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = array("l")
+                self.sorted_ok = False
+            posting.append(number)
+
+    def refresh(self):
+        """Read lines appended since the last refresh (everything after a rebuild)."""
+        try:
+            stat = os.stat(INDEX_FILE)
+        except FileNotFoundError:
+            return False
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.reset(stat.st_ino)
+        if stat.st_size == self.offset:
+            return True
+        with open(INDEX_FILE, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1  # a line still being appended is read next time
+        for line in data[:end].splitlines():
+            try:
+                self.apply(json.loads(line))
+            except (ValueError, KeyError):
+                continue
+        self.offset += end
+        return True
+
+    def matching(self, word):
+        """Numbers of documents with a token starting with `word`."""
+        if not self.sorted_ok:
+            self.vocabulary = sorted(self.postings)
+            self.sorted_ok = True
+        found = set()
+        i = bisect_left(self.vocabulary, word)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(word):
+            found.update(self.postings[self.vocabulary[i]])
+            i += 1
+        return found
+
+
+_index = _Index()
+
+
+def append(entries):
+    """Index `entries` now, for messages written straight away rather than through durable."""
+    if not entries:
+        return
+    with locking.exclusive(INDEX_FILE):
+        if not os.path.exists(INDEX_FILE):
+            return  # the rebuild on next search picks these up
+        with open(INDEX_FILE, "a") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in entries))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def add(entries):
+    """Index `entries` once the current (coalesced) writes have landed."""
+    if entries:
+        durable.after_flush(lambda: append(entries))
+
+
+def remove_direct(message_id):
+    add([{"k": "dm", "id": message_id, "del": True}])
+
+
+def rebuild():
+    """Write a fresh log from the message stores."""
+    from storage import chat_store, message_archive, message_store
+    # same lock order as a send: message store first, then the index
+    with locking.shared(message_store.STORE_LOCK), locking.exclusive(INDEX_FILE):
+        lines = [json.dumps(direct_entry(m)) + "\n" for m in message_archive.all_messages()]
+        lines.extend(json.dumps(direct_entry(m)) + "\n" for m in message_store.all_messages())
+        for camp_id in chat_store.camp_ids():
+            lines.extend(json.dumps(group_entry(camp_id, m)) + "\n" for m in chat_store.history(camp_id))
+        durable.replace_file(INDEX_FILE, "".join(lines))
+
+
+def invalidate():
+    """Drop the log; the next search rebuilds it."""
+    with locking.exclusive(INDEX_FILE):
+        try:
+            os.remove(INDEX_FILE)
+        except FileNotFoundError:
+            pass
+
+
+def search(query=None, *, user=None, other=None, camp_ids=None, sender=None,
+           date_from=None, date_to=None, priority_only=False, kinds=("dm", "gc")):
+    """
+    Matching messages as (kind, id, from, to or camp id, timestamp, priority)
+    tuples, oldest first. `id` is the message id for direct messages and the
+    seq for group chat. `user` limits direct messages to that user's
+    conversations (with `other`: to the one with `other`); `camp_ids` limits
+    group chat to those camps. date_from/date_to are "YYYY-MM-DD".
+    """
+    with locking.shared(INDEX_FILE):
+        ready = _index.refresh()
+    dead = len(_index.dead)
+    if not ready or (_index.offset >= COMPACT_BYTES and dead > len(_index.docs) - dead):
+        rebuild()
+        with locking.shared(INDEX_FILE):
+            _index.refresh()
+
+    candidates = None
+    for word in tokenize(query):
+        found = _index.matching(word)
+        candidates = found if candidates is None else candidates & found
+        if not candidates:
+            return []
+    scope = set()
+    if "dm" in kinds and user is not None:
+        scope.update(_index.owners.get(user, ()))
+    if "gc" in kinds and camp_ids is not None:
+        for camp_id in camp_ids:
+            scope.update(_index.owners.get(camp_id, ()))
+    if user is not None or camp_ids is not None:
+        candidates = scope if candidates is None else candidates & scope
+    elif candidates is None:
+        candidates = range(len(_index.docs))
+
+    start = f"{date_from} 00:00:00" if date_from else None
+    end = f"{date_to} 23:59:59" if date_to else None
+    results = []
+    for number in candidates:
+        if number in _index.dead:
+            continue
+        doc = _index.docs[number]
+        kind, _, frm, to, ts, priority = doc
+        if kind not in kinds:
+            continue
+        if kind == "dm" and user is not None and other is not None and {frm, to} != {user, other}:
+            continue
+        if kind == "gc" and camp_ids is not None and to not in camp_ids:
+            continue
+        if sender and frm != sender:
+            continue
+        if priority_only and not priority:
+            continue
+        if (start and ts < start) or (end and ts > end):
+            continue
+        results.append((ts, number, doc))
+    results.sort()
+    return [doc for _, _, doc in results]
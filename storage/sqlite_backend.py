@@ -0,0 +1,382 @@
+"""
+SQLite storage for camps (CAMPTRACK_STORAGE=sqlite).
+
+Each part of a camp record gets its own table so lookups such as "camp by
+name", "incidents of a camp by date" or "which camps does this camper attend"
+are indexed queries instead of a full JSON load plus a linear scan. Rows keep
+the original entry as JSON next to the indexed columns, so a camp read back
+from the database is identical to the record that was saved.
+
+Run `python -m storage.sqlite_backend` from the project root to migrate an
+existing data/camp_data.json in one go (the backend also imports it
+automatically the first time it finds an empty database). Group chat the
+other modes moved to data/group_chats/ is imported along with its camp.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+from contextlib import closing
+
+from storage import durable
+from storage.camp_store import HEADER_FIELDS, legacy_camp_id
+from utils import data_path
+
+DB_FILE = data_path("camptrack.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS camps (
+    camp_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    location TEXT,
+    camp_type INTEGER,
+    start_date TEXT,
+    end_date TEXT,
+    food_stock INTEGER,
+    pay_rate INTEGER,
+    imported_csvs TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_camps_name ON camps(name);
+CREATE INDEX IF NOT EXISTS idx_camps_dates ON camps(start_date, end_date);
+
+CREATE TABLE IF NOT EXISTS camp_leaders (
+    camp_id TEXT NOT NULL REFERENCES camps(camp_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    username TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_camp_leaders_camp ON camp_leaders(camp_id);
+CREATE INDEX IF NOT EXISTS idx_camp_leaders_user ON camp_leaders(username);
+
+CREATE TABLE IF NOT EXISTS campers (
+    camp_id TEXT NOT NULL REFERENCES camps(camp_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_campers_camp ON campers(camp_id);
+CREATE INDEX IF NOT EXISTS idx_campers_name ON campers(name);
+
+CREATE TABLE IF NOT EXISTS campers_info (
+    camp_id TEXT NOT NULL REFERENCES camps(camp_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    info TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_campers_info_camp ON campers_info(camp_id);
+CREATE INDEX IF NOT EXISTS idx_campers_info_name ON campers_info(name);
+
+CREATE TABLE IF NOT EXISTS activities (
+    camp_id TEXT NOT NULL REFERENCES camps(camp_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    activity TEXT,
+    time TEXT,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_activities_camp_date ON activities(camp_id, date);
+CREATE INDEX IF NOT EXISTS idx_activities_date ON activities(date);
+
+CREATE TABLE IF NOT EXISTS daily_food_usage (
+    camp_id TEXT NOT NULL REFERENCES camps(camp_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    units TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_food_usage_camp_date ON daily_food_usage(camp_id, date);
+
+CREATE TABLE IF NOT EXISTS daily_records (
+    camp_id TEXT NOT NULL REFERENCES camps(camp_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    note TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_daily_records_camp_date ON daily_records(camp_id, date);
+
+CREATE TABLE IF NOT EXISTS incidents (
+    camp_id TEXT NOT NULL REFERENCES camps(camp_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    date TEXT,
+    severity TEXT,
+    status TEXT,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_incidents_camp_date ON incidents(camp_id, date);
+CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents(status);
+
+CREATE TABLE IF NOT EXISTS incident_campers (
+    camp_id TEXT NOT NULL REFERENCES camps(camp_id) ON DELETE CASCADE,
+    incident_position INTEGER NOT NULL,
+    camper TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_incident_campers_camper ON incident_campers(camper);
+
+-- written by storage.chat_store, not by camp saves
+CREATE TABLE IF NOT EXISTS group_chat (
+    camp_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    sender TEXT,
+    timestamp TEXT,
+    message TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_group_chat_camp_position ON group_chat(camp_id, position);
+CREATE INDEX IF NOT EXISTS idx_group_chat_camp_time ON group_chat(camp_id, timestamp);
+"""
+
+# child tables cleared and re-inserted when a camp is saved
+CHILD_TABLES = (
+    "camp_leaders", "campers", "campers_info", "activities", "daily_food_usage",
+    "daily_records", "incidents", "incident_campers",
+)
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_FILE)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _insert_camp(conn, record, position):
+    camp_id = record["camp_id"]
+    conn.execute(
+        "INSERT OR REPLACE INTO camps (camp_id, position, name, location, camp_type, start_date,"
+        " end_date, food_stock, pay_rate, imported_csvs) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            camp_id, position, record["name"], record.get("location"), record.get("camp_type"),
+            record.get("start_date"), record.get("end_date"), record.get("food_stock"),
+            record.get("pay_rate", 0), json.dumps(record.get("imported_csvs", [])),
+        ),
+    )
+    for table in CHILD_TABLES:
+        conn.execute(f"DELETE FROM {table} WHERE camp_id = ?", (camp_id,))
+
+    conn.executemany(
+        "INSERT INTO camp_leaders (camp_id, position, username) VALUES (?, ?, ?)",
+        [(camp_id, i, u) for i, u in enumerate(record.get("scout_leaders", []))],
+    )
+    conn.executemany(
+        "INSERT INTO campers (camp_id, position, name) VALUES (?, ?, ?)",
+        [(camp_id, i, n) for i, n in enumerate(record.get("campers", []))],
+    )
+    conn.executemany(
+        "INSERT INTO campers_info (camp_id, position, name, info) VALUES (?, ?, ?, ?)",
+        [(camp_id, i, n, json.dumps(info))
+         for i, (n, info) in enumerate((record.get("campers_info") or {}).items())],
+    )
+
+    rows = []
+    for date, entries in (record.get("activities") or {}).items():
+        for entry in entries:
+            activity = entry.get("activity") if isinstance(entry, dict) else None
+            time = entry.get("time") if isinstance(entry, dict) else None
+            rows.append((camp_id, len(rows), date, activity, time, json.dumps(entry)))
+    conn.executemany(
+        "INSERT INTO activities (camp_id, position, date, activity, time, entry) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.executemany(
+        "INSERT INTO daily_food_usage (camp_id, position, date, units) VALUES (?, ?, ?, ?)",
+        [(camp_id, i, d, json.dumps(u))
+         for i, (d, u) in enumerate((record.get("daily_food_usage") or {}).items())],
+    )
+    rows = []
+    for date, notes in (record.get("daily_records") or {}).items():
+        for note in notes:
+            rows.append((camp_id, len(rows), date, json.dumps(note)))
+    conn.executemany(
+        "INSERT INTO daily_records (camp_id, position, date, note) VALUES (?, ?, ?, ?)",
+        rows,
+    )
+
+    incidents = record.get("incidents") or []
+    conn.executemany(
+        "INSERT INTO incidents (camp_id, position, date, severity, status, entry) VALUES (?, ?, ?, ?, ?, ?)",
+        [(camp_id, i, inc.get("date"), inc.get("severity"), inc.get("status"), json.dumps(inc))
+         for i, inc in enumerate(incidents)],
+    )
+    conn.executemany(
+        "INSERT INTO incident_campers (camp_id, incident_position, camper) VALUES (?, ?, ?)",
+        [(camp_id, i, c) for i, inc in enumerate(incidents) for c in (inc.get("campers") or [])],
+    )
+
+
+def insert_chat_messages(conn, camp_id, messages):
+    """Append group chat messages for a camp; returns them with `seq` set."""
+    start = conn.execute(
+        "SELECT COALESCE(MAX(position) + 1, 0) FROM group_chat WHERE camp_id = ?", (camp_id,)
+    ).fetchone()[0]
+    stored = [dict(m, seq=start + i) for i, m in enumerate(messages)]
+    conn.executemany(
+        "INSERT INTO group_chat (camp_id, position, sender, timestamp, message) VALUES (?, ?, ?, ?, ?)",
+        [(camp_id, m["seq"], m.get("from"), m.get("timestamp"), json.dumps(m)) for m in stored],
+    )
+    return stored
+
+
+def _load(conn, where="", params=()):
+    """Rebuild camp records for the camps matching `where` (a camps-table clause)."""
+    records = {}
+    order = []
+    for row in conn.execute(
+        "SELECT camp_id, name, location, camp_type, start_date, end_date, food_stock, pay_rate,"
+        f" imported_csvs FROM camps {where} ORDER BY position",
+        params,
+    ):
+        camp_id = row[0]
+        order.append(camp_id)
+        records[camp_id] = {
+            "camp_id": camp_id,
+            "name": row[1],
+            "location": row[2],
+            "camp_type": row[3],
+            "start_date": row[4],
+            "end_date": row[5],
+            "food_stock": row[6],
+            "scout_leaders": [],
+            "campers": [],
+            "campers_info": {},
+            "activities": {},
+            "daily_food_usage": {},
+            "daily_records": {},
+            "pay_rate": row[7],
+            "incidents": [],
+            "imported_csvs": json.loads(row[8]),
+        }
+    if not order:
+        return []
+
+    if where:
+        ids = f"camp_id IN ({','.join('?' * len(order))})"
+        params = tuple(order)
+    else:
+        ids, params = "1", ()
+
+    def rows(sql):
+        return conn.execute(sql.format(ids=ids), params)
+
+    for camp_id, username in rows("SELECT camp_id, username FROM camp_leaders WHERE {ids} ORDER BY camp_id, position"):
+        records[camp_id]["scout_leaders"].append(username)
+    for camp_id, name in rows("SELECT camp_id, name FROM campers WHERE {ids} ORDER BY camp_id, position"):
+        records[camp_id]["campers"].append(name)
+    for camp_id, name, info in rows("SELECT camp_id, name, info FROM campers_info WHERE {ids} ORDER BY camp_id, position"):
+        records[camp_id]["campers_info"][name] = json.loads(info)
+    for camp_id, date, entry in rows("SELECT camp_id, date, entry FROM activities WHERE {ids} ORDER BY camp_id, position"):
+        records[camp_id]["activities"].setdefault(date, []).append(json.loads(entry))
+    for camp_id, date, units in rows("SELECT camp_id, date, units FROM daily_food_usage WHERE {ids} ORDER BY camp_id, position"):
+        records[camp_id]["daily_food_usage"][date] = json.loads(units)
+    for camp_id, date, note in rows("SELECT camp_id, date, note FROM daily_records WHERE {ids} ORDER BY camp_id, position"):
+        records[camp_id]["daily_records"].setdefault(date, []).append(json.loads(note))
+    for camp_id, entry in rows("SELECT camp_id, entry FROM incidents WHERE {ids} ORDER BY camp_id, position"):
+        records[camp_id]["incidents"].append(json.loads(entry))
+
+    return [records[camp_id] for camp_id in order]
+
+
+class SqliteCampBackend:
+    """Camps stored in data/camptrack.db (see module docstring)."""
+
+    label = "camptrack.db"
+    partial_writes = True
+
+    def __init__(self, path=None):
+        self.path = path or DB_FILE
+
+    def signature(self):
+        return durable.file_signature(self.path)
+
+    def _migrate_if_empty(self, conn):
+        count = conn.execute("SELECT COUNT(*) FROM camps").fetchone()[0]
+        if count == 0 and os.path.exists(data_path("camp_data.json")):
+            migrate_from_json(self.path)
+
+    def load(self):
+        with closing(connect(self.path)) as conn:
+            self._migrate_if_empty(conn)
+            return _load(conn)
+
+    def load_headers(self):
+        """Header fields of every camp, read from the camps/camp_leaders tables only."""
+        columns = [f for f in HEADER_FIELDS if f != "scout_leaders"]
+        with closing(connect(self.path)) as conn:
+            self._migrate_if_empty(conn)
+            headers = {}
+            for row in conn.execute(f"SELECT camp_id, {', '.join(columns)} FROM camps ORDER BY position"):
+                headers[row[0]] = dict(zip(["id"] + columns, row), scout_leaders=[])
+            for camp_id, username in conn.execute(
+                "SELECT camp_id, username FROM camp_leaders ORDER BY camp_id, position"
+            ):
+                if camp_id in headers:
+                    headers[camp_id]["scout_leaders"].append(username)
+        return list(headers.values())
+
+    def load_by_id(self, camp_id):
+        with closing(connect(self.path)) as conn:
+            found = _load(conn, "WHERE camp_id = ?", (camp_id,))
+        return found[0] if found else None
+
+    def write(self, records, changed, deleted, previous=None):
+        with closing(connect(self.path)) as conn, conn:
+            for position, record in enumerate(records):
+                if record["camp_id"] in changed:
+                    _insert_camp(conn, record, position)
+            for camp_id in deleted:
+                conn.execute("DELETE FROM camps WHERE camp_id = ?", (camp_id,))
+
+    def load_by_name(self, name):
+        """Indexed lookup of a single camp record by name (None if missing)."""
+        with closing(connect(self.path)) as conn:
+            found = _load(conn, "WHERE name = ?", (name,))
+        return found[0] if found else None
+
+    def incidents_for(self, camp_id):
+        """A camp's incidents ordered by date, read through the incidents(camp_id, date) index."""
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                "SELECT entry FROM incidents WHERE camp_id = ? ORDER BY date, position", (camp_id,)
+            ).fetchall()
+        return [json.loads(entry) for (entry,) in rows]
+
+
+def migrate_from_json(db_path=None, json_path=None, replace=False):
+    """
+    Copy every camp from camp_data.json into the SQLite database, with its
+    group chat from data/group_chats/ (or, if never moved there, the record).
+
+    Returns the number of camps migrated. Existing rows are kept unless
+    `replace` is set, in which case the database is emptied first.
+    """
+    json_path = json_path or data_path("camp_data.json")
+    if not os.path.exists(json_path) or os.path.getsize(json_path) == 0:
+        return 0
+    with open(json_path, "r") as f:
+        records = json.load(f)
+
+    with closing(connect(db_path)) as conn, conn:
+        if replace:
+            conn.execute("DELETE FROM camps")
+        start = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM camps").fetchone()[0]
+        for offset, record in enumerate(records):
+            record.setdefault("camp_id", legacy_camp_id(record))
+            _insert_camp(conn, record, start + offset)
+            if replace:
+                conn.execute("DELETE FROM group_chat WHERE camp_id = ?", (record["camp_id"],))
+            has_chat = conn.execute(
+                "SELECT 1 FROM group_chat WHERE camp_id = ? LIMIT 1", (record["camp_id"],)
+            ).fetchone()
+            chat = _segment_chat(record["camp_id"]) or record.get("group_chat")
+            if chat and not has_chat:
+                insert_chat_messages(conn, record["camp_id"], chat)
+    return len(records)
+
+
+def _segment_chat(camp_id):
+    """A camp's group chat as stored by the non-sqlite modes (see storage.chat_store)."""
+    from storage.chat_store import SegmentChatStore
+    return SegmentChatStore().page(camp_id, limit=None)
+
+
+if __name__ == "__main__":
+    replace = "--replace" in sys.argv[1:]
+    migrated = migrate_from_json(replace=replace)
+    print(f"Migrated {migrated} camp(s) from camp_data.json into {DB_FILE}.")
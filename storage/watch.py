@@ -0,0 +1,63 @@
+"""
+Change notification for the file-backed stores.
+
+Open chat windows used to show new messages only when the user clicked
+something, and then reloaded everything. A Watcher is a daemon thread that
+stats a handful of files (a conversation, a user's index, a camp's latest
+chat segment; see the stores' watch_paths()) every INTERVAL seconds and
+calls `on_change()` when any of them was written, created or removed since
+it last looked. Writers don't need to know about it: every store write
+replaces or appends to one of these files.
+
+on_change() runs on the watcher thread; GUI code hands it over to its own
+event loop (see chat_window).
+"""
+
+import os
+import threading
+
+INTERVAL = 0.5
+
+
+class Watcher:
+    def __init__(self, paths, on_change, interval=INTERVAL):
+        """`paths` is a callable returning the paths to watch (asked on every look)."""
+        self._paths = paths
+        self._on_change = on_change
+        self._interval = interval
+        self._stop = threading.Event()
+        self._last = None
+        self._thread = threading.Thread(target=self._run, name="store-watcher", daemon=True)
+
+    def _snapshot(self):
+        state = []
+        for path in self._paths():
+            try:
+                st = os.stat(path)
+            except OSError:
+                state.append((path, None))
+            else:
+                state.append((path, st.st_mtime_ns, st.st_size, st.st_ino))
+        return state
+
+    def start(self):
+        self._last = self._snapshot()
+        self._thread.start()
+        return self
+
+    def rebase(self):
+        """Take the current state as seen (after the watched paths changed, or a change already handled)."""
+        self._last = self._snapshot()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                current = self._snapshot()
+            except Exception:
+                continue
+            if current != self._last:
+                self._last = current
+                self._on_change()
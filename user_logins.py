@@ -1,3 +1,5 @@
+from storage import durable
+
 users = {
     'admin': [],
     'scout leader': [],
@@ -44,43 +46,43 @@ def enable_login(username):
 
 
 def save_logins():
-    with open('logins.txt', 'w') as file:
-        for admin in users['admin']:
-            file.write(f"admin,{admin['username']},{admin['password']}\n")
-        for leader in users['scout leader']:
-            file.write(f"scout leader,{leader['username']},{leader['password']}\n")
-        for coordinator in users['logistics coordinator']:
-            file.write(f"logistics coordinator,{coordinator['username']},{coordinator['password']}\n")
+    lines = []
+    for admin in users['admin']:
+        lines.append(f"admin,{admin['username']},{admin['password']}\n")
+    for leader in users['scout leader']:
+        lines.append(f"scout leader,{leader['username']},{leader['password']}\n")
+    for coordinator in users['logistics coordinator']:
+        lines.append(f"logistics coordinator,{coordinator['username']},{coordinator['password']}\n")
+    durable.write_text('logins.txt', "".join(lines))
 
 
 def load_logins():
     try:
-        with open('logins.txt', 'r') as file:
-            lines = file.readlines()
-            users.clear()
-            users.update({
-                'admin': [],
-                'scout leader': [],
-                'logistics coordinator': []
-            })
-            for line in lines:
-                line = line.strip()
-
-                parts = [item.strip() for item in line.split(',')]
-                if len(parts) < 3:
-                    print(f"Skipping malformed line: {line}")
-                    continue
-
-                role, username, password = parts[:3]
-
-                if role == 'admin':
-                    users['admin'].append({'username': username, 'password': password})
-                elif role == 'scout leader':
-                    users['scout leader'].append({'username': username, 'password': password})
-                elif role == 'logistics coordinator':
-                    users['logistics coordinator'].append({'username': username, 'password': password})
-            if not users['admin']:
-                users['admin'].append({'username': 'admin', 'password': ''})
+        lines = durable.read_text('logins.txt').splitlines()
+        users.clear()
+        users.update({
+            'admin': [],
+            'scout leader': [],
+            'logistics coordinator': []
+        })
+        for line in lines:
+            line = line.strip()
+
+            parts = [item.strip() for item in line.split(',')]
+            if len(parts) < 3:
+                print(f"Skipping malformed line: {line}")
+                continue
+
+            role, username, password = parts[:3]
+
+            if role == 'admin':
+                users['admin'].append({'username': username, 'password': password})
+            elif role == 'scout leader':
+                users['scout leader'].append({'username': username, 'password': password})
+            elif role == 'logistics coordinator':
+                users['logistics coordinator'].append({'username': username, 'password': password})
+        if not users['admin']:
+            users['admin'].append({'username': 'admin', 'password': ''})
 
     except FileNotFoundError:
         print('\n logins.txt not found')